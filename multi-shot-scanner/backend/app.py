@@ -1,11 +1,16 @@
 # File: backend/app.py
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, Response, abort, jsonify, request
 from flask_cors import CORS
 import os
 from routes.api import api_blueprint
 from config.settings import Config
+from utils.image_pool import start_image_pool
+from utils.static_assets import StaticAssets
 
-app = Flask(__name__, static_folder='../frontend', static_url_path='')
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'frontend')
+
+# Frontend files are served by StaticAssets, not Flask's static view
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
 # Load configuration
@@ -14,20 +19,46 @@ app.config.from_object(Config)
 # Register blueprints
 app.register_blueprint(api_blueprint, url_prefix='/api')
 
+static_assets = StaticAssets(
+    FRONTEND_DIR,
+    max_age=Config.STATIC_MAX_AGE,
+    compress_min_bytes=Config.STATIC_COMPRESS_MIN_BYTES,
+    watch=Config.DEBUG
+)
+
+# Start image workers now rather than on the first upload (no-op when IMAGE_POOL_WORKERS is 0)
+start_image_pool()
+
+def asset_response(path):
+    served = static_assets.serve(
+        path,
+        request.headers.get('Accept-Encoding'),
+        request.headers.get('If-None-Match')
+    )
+    if served is None:
+        abort(404)
+    status, headers, body = served
+    return Response(body, status=status, headers=headers)
+
 # Serve frontend
 @app.route('/')
 def serve_frontend():
-    return send_from_directory('../frontend', 'index.html')
+    return asset_response('index.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
     if path.startswith('static/'):
-        return send_from_directory('../frontend', path)
-    return send_from_directory('../frontend', 'index.html')
+        return asset_response(path)
+    # Client-side routes get the app shell; a missing file or API route is a real 404
+    if path.startswith('api/') or '.' in path.rsplit('/', 1)[-1]:
+        abort(404)
+    return asset_response('index.html')
 
 @app.errorhandler(404)
 def not_found(e):
-    return send_from_directory('../frontend', 'index.html')
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'Not found'}), 404
+    return 'Not found', 404
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
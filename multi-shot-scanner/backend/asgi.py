@@ -0,0 +1,346 @@
+# File: backend/asgi.py
+"""
+Async serving mode.
+
+Run with `uvicorn asgi:app --workers 2` from backend/. The analysis and
+image routes below run natively on the event loop with the async
+Anthropic client, with PIL/NumPy work on a bounded thread pool, and
+frontend files come straight from the precompressed asset store; every
+other route is served by the Flask app in app.py, which is still the
+entry point for gunicorn.
+"""
+import base64
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+from app import app as flask_app, static_assets
+from config.settings import Config
+from routes.ai_service import (
+    get_model_caller, measure_layout, run_analysis_pipeline_async, run_blocking, stream_ui_analysis_async
+)
+from routes.api import format_sse, set_quota_headers, shape_event, shape_result
+from utils.code_analyzer import analyze_react_code
+from utils.compression import compress_body
+from utils.admission import AdmissionError, check_image, get_pixel_budget
+from utils.image_processor import decode_image_input, normalize_image, prepare_model_images
+from utils.image_pool import run_image_task
+from utils.metrics import MetricsBatch, record_metrics
+from utils.rate_limiter import get_rate_limiter
+from utils.single_flight import single_flight_stats
+from utils.timing import StageTimer, server_timing_header
+
+def error_response(error, status_code=500):
+    return JSONResponse({'success': False, 'error': str(error)}, status_code=status_code)
+
+def admission_response(request, error):
+    """Async counterpart of routes.api.admission_response"""
+    request.state.metrics.inc('mss_admission_rejections_total', reason=error.reason)
+    response = error_response(error, error.status)
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@asynccontextmanager
+async def admitted(images, stitched=False):
+    """Header-check encoded images and hold their pixels in the budget, queueing on the event loop"""
+    budget = get_pixel_budget()
+    pixels = sum(check_image(image, stitched) for image in images)
+    lease = await budget.acquire_async(pixels)
+    try:
+        yield
+    finally:
+        await run_blocking(budget.release, lease)
+
+async def read_body(request):
+    """Read the request body, refusing it once it passes MAX_CONTENT_LENGTH"""
+    limit = Config.MAX_CONTENT_LENGTH
+    too_large = AdmissionError(f"Request body exceeds {limit // (1024 * 1024)}MB limit", reason='body_too_large')
+    if int(request.headers.get('content-length') or 0) > limit:
+        raise too_large
+    
+    # Chunked bodies have no length up front; count while reading
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise too_large
+        chunks.append(chunk)
+    # Cache it where request.json() and request.form() will find it
+    request._body = b''.join(chunks)
+
+def instrumented(endpoint):
+    """Async counterpart of the Flask request metrics hooks in routes.api"""
+    @wraps(endpoint)
+    async def wrapper(request):
+        started = time.perf_counter()
+        request.state.metrics = MetricsBatch()
+        request.state.timings = None
+        response = await endpoint(request)
+        
+        elapsed = time.perf_counter() - started
+        request.state.metrics.inc('mss_requests_total', endpoint=endpoint.__name__, status=response.status_code)
+        request.state.metrics.observe('mss_request_duration_seconds', elapsed, endpoint=endpoint.__name__)
+        await run_blocking(record_metrics, request.state.metrics)
+        
+        response.headers['Server-Timing'] = server_timing_header(request.state.timings or {}, total=elapsed * 1000)
+        return compress_response(request, response)
+    return wrapper
+
+def compress_response(request, response):
+    """Async counterpart of routes.api.compress_response; streamed responses go out as they are"""
+    body = getattr(response, 'body', None)
+    if not body or 'content-encoding' in response.headers:
+        return response
+    
+    body, encoding = compress_body(
+        body,
+        response.headers.get('content-type'),
+        request.headers.get('accept-encoding'),
+        Config.RESPONSE_COMPRESS_MIN_BYTES
+    )
+    if encoding is not None:
+        response.body = body
+        response.headers['Content-Length'] = str(len(body))
+        response.headers['Content-Encoding'] = encoding
+        response.headers.add_vary_header('Accept-Encoding')
+    return response
+
+def rate_limited(bucket):
+    """Async counterpart of routes.api.rate_limited, sharing the same buckets"""
+    def decorator(endpoint):
+        @wraps(endpoint)
+        async def wrapper(request):
+            client = request.client.host if request.client else 'unknown'
+            try:
+                quota = await run_blocking(get_rate_limiter().take, bucket, client)
+            except Exception:
+                # A broken limiter store must not take the API down with it
+                return await endpoint(request)
+            
+            if not quota['allowed']:
+                request.state.metrics.inc('mss_rate_limit_rejections_total', bucket=bucket)
+                response = JSONResponse({'error': 'Rate limit exceeded'}, status_code=429)
+                response.headers['Retry-After'] = str(quota['retryAfter'])
+            else:
+                response = await endpoint(request)
+            set_quota_headers(response, quota)
+            return response
+        return wrapper
+    return decorator
+
+async def parse_image_request(request):
+    """Async counterpart of routes.api.parse_image_request"""
+    await read_body(request)
+    mimetype = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    if mimetype == 'multipart/form-data':
+        form = await request.form()
+        fields = {name: value for name, value in form.items() if isinstance(value, str)}
+        upload = form.get('image')
+        image = await upload.read() if upload is not None and not isinstance(upload, str) else None
+    elif mimetype.startswith('image/'):
+        fields = dict(request.query_params)
+        image = await request.body() or None
+    else:
+        try:
+            fields = await request.json()
+        except ValueError:
+            fields = {}
+        fields = fields if isinstance(fields, dict) else {}
+        image = fields.get('image')
+    
+    # Form and query fields arrive as strings
+    if isinstance(fields.get('options'), str):
+        fields['options'] = json.loads(fields['options'] or '{}')
+    
+    return fields, image
+
+def validate_analysis_request(data, image_data):
+    """Return an error response for a malformed analysis request, or None"""
+    if not image_data or 'reactCode' not in data:
+        return JSONResponse({'error': 'Missing required fields: image and reactCode'}, status_code=400)
+    if isinstance(image_data, str) and not image_data.startswith('data:image'):
+        return JSONResponse({'error': 'Invalid image format'}, status_code=400)
+    return None
+
+@instrumented
+async def health(request):
+    return JSONResponse({
+        'status': 'healthy',
+        'timestamp': time.time(),
+        'service': 'multi-shot-scanner',
+        'mode': 'asgi',
+        'upstream': get_model_caller().stats(),
+        'singleFlight': single_flight_stats()
+    })
+
+@instrumented
+@rate_limited('analyze')
+async def analyze(request):
+    try:
+        data, image_data = await parse_image_request(request)
+        invalid = validate_analysis_request(data, image_data)
+        if invalid is not None:
+            return invalid
+        
+        timings = request.state.timings = {}
+        ai_result, cache_info = await run_analysis_pipeline_async(
+            image_data,
+            data['reactCode'],
+            options=data.get('options', {}),
+            timings=timings,
+            metrics=request.state.metrics
+        )
+        request.state.metrics.observe_analysis(timings, ai_result, cache_info)
+        
+        return JSONResponse({
+            'success': True,
+            'result': shape_result(ai_result, data),
+            'cache': cache_info,
+            'timings': timings,
+            'timestamp': time.time(),
+            'imageCount': int(data.get('imageCount', 1))
+        })
+        
+    except AdmissionError as e:
+        return admission_response(request, e)
+    except Exception as e:
+        return error_response(e)
+
+def prepare_stream(image_data, react_code, options, timings):
+    """Local work for a streamed analysis, done before the response starts"""
+    timer = StageTimer(timings)
+    model_images = run_image_task(
+        prepare_model_images, image_data, timings=timer.timings, tiling=options.get('tiling')
+    )
+    with timer.stage('code_analysis'):
+        code_analysis = analyze_react_code(react_code)
+    with timer.stage('layout'):
+        layout = measure_layout(image_data, options)
+    return model_images, code_analysis, layout
+
+@instrumented
+@rate_limited('analyze')
+async def analyze_stream(request):
+    try:
+        data, image_data = await parse_image_request(request)
+        invalid = validate_analysis_request(data, image_data)
+        if invalid is not None:
+            return invalid
+        
+        # Do the local work up front so failures still get a normal JSON error
+        options = data.get('options', {})
+        timings = request.state.timings = {}
+        image_data = await run_blocking(decode_image_input, image_data)
+        async with admitted([image_data], stitched=True):
+            model_images, code_analysis, layout = await run_blocking(
+                prepare_stream, image_data, data['reactCode'], options, timings
+            )
+        request.state.metrics.observe_timings(timings)
+        
+        async def generate():
+            cache_info = None
+            async for event, payload in stream_ui_analysis_async(
+                model_images, data['reactCode'], code_analysis, options=options, layout=layout
+            ):
+                if event == 'cache':
+                    cache_info = payload
+                elif event == 'done':
+                    # The response headers are long gone; record the outcome separately
+                    outcome = MetricsBatch()
+                    outcome.observe_analysis({}, payload, cache_info)
+                    await run_blocking(record_metrics, outcome)
+                yield format_sse(event, shape_event(event, payload, data))
+        
+        return StreamingResponse(
+            generate(),
+            media_type='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        
+    except AdmissionError as e:
+        return admission_response(request, e)
+    except Exception as e:
+        return error_response(e)
+
+@instrumented
+@rate_limited('process')
+async def process_image(request):
+    try:
+        data, image_data = await parse_image_request(request)
+        if not image_data:
+            return JSONResponse({'error': 'Missing image data'}, status_code=400)
+        
+        image_data = await run_blocking(decode_image_input, image_data)
+        async with admitted([image_data]):
+            processed = await run_blocking(run_image_task, normalize_image, image_data)
+        request.state.timings = processed['timings']
+        request.state.metrics.observe_timings(processed['timings'])
+        
+        # Binary clients can skip the base64 round trip entirely
+        accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+        if accept.best_match(['application/json', processed['mediaType']]) == processed['mediaType']:
+            return Response(processed['data'], media_type=processed['mediaType'])
+        
+        return JSONResponse({
+            'success': True,
+            'processedImage': base64.b64encode(processed['data']).decode('ascii'),
+            'mediaType': processed['mediaType'],
+            'width': processed['width'],
+            'height': processed['height'],
+            'passthrough': processed['passthrough'],
+            'timings': processed['timings'],
+            'timestamp': time.time()
+        })
+        
+    except AdmissionError as e:
+        return admission_response(request, e)
+    except Exception as e:
+        return error_response(e)
+
+async def frontend_asset(request):
+    """Precompressed frontend files, served without a trip through the WSGI thread pool"""
+    path = request.path_params.get('path')
+    served = static_assets.serve(
+        f'static/{path}' if path else 'index.html',
+        request.headers.get('accept-encoding'),
+        request.headers.get('if-none-match')
+    )
+    if served is None:
+        return Response('Not found', status_code=404, media_type='text/plain')
+    status, headers, body = served
+    return Response(body, status_code=status, headers=headers)
+
+app = Starlette(routes=[
+    Route('/api/health', health, methods=['GET']),
+    Route('/api/analyze', analyze, methods=['POST']),
+    Route('/api/analyze/stream', analyze_stream, methods=['POST']),
+    Route('/api/process-image', process_image, methods=['POST']),
+    Route('/', frontend_asset, methods=['GET']),
+    Route('/static/{path:path}', frontend_asset, methods=['GET']),
+    # Everything else is served by the Flask app
+    Mount('/', app=WSGIMiddleware(flask_app))
+])
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[origin.strip() for origin in Config.CORS_ORIGINS.split(',')],
+    allow_methods=['*'],
+    allow_headers=['*']
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get('PORT', 5000))
+    uvicorn.run(app, host='0.0.0.0', port=port)
\ No newline at end of file
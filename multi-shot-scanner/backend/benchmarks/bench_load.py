@@ -0,0 +1,236 @@
+# File: backend/benchmarks/bench_load.py
+"""
+End-to-end load test of /api/analyze against a fake model backend.
+
+Starts the fake Anthropic API and the service (gunicorn or uvicorn) as a
+subprocess pointed at it, drives `--requests` analyses from `--concurrency`
+keep-alive clients, and reports throughput, latency percentiles and the
+peak RSS of the server's process tree. Run from backend/:
+
+    python benchmarks/bench_load.py --server gunicorn --workers 2 --concurrency 16 --latency 1.0
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_units import percentile
+from corpus import SCREENSHOTS, make_screenshot
+from bench_code_analyzer import make_source
+from fake_anthropic import FakeAnthropicServer
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def server_command(server, port, workers, threads):
+    if server == 'uvicorn':
+        return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+                '--workers', str(workers), '--log-level', 'warning']
+    return [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers), '--worker-class', 'gthread', '--threads', str(threads),
+            '--timeout', '300', '--log-level', 'warning']
+
+def process_tree(root_pid):
+    """PIDs of a process and all its descendants, from /proc"""
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The command name may contain spaces; fields resume after the last ')'
+                    parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                pass
+    tree = [root_pid]
+    for pid in tree:
+        tree.extend(child for child, parent in parents.items() if parent == pid)
+    return tree
+
+def tree_rss_bytes(root_pid):
+    total = 0
+    for pid in process_tree(root_pid):
+        try:
+            with open(f'/proc/{pid}/statm') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            pass
+    return total
+
+class RssSampler(threading.Thread):
+    """Track the peak combined RSS of a process tree"""
+    
+    def __init__(self, pid, interval=0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+    
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, tree_rss_bytes(self.pid))
+            self._done.wait(self.interval)
+    
+    def stop(self):
+        self._done.set()
+        self.join()
+
+def wait_until_ready(port, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+def run_load(server='gunicorn', workers=2, threads=8, concurrency=16, requests=200, latency=1.0, jitter=0.1,
+             screenshot='laptop-jpeg', source_lines=500, cache_hits=False, error_rate=0.0):
+    """Run one load test and return its report dict"""
+    fake = FakeAnthropicServer(latency=latency, jitter=jitter, error_rate=error_rate).start()
+    port = free_port()
+    data_dir = tempfile.mkdtemp(prefix='mss-bench-')
+    
+    env = dict(os.environ)
+    env.update({
+        'ANTHROPIC_API_KEY': 'benchmark',
+        'ANTHROPIC_BASE_URL': fake.base_url,
+        'DATA_DIR': data_dir,
+        'RATE_LIMIT': str(10 ** 9),
+        'RATE_LIMIT_PROCESS': str(10 ** 9)
+    })
+    process = subprocess.Popen(server_command(server, port, workers, threads), cwd=BACKEND_DIR, env=env)
+    
+    width, height, image_format = SCREENSHOTS[screenshot]
+    image = make_screenshot(width, height, image_format)
+    media_type = 'image/png' if image_format == 'PNG' else 'image/jpeg'
+    data_url = f"data:{media_type};base64,{base64.b64encode(image).decode('ascii')}"
+    code = make_source(source_lines)
+    
+    local = threading.local()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    
+    def one_request(index):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+        # A unique comment per request defeats the result cache unless hits are wanted
+        body = json.dumps({
+            'image': data_url,
+            'reactCode': code if cache_hits else f'{code}\n// request {index}\n'
+        })
+        start = time.perf_counter()
+        try:
+            conn.request('POST', '/api/analyze', body=body, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            local.conn = None
+            status = 'error'
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+    
+    try:
+        wait_until_ready(port, process)
+        sampler = RssSampler(process.pid)
+        sampler.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one_request, range(requests)))
+        duration = time.perf_counter() - started
+        sampler.stop()
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        fake.shutdown()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    
+    succeeded = statuses.get('200', 0)
+    return {
+        'config': {
+            'server': server,
+            'workers': workers,
+            'threads': threads,
+            'concurrency': concurrency,
+            'requests': requests,
+            'latency': latency,
+            'jitter': jitter,
+            'errorRate': error_rate,
+            'screenshot': screenshot,
+            'imageBytes': len(image),
+            'sourceLines': source_lines,
+            'cacheHits': cache_hits
+        },
+        'durationSeconds': round(duration, 3),
+        'throughputRps': round(succeeded / duration, 2),
+        'statuses': statuses,
+        'latencyMs': {
+            'p50': round(percentile(latencies, 0.5), 1),
+            'p90': round(percentile(latencies, 0.9), 1),
+            'p99': round(percentile(latencies, 0.99), 1),
+            'max': round(max(latencies), 1)
+        },
+        'peakRssMb': round(sampler.peak / 2 ** 20, 1),
+        'upstreamRequests': fake.requests
+    }
+
+def add_load_arguments(parser):
+    parser.add_argument('--server', choices=['gunicorn', 'uvicorn'], default='gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=1.0, help='Fake model latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of fake 529 responses')
+    parser.add_argument('--screenshot', choices=list(SCREENSHOTS), default='laptop-jpeg')
+    parser.add_argument('--source-lines', type=int, default=500)
+    parser.add_argument('--cache-hits', action='store_true', help='Send identical requests')
+
+def load_kwargs(args):
+    return {
+        'server': args.server,
+        'workers': args.workers,
+        'threads': args.threads,
+        'concurrency': args.concurrency,
+        'requests': args.requests,
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'error_rate': args.error_rate,
+        'screenshot': args.screenshot,
+        'source_lines': args.source_lines,
+        'cache_hits': args.cache_hits
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_load_arguments(parser)
+    args = parser.parse_args()
+    print(json.dumps(run_load(**load_kwargs(args)), indent=2))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,85 @@
+# File: backend/benchmarks/bench_units.py
+"""
+Per-function benchmarks over the synthetic corpus.
+
+Times the image and code analysis entry points in isolation, each input
+`--repeat` times, and reports median and p99 wall time. Run from backend/:
+
+    python benchmarks/bench_units.py [--repeat 5] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import build_corpus
+from utils.code_analyzer import analyze_react_code, validate_jsx_syntax, extract_component_tree
+from utils.image_processor import extract_dominant_colors, process_image_data
+from utils.jsx_lexer import scan_react_source
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered) + 0.5) - 1))]
+
+def time_calls(fn, arg, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn(arg)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'medianMs': round(percentile(samples, 0.5), 3),
+        'p99Ms': round(percentile(samples, 0.99), 3),
+        'minMs': round(min(samples), 3)
+    }
+
+def run_unit_benchmarks(corpus, repeat=5):
+    """Return one row per (function, input)"""
+    rows = []
+    for name, image in corpus['images'].items():
+        for fn in (process_image_data, extract_dominant_colors):
+            rows.append({
+                'function': fn.__name__,
+                'input': name,
+                'bytes': len(image),
+                **time_calls(fn, image, repeat)
+            })
+    
+    for lines, code in corpus['sources'].items():
+        for fn in (analyze_react_code, validate_jsx_syntax, extract_component_tree):
+            # The lexer caches per source; clear it so every call pays for a scan
+            rows.append({
+                'function': fn.__name__,
+                'input': f'{lines}-lines',
+                'bytes': len(code),
+                **time_calls(fn, code, repeat, setup=scan_react_source.cache_clear)
+            })
+    return rows
+
+def print_rows(rows):
+    print(f"{'function':<26} {'input':<20} {'bytes':>10} {'median ms':>10} {'p99 ms':>9}")
+    for row in rows:
+        print(f"{row['function']:<26} {row['input']:<20} {row['bytes']:>10} "
+              f"{row['medianMs']:>10.2f} {row['p99Ms']:>9.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+    
+    rows = run_unit_benchmarks(build_corpus(), args.repeat)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_rows(rows)
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
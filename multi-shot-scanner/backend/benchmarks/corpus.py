@@ -0,0 +1,84 @@
+# File: backend/benchmarks/corpus.py
+"""
+Deterministic synthetic inputs shared by the benchmarks.
+
+Screenshots are drawn UI-like (header bar, cards, text lines, buttons) so
+compression, palette and layout code see realistic content rather than
+noise; the same seed always yields the same bytes.
+"""
+import os
+import random
+import sys
+from io import BytesIO
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_code_analyzer import make_source
+
+# name -> (width, height, format); tall entries mimic stitched multi-shot captures
+SCREENSHOTS = {
+    'phone-jpeg': (750, 1334, 'JPEG'),
+    'laptop-jpeg': (1440, 900, 'JPEG'),
+    'desktop-4k-jpeg': (3840, 2160, 'JPEG'),
+    'stitched-tall-jpeg': (1080, 7200, 'JPEG'),
+    'phone-rgba-png': (750, 1334, 'PNG'),
+    'desktop-rgba-png': (1920, 1080, 'PNG')
+}
+
+SOURCE_LINES = (20, 100, 1000, 5000, 10000)
+
+PALETTE = [(37, 99, 235), (16, 185, 129), (245, 158, 11), (239, 68, 68), (107, 114, 128), (17, 24, 39)]
+
+def make_screenshot(width, height, image_format='JPEG', seed=0):
+    """Encoded bytes of a synthetic app screenshot"""
+    rng = random.Random(seed)
+    mode = 'RGBA' if image_format == 'PNG' else 'RGB'
+    background = (248, 250, 252, 255) if mode == 'RGBA' else (248, 250, 252)
+    img = Image.new(mode, (width, height), background)
+    draw = ImageDraw.Draw(img)
+    
+    unit = max(8, width // 60)
+    draw.rectangle([0, 0, width, unit * 6], fill=PALETTE[5])
+    
+    # Rows of cards with text lines and a button, down the whole page
+    y = unit * 8
+    columns = 1 if width < 1000 else 3
+    card_width = (width - unit * (columns + 1)) // columns
+    while y + unit * 20 < height:
+        for column in range(columns):
+            x = unit + column * (card_width + unit)
+            card_height = unit * rng.randint(14, 20)
+            # PNG captures get translucent cards so the alpha channel matters
+            fill = (255, 255, 255, 220) if mode == 'RGBA' else (255, 255, 255)
+            draw.rounded_rectangle([x, y, x + card_width, y + card_height], radius=unit, fill=fill,
+                                   outline=(226, 232, 240))
+            for line in range(rng.randint(3, 6)):
+                length = rng.randint(card_width // 3, card_width - unit * 2)
+                top = y + unit * (2 + line * 2)
+                draw.rectangle([x + unit, top, x + unit + length, top + unit // 2], fill=PALETTE[4])
+            button = PALETTE[rng.randrange(4)]
+            draw.rounded_rectangle([x + unit, y + card_height - unit * 4, x + unit * 10, y + card_height - unit],
+                                   radius=unit // 2, fill=button)
+        y += unit * 22
+    
+    buffer = BytesIO()
+    if image_format == 'JPEG':
+        img.save(buffer, format='JPEG', quality=92)
+    else:
+        img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def build_corpus(screenshots=None, source_lines=None):
+    """
+    Return {'images': {name: bytes}, 'sources': {lines: code}} for the given
+    subsets (all by default)
+    """
+    names = screenshots or list(SCREENSHOTS)
+    images = {}
+    for index, name in enumerate(names):
+        width, height, image_format = SCREENSHOTS[name]
+        images[name] = make_screenshot(width, height, image_format, seed=index)
+    
+    sources = {lines: make_source(lines) for lines in (source_lines or SOURCE_LINES)}
+    return {'images': images, 'sources': sources}
\ No newline at end of file
@@ -0,0 +1,132 @@
+# File: backend/benchmarks/fake_anthropic.py
+"""
+Local stand-in for the Anthropic messages API.
+
+Answers POST /v1/messages (plain and streamed) after a configurable
+delay, so load tests exercise the service without network calls or API
+spend. Point the service at it with ANTHROPIC_BASE_URL. Run standalone:
+
+    python benchmarks/fake_anthropic.py --port 8901 --latency 1.5 --jitter 0.3
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE_TEXT = (
+    "The card grid is misaligned on narrow screens.\n\n"
+    "```jsx\nexport default function App() {\n  return <main className=\"grid gap-4\" />;\n}\n```\n"
+)
+
+class FakeAnthropicHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server = self.server
+        server.count_request()
+        
+        if server.error_rate and random.random() < server.error_rate:
+            time.sleep(server.latency / 10)
+            return self._send_json(529, {'type': 'error', 'error': {'type': 'overloaded_error', 'message': 'Overloaded'}})
+        
+        time.sleep(max(0.0, random.gauss(server.latency, server.jitter)))
+        
+        # Roughly what the real API would bill for the prompt
+        input_tokens = max(1, len(json.dumps(body)) // 4)
+        output_tokens = len(RESPONSE_TEXT) // 4
+        
+        if body.get('stream'):
+            return self._send_stream(input_tokens, output_tokens)
+        
+        self._send_json(200, {
+            'id': 'msg_fake',
+            'type': 'message',
+            'role': 'assistant',
+            'model': body.get('model', 'fake'),
+            'content': [{'type': 'text', 'text': RESPONSE_TEXT}],
+            'stop_reason': 'end_turn',
+            'stop_sequence': None,
+            'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens}
+        })
+    
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _send_stream(self, input_tokens, output_tokens):
+        events = [
+            ('message_start', {'type': 'message_start', 'message': {
+                'id': 'msg_fake', 'type': 'message', 'role': 'assistant', 'model': 'fake', 'content': [],
+                'stop_reason': None, 'stop_sequence': None,
+                'usage': {'input_tokens': input_tokens, 'output_tokens': 0}
+            }}),
+            ('content_block_start', {'type': 'content_block_start', 'index': 0,
+                                     'content_block': {'type': 'text', 'text': ''}})
+        ]
+        for start in range(0, len(RESPONSE_TEXT), 40):
+            events.append(('content_block_delta', {'type': 'content_block_delta', 'index': 0, 'delta': {
+                'type': 'text_delta', 'text': RESPONSE_TEXT[start:start + 40]
+            }}))
+        events += [
+            ('content_block_stop', {'type': 'content_block_stop', 'index': 0}),
+            ('message_delta', {'type': 'message_delta', 'delta': {'stop_reason': 'end_turn', 'stop_sequence': None},
+                               'usage': {'output_tokens': output_tokens}}),
+            ('message_stop', {'type': 'message_stop'})
+        ]
+        data = ''.join(f"event: {event}\ndata: {json.dumps(payload)}\n\n" for event, payload in events).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        pass
+
+class FakeAnthropicServer(ThreadingHTTPServer):
+    """Threaded fake API; `latency` and `jitter` are seconds, `error_rate` a 0-1 share of 529s"""
+    
+    daemon_threads = True
+    
+    def __init__(self, port=0, latency=1.0, jitter=0.0, error_rate=0.0):
+        super().__init__(('127.0.0.1', port), FakeAnthropicHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+    
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+    
+    def start(self):
+        """Serve on a daemon thread and return self"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--latency', type=float, default=1.0, help='Mean response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Standard deviation of the delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 529')
+    args = parser.parse_args()
+    
+    server = FakeAnthropicServer(args.port, args.latency, args.jitter, args.error_rate)
+    print(f"Fake Anthropic API on {server.base_url}")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,92 @@
+# File: backend/benchmarks/run_benchmarks.py
+"""
+Run the unit and load benchmarks and write one JSON report.
+
+Reports record the git revision and environment so runs of different
+versions can be compared. Run from backend/:
+
+    python benchmarks/run_benchmarks.py --output report.json [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_load import add_load_arguments, load_kwargs, run_load
+from bench_units import print_rows, run_unit_benchmarks
+from corpus import build_corpus
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report, baseline):
+    """Print current vs baseline for the headline numbers; ratios above 1 are slower or bigger"""
+    old_units = {(row['function'], row['input']): row for row in baseline.get('units', [])}
+    print(f"{'':<47} {'baseline':>12} {'current':>11} {'ratio':>7}")
+    for row in report.get('units', []):
+        old = old_units.get((row['function'], row['input']))
+        if old and old['medianMs']:
+            print(f"{row['function']:<26} {row['input']:<20} {old['medianMs']:>12.2f} "
+                  f"{row['medianMs']:>11.2f} {row['medianMs'] / old['medianMs']:>7.2f}")
+    
+    old_load, load = baseline.get('load'), report.get('load')
+    if old_load and load:
+        for label, old_value, value in (
+            ('throughput rps', old_load['throughputRps'], load['throughputRps']),
+            ('p50 ms', old_load['latencyMs']['p50'], load['latencyMs']['p50']),
+            ('p99 ms', old_load['latencyMs']['p99'], load['latencyMs']['p99']),
+            ('peak RSS MB', old_load['peakRssMb'], load['peakRssMb'])
+        ):
+            ratio = f"{value / old_value:.2f}" if old_value else '-'
+            print(f"{label:<47} {old_value:>12} {value:>11} {ratio:>7}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--output', default='benchmark-report.json')
+    parser.add_argument('--compare', help='Baseline report to compare against')
+    parser.add_argument('--repeat', type=int, default=5, help='Repetitions per unit benchmark')
+    parser.add_argument('--skip-units', action='store_true')
+    parser.add_argument('--skip-load', action='store_true')
+    add_load_arguments(parser)
+    args = parser.parse_args()
+    
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+    
+    if not args.skip_units:
+        report['units'] = run_unit_benchmarks(build_corpus(), args.repeat)
+        print_rows(report['units'])
+    
+    if not args.skip_load:
+        report['load'] = run_load(**load_kwargs(args))
+        load = report['load']
+        print(f"\n{load['throughputRps']} req/s, p50 {load['latencyMs']['p50']} ms, "
+              f"p99 {load['latencyMs']['p99']} ms, peak RSS {load['peakRssMb']} MB, statuses {load['statuses']}")
+    
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+    
+    if args.compare:
+        with open(args.compare) as f:
+            print()
+            compare(report, json.load(f))
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
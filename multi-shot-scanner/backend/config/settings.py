@@ -1,5 +1,6 @@
 # File: backend/config/settings.py
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,14 +12,123 @@ class Config:
     
     # Anthropic API
     ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
+    ANTHROPIC_MODEL = os.getenv('ANTHROPIC_MODEL', 'claude-3-5-sonnet-20241022')
+    ANTHROPIC_BASE_URL = os.getenv('ANTHROPIC_BASE_URL')  # e.g. a local stub of the messages API
+    PROMPT_CACHING_ENABLED = os.getenv('PROMPT_CACHING_ENABLED', 'True').lower() == 'true'
+    
+    # Anthropic client resilience
+    ANTHROPIC_CONNECT_TIMEOUT = float(os.getenv('ANTHROPIC_CONNECT_TIMEOUT', '5'))  # seconds
+    ANTHROPIC_READ_TIMEOUT = float(os.getenv('ANTHROPIC_READ_TIMEOUT', '120'))  # max wait for each read
+    ANTHROPIC_POOL_CONNECTIONS = int(os.getenv('ANTHROPIC_POOL_CONNECTIONS', '20'))
+    ANTHROPIC_POOL_KEEPALIVE = int(os.getenv('ANTHROPIC_POOL_KEEPALIVE', '10'))
+    ANTHROPIC_KEEPALIVE_EXPIRY = float(os.getenv('ANTHROPIC_KEEPALIVE_EXPIRY', '30'))
+    ANTHROPIC_MAX_RETRIES = int(os.getenv('ANTHROPIC_MAX_RETRIES', '2'))
+    ANTHROPIC_RETRY_BASE = float(os.getenv('ANTHROPIC_RETRY_BASE', '0.5'))  # seconds, doubled per retry
+    ANTHROPIC_RETRY_MAX = float(os.getenv('ANTHROPIC_RETRY_MAX', '8'))
+    ANTHROPIC_HEDGE_AFTER = float(os.getenv('ANTHROPIC_HEDGE_AFTER', '0'))  # seconds before a hedged request; 0 disables
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '30'))
+    
+    # Local state shared by all workers on a host
+    DATA_DIR = os.getenv('DATA_DIR', os.path.join(tempfile.gettempdir(), 'multi-shot-scanner'))
+    
+    # Analysis result cache
+    CACHE_ENABLED = os.getenv('CACHE_ENABLED', 'True').lower() == 'true'
+    CACHE_DB_PATH = os.getenv('CACHE_DB_PATH', os.path.join(DATA_DIR, 'cache.db'))
+    CACHE_TTL = int(os.getenv('CACHE_TTL', '604800'))  # 7 days
+    CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', '268435456'))  # 256MB
+    CACHE_MEMORY_ENTRIES = int(os.getenv('CACHE_MEMORY_ENTRIES', '128'))
+    
+    # Near-duplicate screenshot matching (bits out of a 64-bit dHash)
+    PHASH_ENABLED = os.getenv('PHASH_ENABLED', 'True').lower() == 'true'
+    PHASH_MAX_DISTANCE = int(os.getenv('PHASH_MAX_DISTANCE', '6'))
+    
+    # Identical analyses in flight on the host share one model call
+    SINGLE_FLIGHT_ENABLED = os.getenv('SINGLE_FLIGHT_ENABLED', 'True').lower() == 'true'
+    SINGLE_FLIGHT_WAIT = float(os.getenv('SINGLE_FLIGHT_WAIT', '300'))  # seconds a duplicate waits before calling itself
+    SINGLE_FLIGHT_DB_PATH = os.getenv('SINGLE_FLIGHT_DB_PATH', os.path.join(DATA_DIR, 'flights.db'))
     
     # Image processing limits
     MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', '10485760'))  # 10MB default
     MAX_IMAGE_WIDTH = int(os.getenv('MAX_IMAGE_WIDTH', '4096'))
     MAX_IMAGE_HEIGHT = int(os.getenv('MAX_IMAGE_HEIGHT', '4096'))
+    # Stitched captures sent for analysis are tall; their pixel count is bounded by PIXEL_BUDGET
+    MAX_STITCHED_HEIGHT = int(os.getenv('MAX_STITCHED_HEIGHT', '32768'))
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', '33554432'))  # 32MB request body, checked before parsing
+    
+    # Admission control: decoded pixels in flight across all workers on the host
+    PIXEL_BUDGET = int(os.getenv('PIXEL_BUDGET', str(4 * 4096 * 4096)))
+    PIXEL_BUDGET_WAIT = float(os.getenv('PIXEL_BUDGET_WAIT', '10'))  # seconds queued before a 503
+    ADMISSION_DB_PATH = os.getenv('ADMISSION_DB_PATH', os.path.join(DATA_DIR, 'admission.db'))
+    
+    # Image normalization before sending to the model
+    IMAGE_MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', '2048'))
+    IMAGE_RESAMPLE = os.getenv('IMAGE_RESAMPLE', 'LANCZOS')  # any PIL Image.Resampling name
+    IMAGE_OUTPUT_FORMAT = os.getenv('IMAGE_OUTPUT_FORMAT', 'JPEG')
+    IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '85'))
+    IMAGE_OPTIMIZE = os.getenv('IMAGE_OPTIMIZE', 'True').lower() == 'true'
+    IMAGE_PASSTHROUGH_BYTES = int(os.getenv('IMAGE_PASSTHROUGH_BYTES', '1048576'))  # 1MB
+    
+    # Process pool for image decode/resize/encode (0 runs them on the request thread)
+    IMAGE_POOL_WORKERS = int(os.getenv('IMAGE_POOL_WORKERS', '0'))
+    IMAGE_POOL_TIMEOUT = float(os.getenv('IMAGE_POOL_TIMEOUT', '30'))  # seconds per image task
+    IMAGE_POOL_START_METHOD = os.getenv('IMAGE_POOL_START_METHOD', 'forkserver')  # or 'spawn'
+    
+    # Token budget for the React code embedded in prompts (0 keeps every component in full)
+    PROMPT_CODE_TOKEN_BUDGET = int(os.getenv('PROMPT_CODE_TOKEN_BUDGET', '8000'))
+    
+    # Pixel-measured layout metrics added to ui_fix prompts
+    LAYOUT_METRICS_ENABLED = os.getenv('LAYOUT_METRICS_ENABLED', 'True').lower() == 'true'
+    
+    # Tiling of tall screenshots ('auto', 'on' or 'off')
+    TILING_MODE = os.getenv('TILING_MODE', 'auto')
+    TILE_ASPECT_RATIO = float(os.getenv('TILE_ASPECT_RATIO', '2.5'))  # height / width that triggers tiling
+    TILE_MAX_SIDE = int(os.getenv('TILE_MAX_SIDE', '1568'))  # model's per-image long edge
+    TILE_MAX_PIXELS = int(os.getenv('TILE_MAX_PIXELS', '1150000'))  # model's per-image pixel budget
+    TILE_OVERLAP = int(os.getenv('TILE_OVERLAP', '64'))
+    TILE_MAX_COUNT = int(os.getenv('TILE_MAX_COUNT', '8'))
+    TILE_MIN_WIDTH = int(os.getenv('TILE_MIN_WIDTH', '720'))  # narrowest legible tile
+    
+    # Background analysis jobs
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+    JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', '32'))
+    JOB_TTL = int(os.getenv('JOB_TTL', '3600'))  # keep finished jobs for 1 hour
+    JOBS_DB_PATH = os.getenv('JOBS_DB_PATH', os.path.join(DATA_DIR, 'jobs.db'))
+    
+    # Incremental multi-shot sessions, processed while the user is still capturing
+    SESSION_TTL = int(os.getenv('SESSION_TTL', '900'))  # idle seconds before a session expires
+    SESSION_MAX_SHOTS = int(os.getenv('SESSION_MAX_SHOTS', '20'))
+    SESSION_WORKERS = int(os.getenv('SESSION_WORKERS', '2'))  # background threads per process
+    SESSION_WAIT = float(os.getenv('SESSION_WAIT', '30'))  # seconds analyze waits for shots still processing
+    SESSIONS_DB_PATH = os.getenv('SESSIONS_DB_PATH', os.path.join(DATA_DIR, 'sessions.db'))
+    SESSIONS_DIR = os.getenv('SESSIONS_DIR', os.path.join(DATA_DIR, 'sessions'))
+    
+    # Batch analysis
+    BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '50'))
+    BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '8'))  # threads for local image/code work
+    BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))  # concurrent model calls
+    BATCH_MAX_RETRIES = int(os.getenv('BATCH_MAX_RETRIES', '4'))  # retries on 429/529, timeouts and server errors
+    BATCH_BACKOFF_BASE = float(os.getenv('BATCH_BACKOFF_BASE', '1.0'))  # seconds
+    BATCH_BACKOFF_MAX = float(os.getenv('BATCH_BACKOFF_MAX', '30.0'))
+    
+    # ASGI serving mode (asgi.py): threads for PIL/NumPy work per process
+    ASGI_CPU_THREADS = int(os.getenv('ASGI_CPU_THREADS', str(min(8, os.cpu_count() or 1))))
+    
+    # Frontend assets, compressed and fingerprinted once at startup
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', '31536000'))  # 1 year for fingerprinted files
+    STATIC_COMPRESS_MIN_BYTES = int(os.getenv('STATIC_COMPRESS_MIN_BYTES', '512'))
+    
+    # API responses (JSON) are compressed per request from this size up
+    RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
     
     # Rate limiting
-    RATE_LIMIT = int(os.getenv('RATE_LIMIT', '100'))  # requests per hour
+    RATE_LIMIT = int(os.getenv('RATE_LIMIT', '100'))  # analysis requests per hour
+    RATE_LIMIT_PROCESS = int(os.getenv('RATE_LIMIT_PROCESS', '1000'))  # image-only requests per hour
+    RATE_LIMIT_DB_PATH = os.getenv('RATE_LIMIT_DB_PATH', os.path.join(DATA_DIR, 'ratelimit.db'))
+    
+    # Prometheus metrics, aggregated across workers in a shared SQLite file
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_DB_PATH = os.getenv('METRICS_DB_PATH', os.path.join(DATA_DIR, 'metrics.db'))
     
     # CORS settings
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*')
@@ -1,59 +1,498 @@
 # File: backend/routes/ai_service.py
 import anthropic
+import asyncio
 import base64
+import httpx
 import json
+import random
 import re
 import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
+from functools import partial
+from config.settings import Config
+from utils.admission import check_image, get_pixel_budget
+from utils.image_pool import run_image_task
+from utils.image_processor import (
+    decode_image_input, extract_palette, image_media_type, perceptual_hash, prepare_model_images
+)
+from utils.timing import StageTimer
+from utils.code_analyzer import analyze_react_code
+from utils.layout_analyzer import analyze_layout, format_layout_summary
+from utils.prompt_compactor import compact_react_code, compaction_report, expand_collapsed, is_patchable
+from utils.result_cache import cache_key, get_result_cache, get_near_duplicate_index
+from utils.single_flight import get_single_flight
 
-# Initialize Anthropic client lazily
+# Bump whenever the prompts change so cached analyses are not reused
+PROMPT_VERSION = '6'
+
+# Initialize Anthropic clients lazily
 client = None
+async_client = None
+blocking_pool = None
+
+def client_http_settings():
+    """Timeout and keep-alive pool limits shared by the sync and async clients"""
+    timeout = httpx.Timeout(
+        Config.ANTHROPIC_READ_TIMEOUT,
+        connect=Config.ANTHROPIC_CONNECT_TIMEOUT,
+        pool=Config.ANTHROPIC_CONNECT_TIMEOUT
+    )
+    limits = httpx.Limits(
+        max_connections=Config.ANTHROPIC_POOL_CONNECTIONS,
+        max_keepalive_connections=Config.ANTHROPIC_POOL_KEEPALIVE,
+        keepalive_expiry=Config.ANTHROPIC_KEEPALIVE_EXPIRY
+    )
+    return timeout, limits
 
 def get_anthropic_client():
-    """Get or create Anthropic client"""
+    """
+    Get or create Anthropic client.
+    
+    Connect and read timeouts and the keep-alive pool are set explicitly;
+    SDK retries are off because ResilientCaller does the retrying.
+    """
     global client
     if client is None:
-        from config.settings import Config
         api_key = Config.ANTHROPIC_API_KEY
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
-        client = anthropic.Anthropic(api_key=api_key)
+        timeout, limits = client_http_settings()
+        client = anthropic.Anthropic(
+            api_key=api_key,
+            base_url=Config.ANTHROPIC_BASE_URL,
+            timeout=timeout,
+            max_retries=0,
+            http_client=anthropic.DefaultHttpxClient(timeout=timeout, limits=limits)
+        )
     return client
 
-def analyze_ui_with_ai(image_data, react_code, code_analysis, options=None):
+def get_async_anthropic_client():
+    """Get or create the async Anthropic client used by the ASGI app"""
+    global async_client
+    if async_client is None:
+        api_key = Config.ANTHROPIC_API_KEY
+        if not api_key:
+            raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
+        timeout, limits = client_http_settings()
+        async_client = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            base_url=Config.ANTHROPIC_BASE_URL,
+            timeout=timeout,
+            max_retries=0,
+            http_client=anthropic.DefaultAsyncHttpxClient(timeout=timeout, limits=limits)
+        )
+    return async_client
+
+def run_blocking(fn, *args, **kwargs):
     """
-    Send image and React code to Claude for UI analysis
+    Run CPU-bound or blocking work (PIL, NumPy, SQLite) off the event loop.
+    
+    Uses a bounded thread pool so a burst of uploads cannot start more
+    image decodes than ASGI_CPU_THREADS at once; returns an awaitable.
+    """
+    global blocking_pool
+    if blocking_pool is None:
+        blocking_pool = ThreadPoolExecutor(max_workers=Config.ASGI_CPU_THREADS, thread_name_prefix='asgi-cpu')
+    return asyncio.get_running_loop().run_in_executor(blocking_pool, partial(fn, *args, **kwargs))
+
+# Statuses worth retrying: timeouts, conflicts, rate limits, server errors and overload
+RETRYABLE_STATUSES = (408, 409, 429)
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """
+    Fail fast during upstream incidents.
+    
+    After `failure_threshold` consecutive retryable failures the circuit
+    opens and calls are refused for `reset_timeout` seconds; then a single
+    probe call is let through (half-open) and its outcome closes or
+    re-opens the circuit. A probe whose outcome says nothing about
+    upstream health is released so the next call can probe instead.
     """
+    
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.opened = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = 'half-open'
+                self._probing = False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._probing = False
+    
+    def release(self):
+        """End an attempt that neither closes nor re-opens the circuit"""
+        with self._lock:
+            self._probing = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == 'half-open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.opened += 1
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+                self._probing = False
+    
+    def retry_after(self):
+        """Seconds until the next probe is allowed"""
+        with self._lock:
+            if self.state != 'open':
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+def is_retryable(error):
+    """Connection errors, timeouts and retryable HTTP statuses"""
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUSES or error.status_code >= 500
+    return False
+
+def record_outcome(breaker, error):
+    """
+    Tell the breaker what a failed attempt says about upstream health.
+    
+    Retryable errors count as failures, except 429: rate limiting is
+    per-caller back-pressure (the batch limiter backs off on it), not an
+    outage. Any other HTTP error means upstream answered, and errors
+    raised before or after the request just release a half-open probe.
+    """
+    rate_limited = isinstance(error, anthropic.APIStatusError) and error.status_code == 429
+    if is_retryable(error) and not rate_limited:
+        breaker.record_failure()
+    elif isinstance(error, anthropic.APIStatusError) and not rate_limited:
+        breaker.record_success()
+    else:
+        breaker.release()
+
+def retry_after_seconds(error):
+    """The Retry-After header of an API error, in seconds, if present and sane"""
+    response = getattr(error, 'response', None)
     try:
-        # Get client
-        ai_client = get_anthropic_client()
+        value = float(response.headers.get('retry-after', ''))
+    except (AttributeError, ValueError):
+        return None
+    return value if 0 <= value <= 60 else None
+
+class ResilientCaller:
+    """
+    Retries, circuit breaking, hedging and latency stats around upstream calls.
+    
+    Timeouts and connection pooling live on the HTTP client itself (see
+    get_anthropic_client); the SDK's own retries are disabled so every
+    attempt passes through here. call() returns (result, call_info) where
+    call_info has the attempts, latency and whether a hedge was sent.
+    """
+    
+    # Latencies kept for percentiles
+    WINDOW = 1024
+    
+    def __init__(self, max_retries=2, backoff_base=0.5, backoff_max=8.0, hedge_after=0.0,
+                 breaker=None, hedge_workers=8):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self._hedge_pool = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix='model-hedge') if hedge_after else None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=self.WINDOW)
+        self._counts = {'calls': 0, 'failures': 0, 'retries': 0, 'hedged': 0, 'hedgeWins': 0, 'rejected': 0}
+    
+    def _count(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                self._counts[name] += value
+    
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self._count(rejected=1)
+            raise CircuitOpenError(
+                f"Upstream circuit is open after repeated failures; retry in {self.breaker.retry_after():.1f}s"
+            )
+    
+    def _failure_delay(self, error, attempt):
+        """Record a failed attempt and return the delay before the next one, or re-raise if there is none"""
+        record_outcome(self.breaker, error)
+        if not is_retryable(error) or attempt >= self.max_retries:
+            raise error
+        delay = retry_after_seconds(error)
+        if delay is None:
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+        self._count(retries=1)
+        return delay
+    
+    def _finish(self, started, attempts, hedged=False, hedge_won=False, failed=False):
+        latency = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._counts['calls'] += 1
+            self._counts['failures'] += int(failed)
+            self._counts['hedged'] += int(hedged)
+            self._counts['hedgeWins'] += int(hedge_won)
+            if not failed:
+                self._latencies.append(latency)
+        return {'attempts': attempts, 'latencyMs': round(latency, 2), 'hedged': hedged, 'hedgeWon': hedge_won}
+    
+    def _attempt(self, fn, args, kwargs):
+        """One attempt, hedged with a second identical request if the first is slow"""
+        if self._hedge_pool is None:
+            return fn(*args, **kwargs), False, False
         
-        # Default options
-        options = options or {}
-        analysis_type = options.get('analysisType', 'ui_fix')
-        include_explanation = options.get('includeExplanation', True)
+        primary = self._hedge_pool.submit(fn, *args, **kwargs)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result(), False, False
         
-        # Prepare the image for Claude
-        if image_data.startswith('data:image'):
-            # Remove data URL prefix
-            image_data = image_data.split(',')[1]
+        hedge = self._hedge_pool.submit(fn, *args, **kwargs)
+        error = None
+        for future in as_completed([primary, hedge]):
+            try:
+                # The slower request is left to finish in the background
+                return future.result(), True, future is hedge
+            except Exception as e:
+                error = e
+        raise error
+    
+    def call(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) with retries; returns (result, call_info)"""
+        started = time.perf_counter()
+        hedged = False
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            try:
+                result, attempt_hedged, hedge_won = self._attempt(fn, args, kwargs)
+            except Exception as e:
+                try:
+                    delay = self._failure_delay(e, attempt)
+                except Exception:
+                    self._finish(started, attempt + 1, hedged, failed=True)
+                    raise
+                time.sleep(delay)
+                continue
+            hedged = hedged or attempt_hedged
+            self.breaker.record_success()
+            return result, self._finish(started, attempt + 1, hedged, hedge_won)
+    
+    @contextmanager
+    def stream(self, fn, *args, **kwargs):
+        """
+        Enter a streaming context manager from fn(*args, **kwargs) with retries.
         
-        # Decode base64 to get image bytes
-        image_bytes = base64.b64decode(image_data)
+        Only opening the stream is retried; once events flow, errors are
+        passed to the caller. Streams are never hedged.
+        """
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            with ExitStack() as stack:
+                try:
+                    stream = stack.enter_context(fn(*args, **kwargs))
+                except Exception as e:
+                    try:
+                        delay = self._failure_delay(e, attempt)
+                    except Exception:
+                        self._finish(started, attempt + 1, failed=True)
+                        raise
+                    time.sleep(delay)
+                    continue
+                
+                self.breaker.record_success()
+                try:
+                    yield stream
+                except Exception:
+                    self._finish(started, attempt + 1, failed=True)
+                    raise
+                self._finish(started, attempt + 1)
+                return
+    
+    async def _attempt_async(self, fn, args, kwargs):
+        """Async counterpart of _attempt; the losing request of a hedge is cancelled"""
+        if not self.hedge_after:
+            return await fn(*args, **kwargs), False, False
+        
+        primary = asyncio.ensure_future(fn(*args, **kwargs))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result(), False, False
         
-        # Construct the prompt based on analysis type
-        prompts = {
-            'ui_fix': f"""I have a React component and a screenshot of its current UI. Please analyze the visual issues and provide the fixed code.
+        hedge = asyncio.ensure_future(fn(*args, **kwargs))
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return future.result(), True, future is hedge
+                error = future.exception()
+        raise error
+    
+    async def call_async(self, fn, *args, **kwargs):
+        """Async counterpart of call() for coroutine functions"""
+        started = time.perf_counter()
+        hedged = False
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            try:
+                result, attempt_hedged, hedge_won = await self._attempt_async(fn, args, kwargs)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                try:
+                    delay = self._failure_delay(e, attempt)
+                except Exception:
+                    self._finish(started, attempt + 1, hedged, failed=True)
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            hedged = hedged or attempt_hedged
+            self.breaker.record_success()
+            return result, self._finish(started, attempt + 1, hedged, hedge_won)
+    
+    @asynccontextmanager
+    async def stream_async(self, fn, *args, **kwargs):
+        """Async counterpart of stream() for async streaming context managers"""
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            self._check_breaker()
+            async with AsyncExitStack() as stack:
+                try:
+                    stream = await stack.enter_async_context(fn(*args, **kwargs))
+                except asyncio.CancelledError:
+                    self.breaker.release()
+                    raise
+                except Exception as e:
+                    try:
+                        delay = self._failure_delay(e, attempt)
+                    except Exception:
+                        self._finish(started, attempt + 1, failed=True)
+                        raise
+                    await asyncio.sleep(delay)
+                    continue
+                
+                self.breaker.record_success()
+                try:
+                    yield stream
+                except Exception:
+                    self._finish(started, attempt + 1, failed=True)
+                    raise
+                self._finish(started, attempt + 1)
+                return
+    
+    def stats(self):
+        """Call counts, retries, hedging, breaker state and latency percentiles"""
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = sorted(self._latencies)
+        
+        def percentile(q):
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 2) if latencies else None
+        
+        counts['circuit'] = {'state': self.breaker.state, 'opened': self.breaker.opened}
+        counts['latencyMs'] = {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99)}
+        return counts
 
-Current React Code:
-```jsx
-{react_code}
-```
+caller = None
 
-Code Analysis Summary:
-- Components found: {', '.join(code_analysis.get('components', []))}
-- Has useState: {code_analysis.get('has_state', False)}
-- Has useEffect: {code_analysis.get('has_effects', False)}
-- CSS approach: {code_analysis.get('styling_approach', 'unknown')}
+def get_model_caller():
+    """Get or create the process-wide resilient caller"""
+    global caller
+    if caller is None:
+        caller = ResilientCaller(
+            max_retries=Config.ANTHROPIC_MAX_RETRIES,
+            backoff_base=Config.ANTHROPIC_RETRY_BASE,
+            backoff_max=Config.ANTHROPIC_RETRY_MAX,
+            hedge_after=Config.ANTHROPIC_HEDGE_AFTER,
+            breaker=CircuitBreaker(Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_TIMEOUT),
+            hedge_workers=Config.ANTHROPIC_POOL_CONNECTIONS
+        )
+    return caller
+
+batch_caller = None
+
+def get_batch_caller():
+    """
+    Get or create the caller for batch items: no retries of its own, so a
+    429 reaches the batch's AdaptiveLimiter at once, and the process-wide
+    circuit breaker, so batches still see (and feed) upstream outages
+    """
+    global batch_caller
+    if batch_caller is None:
+        batch_caller = ResilientCaller(max_retries=0, breaker=get_model_caller().breaker)
+    return batch_caller
+
+def image_content_block(image_data, media_type=None):
+    """
+    Build an Anthropic image content block.
+    
+    This is the single place image bytes are base64-encoded; data URL and
+    base64 strings from older callers are passed through as-is.
+    """
+    if isinstance(image_data, str):
+        data = image_data.split(',', 1)[1] if image_data.startswith('data:') else image_data
+        media_type = media_type or 'image/jpeg'
+    else:
+        data = base64.b64encode(image_data).decode('ascii')
+        media_type = media_type or image_media_type(image_data)
+    
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": media_type,
+            "data": data
+        }
+    }
+
+def compact_prompt_code(react_code, options=None):
+    """
+    Fit the React code into the prompt's token budget.
+    
+    options may override the budget ('codeTokenBudget') and name the
+    components shown in the screenshot ('focusComponents').
+    """
+    options = options or {}
+    budget = int(options.get('codeTokenBudget', Config.PROMPT_CODE_TOKEN_BUDGET))
+    return compact_react_code(react_code, budget, focus=options.get('focusComponents'))
+
+def prompt_version(options=None):
+    """PROMPT_VERSION plus the options that change how code appears in the prompt"""
+    options = options or {}
+    budget = options.get('codeTokenBudget', Config.PROMPT_CODE_TOKEN_BUDGET)
+    focus = ','.join(options.get('focusComponents') or [])
+    return f"{PROMPT_VERSION}:{budget}:{focus}"
+
+# Stable instructions per analysis type, sent as the cached system prompt
+SYSTEM_PROMPTS = {
+    'ui_fix': """I have a React component and a screenshot of its current UI. Please analyze the visual issues and provide the fixed code.
 
 Please:
 1. Identify all visual issues in the screenshot
@@ -62,127 +501,730 @@ Please:
 4. Include any necessary CSS fixes
 
 Focus on fixing layout issues, spacing problems, alignment, colors, and any UI inconsistencies.""",
-            
-            'code_review': f"""Review this React component and its rendered UI for best practices and potential improvements.
-
-React Code:
-```jsx
-{react_code}
-```
+    
+    'code_review': """Review this React component and its rendered UI for best practices and potential improvements.
 
 Please provide:
 1. Code quality assessment
 2. Performance suggestions
 3. Accessibility improvements
 4. Best practice recommendations""",
-            
-            'figma_to_code': """Convert this Figma design to a React component. 
+    
+    'figma_to_code': """Convert this Figma design to a React component. 
 Please provide complete, production-ready React code with proper styling."""
-        }
+}
+
+def build_prompt_blocks(react_code, code_analysis, analysis_type, layout=None, collapsed=None, tile_count=1):
+    """
+    Split the prompt into blocks ordered from most to least stable.
+    
+    Returns a dict of 'system', 'code', 'summary' and 'request' text; the
+    first three repeat across calls while iterating on one component and
+    are cached by the provider, 'request' carries the per-screenshot
+    parts. Empty blocks are left out of the request.
+    """
+    if analysis_type not in SYSTEM_PROMPTS:
+        analysis_type = 'ui_fix'
+    
+    code_note = ''
+    if collapsed:
+        code_note = """
+
+Component bodies shown as `{ /* collapsed: Name (unchanged) */ }` were left out to save space. Keep those markers exactly as they are in any code you return."""
+    
+    blocks = {'system': SYSTEM_PROMPTS[analysis_type], 'code': '', 'summary': '', 'request': ''}
+    
+    if analysis_type == 'ui_fix':
+        blocks['code'] = f"""Current React Code:
+```jsx
+{react_code}
+```{code_note}"""
+        blocks['summary'] = f"""Code Analysis Summary:
+- Components found: {', '.join(code_analysis.get('components', []))}
+- Has useState: {code_analysis.get('has_state', False)}
+- Has useEffect: {code_analysis.get('has_effects', False)}
+- CSS approach: {code_analysis.get('styling_approach', 'unknown')}"""
+    elif analysis_type == 'code_review':
+        blocks['code'] = f"""React Code:
+```jsx
+{react_code}
+```{code_note}"""
+    
+    request = []
+    if tile_count > 1:
+        request.append(f"The screenshot is a tall capture split into {tile_count} overlapping tiles, "
+                       f"given in order from top to bottom.")
+    if layout and analysis_type == 'ui_fix':
+        request.append(f"""Measured Layout (from the screenshot pixels, in source pixel coordinates):
+{format_layout_summary(layout)}""")
+    blocks['request'] = '\n\n'.join(request)
+    
+    return blocks
+
+def cached_text_block(text):
+    """Text content block marked as a prompt cache breakpoint"""
+    block = {"type": "text", "text": text}
+    if Config.PROMPT_CACHING_ENABLED:
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+def build_analysis_request(image_data, react_code, code_analysis, analysis_type, layout=None, compaction=None):
+    """
+    Build the keyword arguments for a messages.create / messages.stream call.
+    
+    The system prompt, the code and the code analysis summary come first,
+    each ending a prompt cache breakpoint, so repeat calls for the same
+    component reuse them. The screenshot follows: image_data may be one
+    image or a list of tiles ordered top to bottom, each its own image
+    block. When a compaction from compact_prompt_code() is given, its
+    code is sent instead of react_code.
+    """
+    images = image_data if isinstance(image_data, list) else [image_data]
+    if compaction is not None:
+        react_code, collapsed = compaction['code'], compaction['collapsed']
+    else:
+        collapsed = None
+    blocks = build_prompt_blocks(react_code, code_analysis, analysis_type, layout, collapsed, len(images))
+    
+    content = [cached_text_block(blocks[name]) for name in ('code', 'summary') if blocks[name]]
+    content += [image_content_block(image) for image in images]
+    if blocks['request']:
+        content.append({"type": "text", "text": blocks['request']})
+    
+    return {
+        'model': Config.ANTHROPIC_MODEL,
+        'max_tokens': 4000,
+        'temperature': 0,
+        'system': [cached_text_block(blocks['system'])],
+        'messages': [
+            {
+                "role": "user",
+                "content": content
+            }
+        ]
+    }
+
+def messages_api(ai_client):
+    """The messages resource to call: the prompt caching beta when enabled"""
+    if Config.PROMPT_CACHING_ENABLED:
+        return ai_client.beta.prompt_caching.messages
+    return ai_client.messages
+
+def usage_report(usage):
+    """Token usage from a response object or dict, including prompt cache reads and writes"""
+    if usage is None:
+        return {}
+    if isinstance(usage, dict):
+        field = usage.get
+    else:
+        field = lambda name: getattr(usage, name, None)
+    return {
+        'inputTokens': field('input_tokens'),
+        'outputTokens': field('output_tokens'),
+        'cacheReadTokens': field('cache_read_input_tokens') or 0,
+        'cacheWriteTokens': field('cache_creation_input_tokens') or 0
+    }
+
+def build_analysis_result(response_text, code_analysis, analysis_type, compaction, usage=None):
+    """The result dict returned for a finished analysis"""
+    # Parse out code blocks if present, restoring any collapsed components and truncated tail
+    model_code = extract_code_from_response(response_text)
+    fixed_code = expand_collapsed(model_code, compaction)
+    
+    prompt_tokens = compaction_report(compaction)
+    prompt_tokens.update(usage_report(usage))
+    
+    return {
+        'fixedCode': fixed_code,
+        'fixedCodePatchable': is_patchable(model_code, compaction),
+        'fullResponse': response_text,
+        'analysis': code_analysis,
+        'analysisType': analysis_type,
+        'promptTokens': prompt_tokens
+    }
+
+def analyze_ui_with_ai(image_data, react_code, code_analysis, options=None, layout=None, compaction=None,
+                       timings=None, model_caller=None):
+    """
+    Send image and React code to Claude for UI analysis.
+    
+    The call goes through `model_caller`, the process-wide
+    get_model_caller() unless given.
+    """
+    try:
+        timer = StageTimer(timings)
+        
+        # Get client
+        ai_client = get_anthropic_client()
         
-        prompt = prompts.get(analysis_type, prompts['ui_fix'])
+        # Default options
+        options = options or {}
+        analysis_type = options.get('analysisType', 'ui_fix')
+        include_explanation = options.get('includeExplanation', True)
+        compaction = compaction or compact_prompt_code(react_code, options)
+        
+        with timer.stage('prompt_build'):
+            request = build_analysis_request(image_data, react_code, code_analysis, analysis_type, layout, compaction)
         
         # Make API call to Claude
-        message = ai_client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=4000,
-            temperature=0,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": image_data
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
-                }
-            ]
-        )
+        with timer.stage('model'):
+            model_caller = model_caller or get_model_caller()
+            message, call_info = model_caller.call(messages_api(ai_client).create, **request)
         
         # Extract the response
-        response_text = message.content[0].text if message.content else "No response generated"
+        with timer.stage('response_parse'):
+            response_text = message.content[0].text if message.content else "No response generated"
+            result = build_analysis_result(
+                response_text, code_analysis, analysis_type, compaction, getattr(message, 'usage', None)
+            )
+        result['upstream'] = call_info
+        return result
         
-        # Parse out code blocks if present
-        fixed_code = extract_code_from_response(response_text)
+    except anthropic.APIError as e:
+        raise Exception(f"Anthropic API error: {str(e)}")
+    except Exception as e:
+        raise Exception(f"AI analysis failed: {str(e)}")
+
+def analysis_cache_key(image_data, react_code, analysis_type, options=None):
+    """Result cache key for a processed image (or list of tiles), code and analysis type"""
+    if isinstance(image_data, list):
+        image_data = b''.join(image_data)
+    return cache_key(image_data, react_code, analysis_type, Config.ANTHROPIC_MODEL, prompt_version(options))
+
+def lookup_cached_analysis(image_data, react_code, options=None):
+    """
+    Look an analysis up in the result cache and the near-duplicate index.
+    
+    Returns (cached_result, cache_info, pending). On a miss cached_result is
+    None and `pending` is what store_cached_analysis() needs to record the
+    result once it has been computed.
+    """
+    options = options or {}
+    cache = get_result_cache()
+    if cache is None:
+        return None, {'status': 'disabled'}, None
+    
+    analysis_type = options.get('analysisType', 'ui_fix')
+    key = analysis_cache_key(image_data, react_code, analysis_type, options)
+    
+    # A broken cache must never fail the analysis itself
+    try:
+        cached, tier = cache.get(key)
+    except Exception:
+        cached, tier = None, None
+    if cached is not None:
+        return cached, {'status': 'hit', 'tier': tier, 'key': key}, None
+    
+    # Two captures of the same UI never share bytes; look for a perceptual match.
+    # Tiled submissions are skipped: their first tiles match too easily.
+    near_index = get_near_duplicate_index() if options.get('allowNearDuplicate', True) else None
+    if isinstance(image_data, list):
+        if len(image_data) > 1:
+            near_index = None
+        else:
+            image_data = image_data[0]
+    context = phash = None
+    if near_index is not None:
+        try:
+            context = cache_key(b'', react_code, analysis_type, Config.ANTHROPIC_MODEL, prompt_version(options))
+            phash = perceptual_hash(image_data)
+            match_key, distance = near_index.find(context, phash)
+            if match_key is not None:
+                cached, tier = cache.get(match_key)
+                if cached is not None:
+                    return cached, {
+                        'status': 'hit',
+                        'tier': 'near-duplicate',
+                        'key': match_key,
+                        'distance': distance
+                    }, None
+        except Exception:
+            pass
+    
+    return None, {'status': 'miss', 'key': key}, {'key': key, 'context': context, 'phash': phash}
+
+def store_cached_analysis(pending, result):
+    """Record a computed analysis under the key (and perceptual hash) from lookup_cached_analysis()"""
+    if pending is None:
+        return
+    try:
+        get_result_cache().put(pending['key'], result)
+        if pending['phash'] is not None:
+            get_near_duplicate_index().add(pending['context'], pending['phash'], pending['key'])
+    except Exception:
+        pass
+
+def analyze_ui_cached(image_data, react_code, code_analysis, options=None, layout=None, compaction=None,
+                      timings=None, model_caller=None):
+    """
+    Run analyze_ui_with_ai behind the content-addressed result cache.
+    
+    Returns (result, cache_info); cache_info reports whether the result was
+    a hit (and from which tier) or a miss. A miss that arrives while an
+    identical analysis is in flight on the host waits for that one, and
+    cache_info['coalesced'] says whether it ran in this worker ('local')
+    or another ('remote').
+    """
+    timer = StageTimer(timings)
+    with timer.stage('cache_lookup'):
+        cached, cache_info, pending = lookup_cached_analysis(image_data, react_code, options)
+    if cached is not None:
+        return cached, cache_info
+    
+    def compute():
+        result = analyze_ui_with_ai(
+            image_data, react_code, code_analysis, options, layout, compaction, timer.timings, model_caller
+        )
+        with timer.stage('cache_store'):
+            store_cached_analysis(pending, result)
+        return result
+    
+    flight = get_single_flight()
+    if flight is None:
+        return compute(), cache_info
+    
+    started = time.perf_counter()
+    result, role = flight.do(flight_key(image_data, react_code, options, cache_info), compute)
+    return result, coalesced_info(cache_info, role, started, timer)
+
+def flight_key(image_data, react_code, options, cache_info):
+    """Single-flight key of an analysis: its result cache key, computed here when the cache is off"""
+    if 'key' in cache_info:
+        return cache_info['key']
+    options = options or {}
+    return analysis_cache_key(image_data, react_code, options.get('analysisType', 'ui_fix'), options)
+
+def coalesced_info(cache_info, role, started, timer):
+    """Mark a shared result in cache_info and time the wait for it"""
+    if role == 'leader':
+        return cache_info
+    timer.timings['coalesced_wait'] = round((time.perf_counter() - started) * 1000, 2)
+    return dict(cache_info, coalesced=role)
+
+async def analyze_ui_with_ai_async(image_data, react_code, code_analysis, options=None, layout=None,
+                                   compaction=None, timings=None):
+    """
+    Async counterpart of analyze_ui_with_ai for the ASGI app
+    """
+    try:
+        timer = StageTimer(timings)
+        ai_client = get_async_anthropic_client()
         
-        return {
-            'fixedCode': fixed_code,
-            'fullResponse': response_text,
-            'analysis': code_analysis,
-            'analysisType': analysis_type
-        }
+        options = options or {}
+        analysis_type = options.get('analysisType', 'ui_fix')
+        if compaction is None:
+            compaction = await run_blocking(compact_prompt_code, react_code, options)
+        
+        # Base64-encoding the screenshot is CPU work too
+        with timer.stage('prompt_build'):
+            request = await run_blocking(
+                build_analysis_request, image_data, react_code, code_analysis, analysis_type, layout, compaction
+            )
+        with timer.stage('model'):
+            message, call_info = await get_model_caller().call_async(messages_api(ai_client).create, **request)
+        
+        with timer.stage('response_parse'):
+            response_text = message.content[0].text if message.content else "No response generated"
+            result = build_analysis_result(
+                response_text, code_analysis, analysis_type, compaction, getattr(message, 'usage', None)
+            )
+        result['upstream'] = call_info
+        return result
         
     except anthropic.APIError as e:
         raise Exception(f"Anthropic API error: {str(e)}")
     except Exception as e:
         raise Exception(f"AI analysis failed: {str(e)}")
 
+def measure_layout(image_data, options=None):
+    """
+    Local layout metrics for the ui_fix prompt, or None when not applicable
+    """
+    options = options or {}
+    if not Config.LAYOUT_METRICS_ENABLED or options.get('analysisType', 'ui_fix') != 'ui_fix':
+        return None
+    
+    # The metrics only enrich the prompt; never fail an analysis over them
+    try:
+        return analyze_layout(image_data)
+    except Exception:
+        return None
+
+def prepared_layout(layout, options=None):
+    """Layout metrics measured ahead of time, or None when this analysis does not use them"""
+    options = options or {}
+    return layout if options.get('analysisType', 'ui_fix') == 'ui_fix' else None
+
+def prepare_analysis(image_data, react_code, options=None, timings=None, metrics=None, hold_budget=True,
+                     prepared_images=None):
+    """
+    Local stages of the pipeline: image processing, code analysis, layout and compaction.
+    
+    Returns the keyword arguments for analyze_ui_cached. Per-stage timings
+    in milliseconds are added to `timings` when given, and image sizes are
+    observed on a MetricsBatch passed as `metrics`. The image is admitted
+    by a header-only check and its pixels are held in the host-wide budget
+    while it is decoded, unless the caller already holds them
+    (`hold_budget=False`); raises AdmissionError when refused.
+    `prepared_images` may pass (model_images, layout) built earlier from
+    the same image, e.g. a session's stitch, to skip the image stages.
+    """
+    options = options or {}
+    timer = StageTimer(timings)
+    
+    # Decode a data URL once; the image and layout stages both take the bytes
+    with timer.stage('image_decode_input'):
+        image_data = decode_image_input(image_data)
+    
+    if prepared_images is not None:
+        model_images, layout = prepared_images
+        layout = prepared_layout(layout, options)
+    else:
+        pixels = check_image(image_data, stitched=True)
+        with timer.stage('admission_wait'):
+            lease = get_pixel_budget().acquire(pixels) if hold_budget else None
+        try:
+            model_images = run_image_task(
+                prepare_model_images, image_data, timings=timer.timings, tiling=options.get('tiling')
+            )
+            with timer.stage('layout'):
+                layout = measure_layout(image_data, options)
+        finally:
+            get_pixel_budget().release(lease)
+    
+    if metrics is not None:
+        metrics.observe('mss_image_bytes', len(image_data), stage='uploaded')
+        metrics.observe('mss_image_bytes', sum(len(image) for image in model_images), stage='processed')
+    
+    with timer.stage('code_analysis'):
+        code_analysis = analyze_react_code(react_code)
+    
+    with timer.stage('compaction'):
+        compaction = compact_prompt_code(react_code, options)
+    
+    return {
+        'image_data': model_images,
+        'react_code': react_code,
+        'code_analysis': code_analysis,
+        'options': options,
+        'layout': layout,
+        'compaction': compaction
+    }
+
+def run_analysis_pipeline(image_data, react_code, options=None, timings=None, metrics=None,
+                          prepared_images=None):
+    """
+    Full analysis pipeline: process the image, analyze the code, then ask the model.
+    
+    Returns (result, cache_info) as analyze_ui_cached does. Per-stage
+    timings in milliseconds are added to `timings` when given;
+    `prepared_images` is passed on to prepare_analysis.
+    """
+    timer = StageTimer(timings)
+    prepared = prepare_analysis(
+        image_data, react_code, options, timer.timings, metrics, prepared_images=prepared_images
+    )
+    return analyze_ui_cached(**prepared, timings=timer.timings)
+
+async def run_analysis_pipeline_async(image_data, react_code, options=None, timings=None, metrics=None):
+    """
+    Async counterpart of run_analysis_pipeline.
+    
+    Local stages and cache lookups run on the blocking pool; only the model
+    call waits on the event loop, so one process can hold many analyses
+    in flight.
+    """
+    timer = StageTimer(timings)
+    
+    # Queue for the pixel budget on the event loop, not on a blocking-pool thread
+    with timer.stage('image_decode_input'):
+        image_data = await run_blocking(decode_image_input, image_data)
+    pixels = check_image(image_data, stitched=True)
+    budget = get_pixel_budget()
+    with timer.stage('admission_wait'):
+        lease = await budget.acquire_async(pixels)
+    try:
+        prepared = await run_blocking(
+            prepare_analysis, image_data, react_code, options, timer.timings, metrics, hold_budget=False
+        )
+    finally:
+        await run_blocking(budget.release, lease)
+    
+    with timer.stage('cache_lookup'):
+        cached, cache_info, pending = await run_blocking(
+            lookup_cached_analysis, prepared['image_data'], react_code, prepared['options']
+        )
+    if cached is not None:
+        return cached, cache_info
+    
+    async def compute():
+        result = await analyze_ui_with_ai_async(**prepared, timings=timer.timings)
+        with timer.stage('cache_store'):
+            await run_blocking(store_cached_analysis, pending, result)
+        return result
+    
+    flight = get_single_flight()
+    if flight is None:
+        return await compute(), cache_info
+    
+    started = time.perf_counter()
+    key = flight_key(prepared['image_data'], react_code, prepared['options'], cache_info)
+    result, role = await flight.do_async(key, compute)
+    return result, coalesced_info(cache_info, role, started, timer)
+
+# Fence languages extract_code_from_response() looks for, best first; '' is a bare fence
+CODE_LANGUAGES = ('jsx', 'javascript', 'react', '')
+
+def fenced_blocks(text):
+    """
+    Closed fenced code blocks in text as (language, code) pairs.
+    
+    Every ``` toggles between opening and closing a block, so the closing
+    fence of one block is never read as the opening fence of the next.
+    """
+    blocks = []
+    pos = 0
+    while True:
+        opening = text.find('```', pos)
+        line_end = text.find('\n', opening + 3) if opening != -1 else -1
+        if line_end == -1:
+            return blocks
+        closing = text.find('```', line_end + 1)
+        if closing == -1:
+            return blocks
+        blocks.append((text[opening + 3:line_end].strip().lower(), text[line_end + 1:closing]))
+        pos = closing + 3
+
+class CodeBlockDetector:
+    """
+    Incrementally spot the fixed component in streamed text.
+    
+    Feed text deltas as they arrive; feed() returns the contents of the
+    first jsx block once its closing fence has been seen, and None until
+    then. A jsx block is what extract_code_from_response() picks first,
+    so it is safe to send early; any other choice is only known once the
+    response is complete. Fences toggle as in fenced_blocks(), and only
+    the unscanned tail of the buffer is searched on each call.
+    """
+    
+    def __init__(self):
+        self.buffer = ''
+        self.scan_from = 0
+        self.open_block = None
+        self.done = False
+    
+    def feed(self, text):
+        self.buffer += text
+        while not self.done:
+            fence = self.buffer.find('```', self.scan_from)
+            if fence == -1:
+                # Keep a couple of characters in case a fence is split across deltas
+                self.scan_from = max(self.scan_from, len(self.buffer) - 2)
+                return None
+            
+            if self.open_block is None:
+                line_end = self.buffer.find('\n', fence + 3)
+                if line_end == -1:
+                    # Wait for the rest of the language tag
+                    self.scan_from = fence
+                    return None
+                self.open_block = (self.buffer[fence + 3:line_end].strip().lower(), line_end + 1)
+                self.scan_from = line_end + 1
+                continue
+            
+            language, start = self.open_block
+            self.open_block = None
+            self.scan_from = fence + 3
+            if language == 'jsx':
+                self.done = True
+                return self.buffer[start:fence].strip()
+        return None
+
+def stream_ui_analysis(image_data, react_code, code_analysis, options=None, layout=None, compaction=None):
+    """
+    Stream a UI analysis as (event, data) pairs.
+    
+    Emits 'cache' first, then 'delta' for each text chunk, 'fixedCode' as
+    soon as the first fenced code block closes, and finally 'done' with the
+    same result dict analyze_ui_with_ai returns. Completed results are
+    written to the result cache, and cache hits are replayed immediately.
+    """
+    options = options or {}
+    analysis_type = options.get('analysisType', 'ui_fix')
+    cache = get_result_cache()
+    key = analysis_cache_key(image_data, react_code, analysis_type, options)
+    
+    if cache is not None:
+        try:
+            cached, tier = cache.get(key)
+        except Exception:
+            cached, tier = None, None
+        if cached is not None:
+            yield 'cache', {'status': 'hit', 'tier': tier, 'key': key}
+            yield 'fixedCode', {
+                'code': cached.get('fixedCode', ''),
+                'patchable': cached.get('fixedCodePatchable', False)
+            }
+            yield 'done', cached
+            return
+    
+    yield 'cache', {'status': 'miss' if cache is not None else 'disabled', 'key': key}
+    
+    try:
+        ai_client = get_anthropic_client()
+        detector = CodeBlockDetector()
+        compaction = compaction or compact_prompt_code(react_code, options)
+        
+        with get_model_caller().stream(
+            messages_api(ai_client).stream,
+            **build_analysis_request(image_data, react_code, code_analysis, analysis_type, layout, compaction)
+        ) as stream:
+            for text in stream.text_stream:
+                yield 'delta', {'text': text}
+                code = detector.feed(text)
+                if code is not None:
+                    yield 'fixedCode', {
+                        'code': expand_collapsed(code, compaction),
+                        'patchable': is_patchable(code, compaction)
+                    }
+            
+            usage = getattr(stream.get_final_message(), 'usage', None)
+        
+        response_text = detector.buffer or "No response generated"
+        result = build_analysis_result(response_text, code_analysis, analysis_type, compaction, usage)
+        
+        if cache is not None:
+            try:
+                cache.put(key, result)
+            except Exception:
+                pass
+        
+        yield 'done', result
+        
+    except anthropic.APIError as e:
+        yield 'error', {'error': f"Anthropic API error: {str(e)}"}
+    except Exception as e:
+        yield 'error', {'error': f"AI analysis failed: {str(e)}"}
+
+async def stream_ui_analysis_async(image_data, react_code, code_analysis, options=None, layout=None, compaction=None):
+    """
+    Async counterpart of stream_ui_analysis, yielding the same (event, data) pairs
+    """
+    options = options or {}
+    analysis_type = options.get('analysisType', 'ui_fix')
+    cache = get_result_cache()
+    key = analysis_cache_key(image_data, react_code, analysis_type, options)
+    
+    if cache is not None:
+        try:
+            cached, tier = await run_blocking(cache.get, key)
+        except Exception:
+            cached, tier = None, None
+        if cached is not None:
+            yield 'cache', {'status': 'hit', 'tier': tier, 'key': key}
+            yield 'fixedCode', {
+                'code': cached.get('fixedCode', ''),
+                'patchable': cached.get('fixedCodePatchable', False)
+            }
+            yield 'done', cached
+            return
+    
+    yield 'cache', {'status': 'miss' if cache is not None else 'disabled', 'key': key}
+    
+    try:
+        ai_client = get_async_anthropic_client()
+        detector = CodeBlockDetector()
+        if compaction is None:
+            compaction = await run_blocking(compact_prompt_code, react_code, options)
+        request = await run_blocking(
+            build_analysis_request, image_data, react_code, code_analysis, analysis_type, layout, compaction
+        )
+        
+        async with get_model_caller().stream_async(messages_api(ai_client).stream, **request) as stream:
+            async for text in stream.text_stream:
+                yield 'delta', {'text': text}
+                code = detector.feed(text)
+                if code is not None:
+                    yield 'fixedCode', {
+                        'code': expand_collapsed(code, compaction),
+                        'patchable': is_patchable(code, compaction)
+                    }
+            
+            usage = getattr(await stream.get_final_message(), 'usage', None)
+        
+        response_text = detector.buffer or "No response generated"
+        result = build_analysis_result(response_text, code_analysis, analysis_type, compaction, usage)
+        
+        if cache is not None:
+            try:
+                await run_blocking(cache.put, key, result)
+            except Exception:
+                pass
+        
+        yield 'done', result
+        
+    except anthropic.APIError as e:
+        yield 'error', {'error': f"Anthropic API error: {str(e)}"}
+    except Exception as e:
+        yield 'error', {'error': f"AI analysis failed: {str(e)}"}
+
 def extract_code_from_response(response_text):
     """Extract code blocks from AI response"""
-    # Look for code blocks with ```jsx or ```javascript or ```react
-    patterns = [
-        r'```jsx\n(.*?)```',
-        r'```javascript\n(.*?)```',
-        r'```react\n(.*?)```',
-        r'```\n(.*?)```'
-    ]
-    
-    for pattern in patterns:
-        matches = re.findall(pattern, response_text, re.DOTALL)
-        if matches:
-            # Return the first complete code block found
-            return matches[0].strip()
+    # Prefer a ```jsx block, then ```javascript, ```react and finally a bare fence
+    blocks = fenced_blocks(response_text)
+    for language in CODE_LANGUAGES:
+        for block_language, code in blocks:
+            if block_language == language:
+                # Return the first complete code block found
+                return code.strip()
     
     # If no code blocks found, return the original response
     return response_text
 
-def analyze_design_system(image_data):
-    """Extract design tokens from UI screenshot"""
+def analyze_design_system(image_data, include_model=True):
+    """
+    Extract design tokens from UI screenshot.
+    
+    The colour palette is measured locally; the model is only asked for
+    the tokens pixels cannot give us directly (typography, spacing, radii
+    and shadows), and not at all when include_model is False.
+    """
     try:
-        # Get client
-        ai_client = get_anthropic_client()
+        palette = extract_palette(image_data)
+        tokens = {
+            'colors': [entry['hex'] for entry in palette],
+            'palette': palette,
+            'typography': {},
+            'spacing': [],
+            'borderRadius': [],
+            'shadows': []
+        }
         
-        # This could be enhanced with computer vision libraries
-        # For now, we'll use Claude's vision capabilities
+        if not include_model:
+            return tokens
         
-        if image_data.startswith('data:image'):
-            image_data = image_data.split(',')[1]
+        # Get client
+        ai_client = get_anthropic_client()
         
-        message = ai_client.messages.create(
-            model="claude-3-5-sonnet-20241022",
+        message, _ = get_model_caller().call(
+            ai_client.messages.create,
+            model=Config.ANTHROPIC_MODEL,
             max_tokens=1000,
             temperature=0,
             messages=[
                 {
                     "role": "user",
                     "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": image_data
-                            }
-                        },
+                        image_content_block(image_data),
                         {
                             "type": "text",
                             "text": """Analyze this UI and extract:
-1. Color palette (hex codes)
-2. Typography (font families, sizes)
-3. Spacing values
-4. Border radius values
-5. Shadow styles
+1. Typography (font families, sizes)
+2. Spacing values
+3. Border radius values
+4. Shadow styles
 
-Return as JSON format."""
+Return as JSON format with the keys typography, spacing, borderRadius and shadows."""
                         }
                     ]
                 }
@@ -196,17 +1238,13 @@ Return as JSON format."""
             # Find JSON in response
             json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
             if json_match:
-                return json.loads(json_match.group())
+                measured = {key: tokens[key] for key in ('colors', 'palette')}
+                tokens.update(json.loads(json_match.group()))
+                tokens.update(measured)
         except:
             pass
             
-        return {
-            'colors': [],
-            'typography': {},
-            'spacing': [],
-            'borderRadius': [],
-            'shadows': []
-        }
+        return tokens
         
     except Exception as e:
         return {'error': str(e)}
\ No newline at end of file
@@ -1,32 +1,193 @@
 # File: backend/routes/api.py
-from flask import Blueprint, request, jsonify
-from routes.ai_service import analyze_ui_with_ai
-from utils.image_processor import process_image_data
+from flask import Blueprint, abort, g, request, jsonify, make_response, Response, stream_with_context
+from functools import wraps
+from routes.ai_service import (
+    get_model_caller, measure_layout, prepared_layout, run_analysis_pipeline, stream_ui_analysis
+)
+from routes.jobs import get_job_queue, QueueFullError
+from routes.batch import get_message_batch_store, run_batch
+from routes.sessions import SessionNotFoundError, get_session_store
+from config.settings import Config
+from utils.admission import AdmissionError, admitted, check_image, get_pixel_budget
+from utils.image_processor import decode_image_input, normalize_image, prepare_model_images, stitch_images
+from utils.image_pool import run_image_task
 from utils.code_analyzer import analyze_react_code
+from utils.code_diff import diff_result, fixed_code_patch
+from utils.compression import compress_body
+from utils.layout_analyzer import analyze_layout
+from utils.metrics import MetricsBatch, get_metrics, record_metrics
+from utils.rate_limiter import get_rate_limiter
+from utils.single_flight import single_flight_stats
+from utils.timing import StageTimer, server_timing_header
 import base64
+import json
 import time
 
 api_blueprint = Blueprint('api', __name__)
 
-# Simple in-memory rate limiting
-request_counts = {}
+@api_blueprint.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.metrics = MetricsBatch()
+    g.timings = None
 
-def check_rate_limit(ip):
-    """Simple rate limiting by IP"""
-    current_hour = int(time.time() // 3600)
-    key = f"{ip}:{current_hour}"
+@api_blueprint.before_request
+def enforce_request_size():
+    """Refuse oversized bodies from their Content-Length, before anything is read"""
+    if request.content_length is not None and request.content_length > Config.MAX_CONTENT_LENGTH:
+        abort(413)
+
+@api_blueprint.errorhandler(413)
+def request_too_large(e):
+    g.metrics.inc('mss_admission_rejections_total', reason='body_too_large')
+    return jsonify({
+        'success': False,
+        'error': f"Request body exceeds {Config.MAX_CONTENT_LENGTH // (1024 * 1024)}MB limit"
+    }), 413
+
+@api_blueprint.after_request
+def finish_request_metrics(response):
+    """Record request metrics and report the route's stage timings as Server-Timing"""
+    elapsed = time.perf_counter() - g.request_started
+    endpoint = (request.endpoint or 'unknown').rsplit('.', 1)[-1]
+    g.metrics.inc('mss_requests_total', endpoint=endpoint, status=response.status_code)
+    g.metrics.observe('mss_request_duration_seconds', elapsed, endpoint=endpoint)
+    record_metrics(g.metrics)
     
-    if key not in request_counts:
-        request_counts[key] = 0
+    response.headers['Server-Timing'] = server_timing_header(g.timings or {}, total=elapsed * 1000)
+    return response
+
+@api_blueprint.after_request
+def compress_response(response):
+    """Gzip or brotli-compress JSON and text responses the client accepts"""
+    if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+        return response
     
-    request_counts[key] += 1
+    body, encoding = compress_body(
+        response.get_data(),
+        response.mimetype,
+        request.headers.get('Accept-Encoding'),
+        Config.RESPONSE_COMPRESS_MIN_BYTES
+    )
+    if encoding is not None:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    return response
+
+def set_quota_headers(response, quota):
+    """Report the client's remaining quota on a response"""
+    response.headers['X-RateLimit-Limit'] = str(quota['limit'])
+    response.headers['X-RateLimit-Remaining'] = str(quota['remaining'])
+    response.headers['X-RateLimit-Reset'] = str(quota['reset'])
+
+def rate_limited(bucket, cost=None):
+    """
+    Apply a per-IP token bucket (shared by all workers) to a route.
     
-    # Clean old entries
-    for k in list(request_counts.keys()):
-        if not k.endswith(str(current_hour)):
-            del request_counts[k]
+    Responses carry X-RateLimit-* headers and refused requests get a 429
+    with Retry-After. `cost` is an optional callable returning how many
+    tokens the current request takes; a request costing more than the
+    whole bucket could never pass and gets a 413 instead.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                quota = get_rate_limiter().take(bucket, request.remote_addr, cost() if cost else 1)
+            except Exception:
+                # A broken limiter store must not take the API down with it
+                return view(*args, **kwargs)
+            
+            if quota['tooLarge']:
+                g.metrics.inc('mss_rate_limit_rejections_total', bucket=bucket)
+                response = jsonify({
+                    'error': f"Request needs more than the whole rate limit of {quota['limit']}; split it into smaller requests"
+                })
+                response.status_code = 413
+            elif not quota['allowed']:
+                g.metrics.inc('mss_rate_limit_rejections_total', bucket=bucket)
+                response = jsonify({'error': 'Rate limit exceeded'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(quota['retryAfter'])
+            else:
+                response = make_response(view(*args, **kwargs))
+            set_quota_headers(response, quota)
+            return response
+        return wrapper
+    return decorator
+
+def admission_response(error):
+    """Error response for an upload refused by admission control"""
+    g.metrics.inc('mss_admission_rejections_total', reason=error.reason)
+    response = jsonify({'success': False, 'error': str(error)})
+    response.status_code = error.status
+    if error.retry_after:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+def response_shape(data):
+    """
+    The result format a client asked for: 'full' (default) or 'diff'.
     
-    return request_counts[key] <= 100  # 100 requests per hour
+    Returns (format, include); `include` names optional result fields to
+    keep in diff mode, given as a list or a comma-separated string.
+    """
+    include = data.get('include') or []
+    if isinstance(include, str):
+        include = [name.strip() for name in include.split(',') if name.strip()]
+    return data.get('responseFormat', 'full'), set(include)
+
+def shape_result(result, data):
+    """An analysis result in the format the request asked for"""
+    response_format, include = response_shape(data)
+    if response_format != 'diff' or not isinstance(result, dict):
+        return result
+    return diff_result(result, data['reactCode'], include)
+
+def shape_event(event, payload, data):
+    """A streamed analysis event in the format the request asked for"""
+    if event == 'done':
+        return shape_result(payload, data)
+    if event == 'fixedCode' and payload.get('patchable') and response_shape(data)[0] == 'diff':
+        patch = fixed_code_patch(data['reactCode'], payload.get('code'))
+        if patch is not None:
+            return {'patch': patch}
+    return payload
+
+def batch_cost():
+    """A batch takes one analyze token per item"""
+    items = (request.get_json(silent=True) or {}).get('items')
+    return max(1, len(items)) if isinstance(items, list) else 1
+
+def parse_image_request():
+    """
+    Read the image and the other fields from a JSON, multipart or raw image body.
+    
+    Returns (fields, image). For multipart and raw image/* bodies the image
+    is kept as raw bytes; for JSON it is the submitted data URL string.
+    Raw bodies carry their other fields in the query string.
+    """
+    if request.mimetype == 'multipart/form-data':
+        fields = request.form.to_dict()
+        upload = request.files.get('image')
+        image = upload.read() if upload else None
+    elif request.mimetype.startswith('image/'):
+        fields = request.args.to_dict()
+        image = request.get_data(cache=False) or None
+    else:
+        fields = request.get_json(silent=True) or {}
+        image = fields.get('image')
+    
+    # Form and query fields arrive as strings
+    if isinstance(fields.get('options'), str):
+        fields['options'] = json.loads(fields['options'] or '{}')
+    
+    return fields, image
+
+def to_data_url(image_bytes, media_type='image/jpeg'):
+    """Encode image bytes as a data URL for JSON responses"""
+    return f"data:{media_type};base64,{base64.b64encode(image_bytes).decode('ascii')}"
 
 @api_blueprint.route('/health', methods=['GET'])
 def health_check():
@@ -34,50 +195,228 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': time.time(),
-        'service': 'multi-shot-scanner'
+        'service': 'multi-shot-scanner',
+        'upstream': get_model_caller().stats(),
+        'singleFlight': single_flight_stats()
     })
 
+@api_blueprint.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus metrics aggregated across all workers on this host"""
+    store = get_metrics()
+    if store is None:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    
+    budget = get_pixel_budget().usage()
+    gauges = {
+        'mss_pixel_budget_capacity': budget['capacity'],
+        'mss_pixel_budget_in_use': budget['inUse'],
+        'mss_pixel_budget_leases': budget['leases']
+    }
+    return Response(store.render(gauges), mimetype='text/plain; version=0.0.4')
+
 @api_blueprint.route('/analyze', methods=['POST'])
+@rate_limited('analyze')
 def analyze():
     """Main analysis endpoint"""
     try:
-        # Rate limiting
-        client_ip = request.remote_addr
-        if not check_rate_limit(client_ip):
-            return jsonify({'error': 'Rate limit exceeded'}), 429
-        
-        data = request.json
+        data, image_data = parse_image_request()
         
         # Validate required fields
-        if not data or 'image' not in data or 'reactCode' not in data:
+        if not image_data or 'reactCode' not in data:
             return jsonify({'error': 'Missing required fields: image and reactCode'}), 400
         
-        # Extract and validate image
-        image_data = data['image']
-        if not image_data.startswith('data:image'):
+        # Validate image
+        if isinstance(image_data, str) and not image_data.startswith('data:image'):
             return jsonify({'error': 'Invalid image format'}), 400
         
-        # Process image
-        processed_image = process_image_data(image_data)
-        
-        # Analyze React code
-        code_analysis = analyze_react_code(data['reactCode'])
-        
-        # Send to AI for analysis
-        ai_result = analyze_ui_with_ai(
-            image_data=processed_image,
-            react_code=data['reactCode'],
-            code_analysis=code_analysis,
-            options=data.get('options', {})
+        # Process image, analyze code and send to AI, reusing a cached result when possible
+        timings = g.timings = {}
+        ai_result, cache_info = run_analysis_pipeline(
+            image_data,
+            data['reactCode'],
+            options=data.get('options', {}),
+            timings=timings,
+            metrics=g.metrics
         )
+        g.metrics.observe_analysis(timings, ai_result, cache_info)
         
         return jsonify({
             'success': True,
-            'result': ai_result,
+            'result': shape_result(ai_result, data),
+            'cache': cache_info,
+            'timings': timings,
             'timestamp': time.time(),
-            'imageCount': data.get('imageCount', 1)
+            'imageCount': int(data.get('imageCount', 1))
         })
         
+    except AdmissionError as e:
+        return admission_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def parse_batch_items(data):
+    """
+    Normalize the items of a batch request.
+    
+    Each item gets an id (its index unless given); items missing an image
+    or code get an 'error' so they fail individually, not the whole batch.
+    """
+    items = []
+    for index, raw in enumerate(data.get('items') or []):
+        raw = raw if isinstance(raw, dict) else {}
+        item = {
+            'id': raw.get('id', index),
+            'image': raw.get('image'),
+            'reactCode': raw.get('reactCode'),
+            'options': raw.get('options') or data.get('options') or {}
+        }
+        if not item['image'] or item['reactCode'] is None:
+            item['error'] = 'Missing required fields: image and reactCode'
+        elif not str(item['image']).startswith('data:image'):
+            item['error'] = 'Invalid image format'
+        items.append(item)
+    return items
+
+@api_blueprint.route('/analyze/batch', methods=['POST'])
+@rate_limited('analyze', cost=batch_cost)
+def analyze_batch():
+    """Analyze many image/code pairs in one request, or submit them as a deferred batch"""
+    try:
+        data = request.get_json(silent=True) or {}
+        items = parse_batch_items(data)
+        if not items:
+            return jsonify({'error': 'Missing items list'}), 400
+        if len(items) > Config.BATCH_MAX_ITEMS:
+            return jsonify({'error': f"Too many items (max {Config.BATCH_MAX_ITEMS})"}), 400
+        
+        # Non-urgent batches go through the Message Batches API and are polled later
+        if data.get('mode') == 'deferred':
+            batch = get_message_batch_store().submit(items)
+            response = jsonify({'success': True, 'mode': 'deferred', **batch})
+            response.headers['Location'] = f"/api/analyze/batch/{batch['batchId']}"
+            return response, 202
+        
+        concurrency = min(int(data.get('concurrency', Config.BATCH_CONCURRENCY)), Config.BATCH_CONCURRENCY)
+        started = time.perf_counter()
+        entries, limiter_stats = run_batch(items, concurrency)
+        for entry in entries:
+            g.metrics.observe_analysis(entry['timings'], entry.get('result'), entry.get('cache'))
+        
+        return jsonify({
+            'success': True,
+            'mode': 'sync',
+            'items': entries,
+            'summary': {
+                'count': len(entries),
+                'succeeded': sum(1 for entry in entries if entry['success']),
+                'failed': sum(1 for entry in entries if not entry['success']),
+                'elapsedMs': round((time.perf_counter() - started) * 1000, 2),
+                **limiter_stats
+            },
+            'timestamp': time.time()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_blueprint.route('/analyze/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    """Status of a deferred batch, with per-item results once it has ended"""
+    try:
+        batch = get_message_batch_store().get(batch_id)
+        if batch is None:
+            return jsonify({'error': 'Batch not found'}), 404
+        return jsonify({'success': True, **batch})
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def format_sse(event, data):
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_analysis(image_data, data, timings=None, prepared_images=None):
+    """
+    Streamed analysis response for an image and the request's fields.
+    
+    The local work is done up front so failures still raise before the
+    stream starts; stage timings are added to `timings` when given.
+    `prepared_images` is (model_images, layout) built earlier from the
+    image, as prepare_analysis takes it.
+    """
+    options = data.get('options', {})
+    timer = StageTimer(timings)
+    if prepared_images is not None:
+        model_images, layout = prepared_images
+        layout = prepared_layout(layout, options)
+    else:
+        image_data = decode_image_input(image_data)
+        with admitted([image_data], stitched=True):
+            model_images = run_image_task(
+                prepare_model_images, image_data, timings=timer.timings, tiling=options.get('tiling')
+            )
+            with timer.stage('layout'):
+                layout = measure_layout(image_data, options)
+    with timer.stage('code_analysis'):
+        code_analysis = analyze_react_code(data['reactCode'])
+    g.timings = timer.timings
+    g.metrics.observe_timings(timer.timings)
+    events = stream_ui_analysis(
+        model_images,
+        data['reactCode'],
+        code_analysis,
+        options=options,
+        layout=layout
+    )
+    
+    def generate():
+        cache_info = None
+        for event, payload in events:
+            if event == 'cache':
+                cache_info = payload
+            elif event == 'done':
+                # The response headers are long gone; record the outcome separately
+                outcome = MetricsBatch()
+                outcome.observe_analysis({}, payload, cache_info)
+                record_metrics(outcome)
+            yield format_sse(event, shape_event(event, payload, data))
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@api_blueprint.route('/analyze/stream', methods=['POST'])
+@rate_limited('analyze')
+def analyze_stream():
+    """Analysis endpoint that streams the model output as Server-Sent Events"""
+    try:
+        data, image_data = parse_image_request()
+        
+        if not image_data or 'reactCode' not in data:
+            return jsonify({'error': 'Missing required fields: image and reactCode'}), 400
+        
+        if isinstance(image_data, str) and not image_data.startswith('data:image'):
+            return jsonify({'error': 'Invalid image format'}), 400
+        
+        return stream_analysis(image_data, data)
+        
+    except AdmissionError as e:
+        return admission_response(e)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -85,23 +424,353 @@ def analyze():
         }), 500
 
 @api_blueprint.route('/process-image', methods=['POST'])
+@rate_limited('process')
 def process_image():
     """Process image without AI analysis"""
     try:
-        data = request.json
+        data, image_data = parse_image_request()
         
-        if not data or 'image' not in data:
+        if not image_data:
             return jsonify({'error': 'Missing image data'}), 400
         
         # Process image
-        processed_image = process_image_data(data['image'])
+        image_data = decode_image_input(image_data)
+        with admitted([image_data]):
+            processed = run_image_task(normalize_image, image_data)
+        g.timings = processed['timings']
+        g.metrics.observe_timings(processed['timings'])
+        
+        # Binary clients can skip the base64 round trip entirely
+        best = request.accept_mimetypes.best_match(['application/json', processed['mediaType']])
+        if best == processed['mediaType']:
+            return Response(processed['data'], mimetype=processed['mediaType'])
+        
+        return jsonify({
+            'success': True,
+            'processedImage': base64.b64encode(processed['data']).decode('ascii'),
+            'mediaType': processed['mediaType'],
+            'width': processed['width'],
+            'height': processed['height'],
+            'passthrough': processed['passthrough'],
+            'timings': processed['timings'],
+            'timestamp': time.time()
+        })
+        
+    except AdmissionError as e:
+        return admission_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_blueprint.route('/layout', methods=['POST'])
+@rate_limited('process')
+def layout():
+    """Layout metrics measured from pixels, without a model call"""
+    try:
+        data, image_data = parse_image_request()
+        
+        if not image_data:
+            return jsonify({'error': 'Missing image data'}), 400
+        
+        started = time.perf_counter()
+        image_data = decode_image_input(image_data)
+        with admitted([image_data], stitched=True):
+            summary = analyze_layout(image_data)
+        
+        return jsonify({
+            'success': True,
+            'layout': summary,
+            'elapsedMs': round((time.perf_counter() - started) * 1000, 2),
+            'timestamp': time.time()
+        })
+        
+    except AdmissionError as e:
+        return admission_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_blueprint.route('/stitch', methods=['POST'])
+@rate_limited('process')
+def stitch():
+    """Stitch multiple captures into one image with overlapping rows removed"""
+    try:
+        if request.mimetype == 'multipart/form-data':
+            images = [upload.read() for upload in request.files.getlist('images')]
+        else:
+            data = request.get_json(silent=True) or {}
+            images = data.get('images')
+        
+        if not isinstance(images, list) or not images:
+            return jsonify({'error': 'Missing images list'}), 400
+        
+        images = [decode_image_input(image) for image in images]
+        with admitted(images):
+            result = stitch_images(images)
+        
+        return jsonify({
+            'success': True,
+            'stitchedImage': to_data_url(result['image']),
+            'width': result['width'],
+            'height': result['height'],
+            'originalHeight': result['originalHeight'],
+            'overlaps': result['overlaps'],
+            'timestamp': time.time()
+        })
+        
+    except AdmissionError as e:
+        return admission_response(e)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+def run_analysis_job(image_data, react_code, options, image_count):
+    """Background job body; returns the same payload as /analyze"""
+    timings = {}
+    metrics = MetricsBatch()
+    ai_result, cache_info = run_analysis_pipeline(image_data, react_code, options, timings, metrics)
+    metrics.observe_analysis(timings, ai_result, cache_info)
+    record_metrics(metrics)
+    return {
+        'success': True,
+        'result': ai_result,
+        'cache': cache_info,
+        'timings': timings,
+        'timestamp': time.time(),
+        'imageCount': image_count
+    }
+
+@api_blueprint.route('/jobs', methods=['POST'])
+@rate_limited('analyze')
+def create_job():
+    """Queue an analysis and return its job id immediately"""
+    try:
+        data, image_data = parse_image_request()
+        
+        if not image_data or 'reactCode' not in data:
+            return jsonify({'error': 'Missing required fields: image and reactCode'}), 400
+        
+        if isinstance(image_data, str) and not image_data.startswith('data:image'):
+            return jsonify({'error': 'Invalid image format'}), 400
+        
+        # Refuse what the job would refuse, while the client is still waiting
+        image_data = bytes(decode_image_input(image_data))
+        get_pixel_budget().check(check_image(image_data, stitched=True))
+        
+        queue = get_job_queue()
+        job_id = queue.submit(
+            run_analysis_job,
+            image_data,
+            data['reactCode'],
+            data.get('options', {}),
+            int(data.get('imageCount', 1))
+        )
+        
+        return jsonify({
+            'success': True,
+            'jobId': job_id,
+            'status': 'queued',
+            'queue': queue.stats()
+        }), 202
+        
+    except AdmissionError as e:
+        return admission_response(e)
+    except QueueFullError as e:
+        response = jsonify({'success': False, 'error': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_blueprint.route('/jobs', methods=['GET'])
+def job_queue_stats():
+    """Queue depth, running jobs and recent wait times"""
+    return jsonify(get_job_queue().stats())
+
+@api_blueprint.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of a queued analysis, with its result once finished"""
+    job = get_job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@api_blueprint.route('/sessions', methods=['POST'])
+@rate_limited('process')
+def create_session():
+    """Start a multi-shot session; shots are then uploaded one by one as they are captured"""
+    try:
+        session = get_session_store().create()
+        response = jsonify({'success': True, **session})
+        response.headers['Location'] = f"/api/sessions/{session['sessionId']}"
+        return response, 201
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_blueprint.route('/sessions/<session_id>', methods=['GET'])
+def get_session(session_id):
+    """Status of a session and each of its shots"""
+    try:
+        return jsonify({'success': True, **get_session_store().get(session_id)})
+    except SessionNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+
+@api_blueprint.route('/sessions/<session_id>', methods=['DELETE'])
+def delete_session(session_id):
+    """Discard a session and its shots"""
+    try:
+        get_session_store().delete(session_id)
+        return jsonify({'success': True})
+    except SessionNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+
+@api_blueprint.route('/sessions/<session_id>/shots/<int:shot>', methods=['PUT'])
+@rate_limited('process')
+def put_session_shot(session_id, shot):
+    """Upload (or replace, e.g. after a crop) one shot; it is processed in the background"""
+    try:
+        data, image_data = parse_image_request()
+        
+        if not image_data:
+            return jsonify({'error': 'Missing image data'}), 400
+        
+        # Refuse what processing would refuse, while the client is still waiting
+        image_data = bytes(decode_image_input(image_data))
+        get_pixel_budget().check(check_image(image_data))
+        
+        status = get_session_store().put_shot(session_id, shot, image_data)
+        return jsonify({'success': True, **status}), 202
+        
+    except SessionNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except AdmissionError as e:
+        return admission_response(e)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_blueprint.route('/sessions/<session_id>/shots/<int:shot>', methods=['DELETE'])
+def delete_session_shot(session_id, shot):
+    """Remove a shot from a session"""
+    try:
+        if not get_session_store().delete_shot(session_id, shot):
+            return jsonify({'error': 'Shot not found'}), 404
+        return jsonify({'success': True})
+    except SessionNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+
+@api_blueprint.route('/sessions/<session_id>/stitch', methods=['POST'])
+@rate_limited('process')
+def stitch_session(session_id):
+    """The session's shots stitched in the given order, as /stitch returns them"""
+    try:
+        data = request.get_json(silent=True) or {}
+        timer = StageTimer()
+        with timer.stage('session_stitch'):
+            result = get_session_store().stitch(session_id, data.get('order'))
+        g.timings = timer.timings
         
         return jsonify({
             'success': True,
-            'processedImage': processed_image,
+            'stitchedImage': to_data_url(result['image']),
+            'width': result['width'],
+            'height': result['height'],
+            'originalHeight': result['originalHeight'],
+            'overlaps': result['overlaps'],
+            'order': result['order'],
+            'prepared': result['prepared'],
             'timestamp': time.time()
         })
         
+    except SessionNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except AdmissionError as e:
+        return admission_response(e)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@api_blueprint.route('/sessions/<session_id>/analyze', methods=['POST'])
+@rate_limited('analyze')
+def analyze_session(session_id):
+    """
+    Analyze a session's stitched shots against React code.
+    
+    Takes the /analyze fields except the image, plus an optional shot
+    `order` and `stream` for a Server-Sent Events response.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        if 'reactCode' not in data:
+            return jsonify({'error': 'Missing required field: reactCode'}), 400
+        
+        # Normally prepared in the background while the user was capturing
+        timings = g.timings = {}
+        with StageTimer(timings).stage('session_stitch'):
+            stitched = get_session_store().stitch(session_id, data.get('order'))
+        session_info = {
+            'order': stitched['order'],
+            'overlaps': stitched['overlaps'],
+            'prepared': stitched['prepared']
+        }
+        
+        # The model images were prepared with the stitch for the default tiling
+        options = data.get('options', {})
+        prepared_images = None
+        if not options.get('tiling'):
+            prepared_images = (stitched['modelImages'], stitched['layout'])
+        
+        if data.get('stream'):
+            return stream_analysis(stitched['image'], data, timings, prepared_images)
+        
+        ai_result, cache_info = run_analysis_pipeline(
+            stitched['image'],
+            data['reactCode'],
+            options=options,
+            timings=timings,
+            metrics=g.metrics,
+            prepared_images=prepared_images
+        )
+        g.metrics.observe_analysis(timings, ai_result, cache_info)
+        
+        return jsonify({
+            'success': True,
+            'result': shape_result(ai_result, data),
+            'cache': cache_info,
+            'session': session_info,
+            'timings': timings,
+            'timestamp': time.time(),
+            'imageCount': len(stitched['order'])
+        })
+        
+    except SessionNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except AdmissionError as e:
+        return admission_response(e)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({
             'success': False,
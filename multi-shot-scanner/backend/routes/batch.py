@@ -0,0 +1,341 @@
+# File: backend/routes/batch.py
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import anthropic
+import httpx
+from config.settings import Config
+from routes.ai_service import (
+    analysis_cache_key, analyze_ui_cached, build_analysis_request, build_analysis_result,
+    get_anthropic_client, get_batch_caller, get_model_caller, is_retryable, prepare_analysis
+)
+from utils.result_cache import get_result_cache
+from utils.sqlite_store import get_connection
+from utils.timing import StageTimer
+
+# Rate limited and overloaded responses; anything else is not worth retrying here
+OVERLOAD_STATUSES = (429, 529)
+
+MESSAGE_BATCHES_BETA = 'message-batches-2024-09-24'
+
+def api_error(error):
+    """
+    The anthropic.APIError behind an error, or None.
+    
+    analyze_ui_with_ai wraps API errors in a plain Exception, so the
+    cause/context chain is followed back to the original.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, anthropic.APIError):
+            return error
+        error = error.__cause__ or error.__context__
+    return None
+
+def overload_info(error):
+    """
+    Return (status, retry_after) when an error came from a 429/529 response.
+    
+    Returns (None, None) for any other error.
+    """
+    error = api_error(error)
+    if isinstance(error, anthropic.APIStatusError) and error.status_code in OVERLOAD_STATUSES:
+        try:
+            retry_after = float(error.response.headers.get('retry-after', ''))
+        except ValueError:
+            retry_after = None
+        return error.status_code, retry_after
+    return None, None
+
+def backoff_delay(attempt):
+    """Exponential backoff with jitter for the given retry attempt (0-based)"""
+    delay = min(Config.BATCH_BACKOFF_MAX, Config.BATCH_BACKOFF_BASE * 2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit for model calls that adapts to provider pushback.
+    
+    Starts at `limit` concurrent calls. Every 429/529 halves the limit
+    and pauses new calls for the backoff delay; each run of successful
+    calls as long as the current limit raises it by one again, up to the
+    starting value.
+    """
+    
+    def __init__(self, limit):
+        self.max_limit = max(1, limit)
+        self.limit = self.max_limit
+        self.lowest_limit = self.max_limit
+        self.throttled = 0
+        self._active = 0
+        self._successes = 0
+        self._resume_at = 0.0
+        self._cond = threading.Condition()
+    
+    def acquire(self):
+        with self._cond:
+            while True:
+                pause = self._resume_at - time.monotonic()
+                if pause <= 0 and self._active < self.limit:
+                    break
+                self._cond.wait(pause if pause > 0 else None)
+            self._active += 1
+    
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+    
+    def succeeded(self):
+        with self._cond:
+            self._successes += 1
+            if self.limit < self.max_limit and self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+    
+    def overloaded(self, delay):
+        with self._cond:
+            self.throttled += 1
+            self._successes = 0
+            self.limit = max(1, self.limit // 2)
+            self.lowest_limit = min(self.lowest_limit, self.limit)
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+    
+    def stats(self):
+        with self._cond:
+            return {
+                'maxConcurrency': self.max_limit,
+                'finalConcurrency': self.limit,
+                'lowestConcurrency': self.lowest_limit,
+                'throttled': self.throttled
+            }
+
+def run_batch_item(item, limiter, max_retries):
+    """Analyze one batch item; failures are reported in the entry instead of raised"""
+    timings = {}
+    timer = StageTimer(timings)
+    entry = {'id': item['id'], 'success': False, 'attempts': 0, 'timings': timings}
+    
+    try:
+        if item.get('error'):
+            raise ValueError(item['error'])
+        prepared = prepare_analysis(item['image'], item['reactCode'], item.get('options') or {}, timings)
+        
+        # The batch caller does not retry, so every retry of an item happens here
+        for attempt in range(max_retries + 1):
+            entry['attempts'] = attempt + 1
+            retry_delay = 0
+            with timer.stage('model_wait'):
+                limiter.acquire()
+            try:
+                with timer.stage('model'):
+                    result, cache_info = analyze_ui_cached(**prepared, model_caller=get_batch_caller())
+                limiter.succeeded()
+                break
+            except Exception as e:
+                status, retry_after = overload_info(e)
+                if attempt == max_retries or (status is None and not is_retryable(api_error(e))):
+                    raise
+                if status is not None:
+                    limiter.overloaded(retry_after or backoff_delay(attempt))
+                else:
+                    # Timeouts and server errors back off this item only, outside its slot
+                    retry_delay = backoff_delay(attempt)
+            finally:
+                limiter.release()
+            time.sleep(retry_delay)
+        
+        entry.update(success=True, result=result, cache=cache_info)
+    except Exception as e:
+        entry['error'] = str(e)
+    
+    return entry
+
+def run_batch(items, concurrency=None):
+    """
+    Analyze batch items in parallel.
+    
+    Local work (image processing, code analysis, layout) runs on up to
+    BATCH_WORKERS threads; model calls share an AdaptiveLimiter starting at
+    `concurrency`. Returns (entries in item order, limiter stats).
+    """
+    limiter = AdaptiveLimiter(concurrency or Config.BATCH_CONCURRENCY)
+    workers = max(1, min(len(items), Config.BATCH_WORKERS))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis-batch') as pool:
+        entries = list(pool.map(
+            lambda item: run_batch_item(item, limiter, Config.BATCH_MAX_RETRIES), items
+        ))
+    return entries, limiter.stats()
+
+class MessageBatchStore:
+    """
+    Non-urgent batches submitted through the Anthropic Message Batches API.
+    
+    Items are prepared locally and cache hits are answered at once; the
+    rest are sent as one provider batch. Per-item state (including what is
+    needed to rebuild each result) is kept in SQLite, so any worker can
+    answer a poll; the first poll after the provider batch ends downloads
+    the results and writes them to the result cache.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        get_connection(self.path).execute("""
+            CREATE TABLE IF NOT EXISTS message_batches (
+                id TEXT PRIMARY KEY,
+                provider_id TEXT,
+                status TEXT NOT NULL,
+                created REAL NOT NULL,
+                items TEXT NOT NULL
+            )
+        """)
+    
+    def _request(self, method, path, **kwargs):
+        headers = {'anthropic-beta': MESSAGE_BATCHES_BETA}
+        request = getattr(get_anthropic_client(), method)
+        return get_model_caller().call(request, path, options={'headers': headers}, **kwargs)[0]
+    
+    def submit(self, items):
+        """Prepare and submit items; returns the batch status dict"""
+        def prepare(indexed):
+            index, item = indexed
+            state = {'id': item['id'], 'customId': f"item-{index}", 'status': 'failed', 'timings': {}}
+            try:
+                if item.get('error'):
+                    raise ValueError(item['error'])
+                prepared = prepare_analysis(item['image'], item['reactCode'], item.get('options') or {},
+                                            state['timings'])
+                options = prepared['options']
+                analysis_type = options.get('analysisType', 'ui_fix')
+                state['key'] = analysis_cache_key(prepared['image_data'], item['reactCode'], analysis_type, options)
+                
+                cache = get_result_cache()
+                cached = cache.get(state['key'])[0] if cache is not None else None
+                if cached is not None:
+                    state.update(status='cached', result=cached)
+                    return state, None
+                
+                state.update(status='submitted', analysisType=analysis_type,
+                             codeAnalysis=prepared['code_analysis'], compaction=prepared['compaction'])
+                params = build_analysis_request(
+                    prepared['image_data'], item['reactCode'], prepared['code_analysis'],
+                    analysis_type, prepared['layout'], prepared['compaction']
+                )
+                return state, {'custom_id': state['customId'], 'params': params}
+            except Exception as e:
+                state['error'] = str(e)
+                return state, None
+        
+        workers = max(1, min(len(items), Config.BATCH_WORKERS))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis-batch') as pool:
+            prepared = list(pool.map(prepare, enumerate(items)))
+        
+        states = [state for state, _ in prepared]
+        requests = [request for _, request in prepared if request is not None]
+        
+        provider_id = None
+        status = 'ended'
+        if requests:
+            batch = self._request('post', '/v1/messages/batches', body={'requests': requests}, cast_to=object)
+            provider_id = batch['id']
+            status = 'in_progress'
+        
+        batch_id = uuid.uuid4().hex
+        get_connection(self.path).execute(
+            'INSERT INTO message_batches (id, provider_id, status, created, items) VALUES (?, ?, ?, ?, ?)',
+            (batch_id, provider_id, status, time.time(), json.dumps(states))
+        )
+        return self._describe(batch_id, provider_id, status, states)
+    
+    def get(self, batch_id):
+        """Batch status, collecting provider results once the batch has ended; None if unknown"""
+        conn = get_connection(self.path)
+        row = conn.execute(
+            'SELECT provider_id, status, items FROM message_batches WHERE id = ?', (batch_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        
+        provider_id, status, items = row
+        states = json.loads(items)
+        provider = None
+        
+        if status != 'ended':
+            provider = self._request('get', f'/v1/messages/batches/{provider_id}', cast_to=object)
+            if provider.get('processing_status') == 'ended':
+                self._collect(provider, states)
+                status = 'ended'
+                conn.execute(
+                    'UPDATE message_batches SET status = ?, items = ? WHERE id = ?',
+                    (status, json.dumps(states), batch_id)
+                )
+        
+        return self._describe(batch_id, provider_id, status, states, provider)
+    
+    def _collect(self, provider, states):
+        response = self._request('get', provider['results_url'], cast_to=httpx.Response)
+        by_custom_id = {state['customId']: state for state in states}
+        cache = get_result_cache()
+        
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            state = by_custom_id.get(entry.get('custom_id'))
+            if state is None or state['status'] != 'submitted':
+                continue
+            
+            outcome = entry.get('result', {})
+            if outcome.get('type') != 'succeeded':
+                error = (outcome.get('error') or {}).get('error', {}).get('message')
+                state.update(status='failed', error=error or f"Batch request {outcome.get('type', 'failed')}")
+                continue
+            
+            message = outcome['message']
+            texts = [block['text'] for block in message.get('content', []) if block.get('type') == 'text']
+            result = build_analysis_result(
+                texts[0] if texts else "No response generated",
+                state['codeAnalysis'], state['analysisType'], state['compaction'], message.get('usage')
+            )
+            state.update(status='done', result=result)
+            if cache is not None:
+                try:
+                    cache.put(state['key'], result)
+                except Exception:
+                    pass
+        
+        # Requests missing from the results file did not complete
+        for state in states:
+            if state['status'] == 'submitted':
+                state.update(status='failed', error='No result returned for this item')
+    
+    def _describe(self, batch_id, provider_id, status, states, provider=None):
+        items = []
+        for state in states:
+            item = {'id': state['id'], 'status': state['status'], 'timings': state['timings']}
+            if 'result' in state:
+                item['result'] = state['result']
+            if 'error' in state:
+                item['error'] = state['error']
+            items.append(item)
+        
+        described = {'batchId': batch_id, 'status': status, 'providerBatchId': provider_id, 'items': items}
+        if provider is not None:
+            described['requestCounts'] = provider.get('request_counts')
+        return described
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_message_batch_store():
+    """Get or create the process-wide Message Batches store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MessageBatchStore(Config.JOBS_DB_PATH)
+    return _store
\ No newline at end of file
@@ -0,0 +1,223 @@
+# File: backend/routes/jobs.py
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils.sqlite_store import get_connection, process_alive
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at capacity"""
+
+class JobQueue:
+    """
+    Bounded background pool for analysis jobs.
+
+    Jobs run on threads in the worker that accepted them, so the request
+    returns as soon as the job is queued. Status and results are written
+    to a SQLite file shared by all gunicorn workers, so any worker can
+    answer a status poll. Each job row records the worker (host and pid)
+    running it; unfinished jobs of a worker that has died or restarted
+    are reclaimed as failed.
+    """
+    
+    # Sweep expired jobs once every this many submissions
+    PRUNE_EVERY = 50
+    
+    def __init__(self, path, workers=4, max_queued=32, ttl=3600):
+        self.path = path
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis-job')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._submitted = 0
+        self._active = set()
+        self.host = socket.gethostname()
+        
+        conn = get_connection(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                result TEXT,
+                error TEXT,
+                host TEXT,
+                pid INTEGER
+            )
+        """)
+        # Job stores created before jobs had owners
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+        for column, kind in (('host', 'TEXT'), ('pid', 'INTEGER')):
+            if column not in columns:
+                conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {kind}')
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)')
+        conn.execute('CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished)')
+    
+    def submit(self, fn, *args):
+        """Queue fn(*args) and return the job id; raises QueueFullError at capacity"""
+        with self._lock:
+            if self._pending >= self.workers + self.max_queued:
+                raise QueueFullError("Analysis queue is full, try again shortly")
+            self._pending += 1
+            self._submitted += 1
+            prune = self._submitted % self.PRUNE_EVERY == 0
+        
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._active.add(job_id)
+        get_connection(self.path).execute(
+            "INSERT INTO jobs (id, status, created, host, pid) VALUES (?, 'queued', ?, ?, ?)",
+            (job_id, time.time(), self.host, os.getpid())
+        )
+        
+        try:
+            self._executor.submit(self._run, job_id, fn, args)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self._active.discard(job_id)
+            raise
+        
+        if prune:
+            self.prune()
+        
+        return job_id
+    
+    def _run(self, job_id, fn, args):
+        conn = get_connection(self.path)
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started = ? WHERE id = ?",
+                (time.time(), job_id)
+            )
+            try:
+                result = fn(*args)
+                conn.execute(
+                    "UPDATE jobs SET status = 'done', finished = ?, result = ? WHERE id = ?",
+                    (time.time(), json.dumps(result), job_id)
+                )
+            except Exception as e:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished = ?, error = ? WHERE id = ?",
+                    (time.time(), str(e), job_id)
+                )
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._active.discard(job_id)
+    
+    def _orphaned(self, host, pid, job_id):
+        """Whether an unfinished job's worker is gone (jobs of other hosts cannot be checked)"""
+        if pid is None:
+            return True
+        if host != self.host:
+            return False
+        if pid == os.getpid():
+            # Same pid but not ours: a restarted worker reusing the pid
+            with self._lock:
+                return job_id not in self._active
+        return not process_alive(pid)
+    
+    def reclaim(self):
+        """Mark queued and running jobs of dead workers as failed; returns how many"""
+        conn = get_connection(self.path)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            orphans = [
+                (job_id,) for job_id, host, pid in conn.execute(
+                    "SELECT id, host, pid FROM jobs WHERE status IN ('queued', 'running')"
+                ).fetchall()
+                if self._orphaned(host, pid, job_id)
+            ]
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', finished = ?, "
+                "error = 'The worker running this job exited before it finished' WHERE id = ?",
+                [(time.time(), job_id) for (job_id,) in orphans]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(orphans)
+    
+    def get(self, job_id):
+        """Return a job's status dict, or None if unknown or expired"""
+        query = 'SELECT status, created, started, finished, result, error, host, pid FROM jobs WHERE id = ?'
+        conn = get_connection(self.path)
+        row = conn.execute(query, (job_id,)).fetchone()
+        if row is None:
+            return None
+        if row[0] in ('queued', 'running') and self._orphaned(row[6], row[7], job_id):
+            self.reclaim()
+            row = conn.execute(query, (job_id,)).fetchone()
+        
+        status, created, started, finished, result, error = row[:6]
+        job = {
+            'jobId': job_id,
+            'status': status,
+            'createdAt': created,
+            'waitSeconds': round((started or time.time()) - created, 3)
+        }
+        if finished is not None and started is not None:
+            job['runSeconds'] = round(finished - started, 3)
+        if result is not None:
+            job['result'] = json.loads(result)
+        if error is not None:
+            job['error'] = error
+        return job
+    
+    def stats(self):
+        """Queue depth and wait times across all workers sharing the job store"""
+        self.reclaim()
+        conn = get_connection(self.path)
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') GROUP BY status"
+        ).fetchall())
+        avg_wait, max_wait = conn.execute(
+            'SELECT AVG(started - created), MAX(started - created) FROM jobs WHERE started > ?',
+            (time.time() - 300,)
+        ).fetchone()
+        
+        with self._lock:
+            local_pending = self._pending
+        
+        return {
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'workerPending': local_pending,
+            'workerCapacity': self.workers + self.max_queued,
+            'avgWaitSeconds': round(avg_wait or 0.0, 3),
+            'maxWaitSeconds': round(max_wait or 0.0, 3)
+        }
+    
+    def prune(self):
+        """Reclaim orphaned jobs, then delete finished jobs older than the TTL"""
+        self.reclaim()
+        get_connection(self.path).execute(
+            'DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?',
+            (time.time() - self.ttl,)
+        )
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """Get or create the process-wide job queue"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            from config.settings import Config
+            _queue = JobQueue(
+                Config.JOBS_DB_PATH,
+                workers=Config.JOB_WORKERS,
+                max_queued=Config.JOB_MAX_QUEUED,
+                ttl=Config.JOB_TTL
+            )
+    return _queue
\ No newline at end of file
@@ -0,0 +1,449 @@
+# File: backend/routes/sessions.py
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from routes.ai_service import measure_layout
+from utils.admission import AdmissionError, check_image, get_pixel_budget
+from utils.image_pool import run_image_task
+from utils.image_processor import normalize_image, prepare_model_images, shot_overlap, stitch_images
+from utils.sqlite_store import get_connection
+
+# Session ids are uuid4().hex; they name directories, so nothing else may reach the filesystem
+SESSION_ID = re.compile(r'[0-9a-f]{32}')
+
+class SessionNotFoundError(Exception):
+    """Raised for unknown or expired sessions"""
+
+class SessionStore:
+    """
+    Multi-shot capture sessions that are processed while the user is still shooting.
+    
+    Each shot is uploaded as soon as it is captured (or re-uploaded after a
+    crop) and normalized at source resolution on a background thread; as
+    shots become ready the overlap between each adjacent pair is measured
+    and, once every shot is ready, the stitched image for the default order
+    is built, together with the model images (normalized or tiled once,
+    from the full-resolution stitch) and layout metrics. Analyze then
+    reuses all of it. Shot versions make re-uploads safe: work for an
+    outdated version is discarded.
+    
+    State lives in a SQLite file and shot images under `root`, both shared
+    by all gunicorn workers, so any worker can serve any request; a worker
+    that finds shots still processing elsewhere waits for them, and
+    processes them itself if they never finish. Sessions idle for longer
+    than `ttl` seconds expire.
+    """
+    
+    # Sweep expired sessions once every this many new sessions
+    PRUNE_EVERY = 20
+    POLL_INTERVAL = 0.1
+    
+    def __init__(self, path, root, ttl=900, max_shots=20, workers=2, wait=30.0, shot_max_side=8192):
+        self.path = path
+        self.root = root
+        self.shot_max_side = shot_max_side
+        self.ttl = ttl
+        self.max_shots = max_shots
+        self.wait = wait
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='session-shot')
+        self._lock = threading.Lock()
+        self._created = 0
+        
+        conn = get_connection(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                created REAL NOT NULL,
+                updated REAL NOT NULL,
+                stitched_key TEXT,
+                stitched_meta TEXT
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS session_shots (
+                session_id TEXT NOT NULL,
+                shot INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                error TEXT,
+                updated REAL NOT NULL,
+                PRIMARY KEY (session_id, shot)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS session_overlaps (
+                session_id TEXT NOT NULL,
+                top TEXT NOT NULL,
+                bottom TEXT NOT NULL,
+                overlap TEXT NOT NULL,
+                PRIMARY KEY (session_id, top, bottom)
+            )
+        """)
+    
+    def _dir(self, session_id):
+        if not isinstance(session_id, str) or not SESSION_ID.fullmatch(session_id):
+            raise SessionNotFoundError("Session not found or expired")
+        return os.path.join(self.root, session_id)
+    
+    def _shot_path(self, session_id, shot, version, suffix='jpg'):
+        return os.path.join(self._dir(session_id), f'{shot}.{version}.{suffix}')
+    
+    def _read_shot(self, session_id, shot):
+        with open(self._shot_path(session_id, shot['shot'], shot['version']), 'rb') as f:
+            return f.read()
+    
+    def create(self):
+        """Start a session and return its status dict"""
+        with self._lock:
+            self._created += 1
+            prune = self._created % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+        
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        os.makedirs(self._dir(session_id), exist_ok=True)
+        get_connection(self.path).execute(
+            'INSERT INTO sessions (id, created, updated) VALUES (?, ?, ?)',
+            (session_id, now, now)
+        )
+        return self.get(session_id)
+    
+    def touch(self, session_id):
+        """Keep a session alive; raises SessionNotFoundError if unknown or expired"""
+        now = time.time()
+        updated = get_connection(self.path).execute(
+            'UPDATE sessions SET updated = ? WHERE id = ? AND updated >= ?',
+            (now, session_id, now - self.ttl)
+        ).rowcount
+        if not updated:
+            raise SessionNotFoundError("Session not found or expired")
+    
+    def put_shot(self, session_id, shot, image_bytes):
+        """
+        Store a new version of a shot and queue its processing.
+        
+        Returns the shot's status dict; raises ValueError when the session
+        already holds `max_shots` other shots.
+        """
+        self.touch(session_id)
+        conn = get_connection(self.path)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT version FROM session_shots WHERE session_id = ? AND shot = ?',
+                (session_id, shot)
+            ).fetchone()
+            if row is None:
+                count = conn.execute(
+                    'SELECT COUNT(*) FROM session_shots WHERE session_id = ?', (session_id,)
+                ).fetchone()[0]
+                if count >= self.max_shots:
+                    raise ValueError(f"Too many shots in session (max {self.max_shots})")
+            version = (row[0] if row else 0) + 1
+            conn.execute(
+                "INSERT OR REPLACE INTO session_shots (session_id, shot, version, status, updated) "
+                "VALUES (?, ?, ?, 'processing', ?)",
+                (session_id, shot, version, time.time())
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        
+        upload_path = self._shot_path(session_id, shot, version, 'upload')
+        os.makedirs(os.path.dirname(upload_path), exist_ok=True)
+        with open(upload_path, 'wb') as f:
+            f.write(image_bytes)
+        self._executor.submit(self._process, session_id, shot, version)
+        return {'shot': shot, 'version': version, 'status': 'processing'}
+    
+    def delete_shot(self, session_id, shot):
+        """Remove a shot; returns False if the session has no such shot"""
+        self.touch(session_id)
+        removed = get_connection(self.path).execute(
+            'DELETE FROM session_shots WHERE session_id = ? AND shot = ?', (session_id, shot)
+        ).rowcount
+        if removed:
+            self._executor.submit(self._precompute, session_id)
+        return bool(removed)
+    
+    def _process(self, session_id, shot, version):
+        """Normalize one shot version, then precompute what depends on it"""
+        conn = get_connection(self.path)
+        upload_path = self._shot_path(session_id, shot, version, 'upload')
+        try:
+            with open(upload_path, 'rb') as f:
+                image_bytes = f.read()
+        except FileNotFoundError:
+            # Finished by another worker meanwhile, or the session was removed
+            return
+        
+        try:
+            with get_pixel_budget().reserve(check_image(image_bytes), wait=self.wait):
+                # Orientation and format only; the stitch is scaled for the model once
+                processed = run_image_task(normalize_image, image_bytes, max_side=self.shot_max_side)
+        except AdmissionError as e:
+            if e.status == 503:
+                # The host is busy; the shot stays queued and analyze finishes it
+                return
+            return self._fail(session_id, shot, version, e)
+        except Exception as e:
+            return self._fail(session_id, shot, version, e)
+        
+        shot_path = self._shot_path(session_id, shot, version)
+        with open(shot_path, 'wb') as f:
+            f.write(processed['data'])
+        current = conn.execute(
+            "UPDATE session_shots SET status = 'ready', width = ?, height = ?, updated = ? "
+            "WHERE session_id = ? AND shot = ? AND version = ? AND status = 'processing'",
+            (processed['width'], processed['height'], time.time(), session_id, shot, version)
+        ).rowcount
+        self._remove(upload_path)
+        
+        if not current:
+            # Re-uploaded or removed meanwhile; a version another worker finished keeps its file
+            if self._shots(session_id).get(shot, {}).get('version') != version:
+                self._remove(shot_path)
+            return
+        self._precompute(session_id)
+    
+    def _fail(self, session_id, shot, version, error):
+        get_connection(self.path).execute(
+            "UPDATE session_shots SET status = 'failed', error = ?, updated = ? "
+            "WHERE session_id = ? AND shot = ? AND version = ?",
+            (str(error), time.time(), session_id, shot, version)
+        )
+        self._remove(self._shot_path(session_id, shot, version, 'upload'))
+    
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    @staticmethod
+    def _write(path, data):
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    
+    def _read_stitch(self, session_id, key, meta):
+        """A stored stitch and its model images, or None if its files are gone"""
+        base = os.path.join(self._dir(session_id), f'stitched-{key}')
+        try:
+            with open(f'{base}.jpg', 'rb') as f:
+                image = f.read()
+            model_images = []
+            for index in range(meta['modelImageCount']):
+                with open(f'{base}.model-{index}', 'rb') as f:
+                    model_images.append(f.read())
+        except (FileNotFoundError, KeyError):
+            return None
+        return {**meta, 'image': image, 'modelImages': model_images}
+    
+    def _remove_stitch(self, session_id, key):
+        prefix = f'stitched-{key}.'
+        directory = self._dir(session_id)
+        for name in os.listdir(directory):
+            if name.startswith(prefix):
+                self._remove(os.path.join(directory, name))
+    
+    def _shots(self, session_id):
+        """Current shots as {shot: row dict}"""
+        rows = get_connection(self.path).execute(
+            'SELECT shot, version, status, width, height, error FROM session_shots WHERE session_id = ?',
+            (session_id,)
+        ).fetchall()
+        return {
+            row[0]: dict(zip(('shot', 'version', 'status', 'width', 'height', 'error'), row))
+            for row in rows
+        }
+    
+    def _overlap(self, session_id, top, bottom):
+        """Overlap between two shot versions, measured once per pair and stored"""
+        top_key, bottom_key = f"{top['shot']}.{top['version']}", f"{bottom['shot']}.{bottom['version']}"
+        conn = get_connection(self.path)
+        row = conn.execute(
+            'SELECT overlap FROM session_overlaps WHERE session_id = ? AND top = ? AND bottom = ?',
+            (session_id, top_key, bottom_key)
+        ).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+        
+        overlap = shot_overlap(self._read_shot(session_id, top), self._read_shot(session_id, bottom))
+        conn.execute(
+            'INSERT OR REPLACE INTO session_overlaps (session_id, top, bottom, overlap) VALUES (?, ?, ?, ?)',
+            (session_id, top_key, bottom_key, json.dumps(overlap))
+        )
+        return overlap
+    
+    def _precompute(self, session_id):
+        """Measure overlaps of adjacent ready shots; stitch once every shot is ready"""
+        try:
+            shots = self._shots(session_id)
+            ordered = [shots[shot] for shot in sorted(shots)]
+            for top, bottom in zip(ordered, ordered[1:]):
+                if top['status'] == 'ready' and bottom['status'] == 'ready':
+                    self._overlap(session_id, top, bottom)
+            if ordered and all(shot['status'] == 'ready' for shot in ordered):
+                self.stitch(session_id, wait=0)
+        except Exception:
+            # Only an optimization; analyze redoes whatever is missing
+            pass
+    
+    def _wait_ready(self, session_id, order, wait):
+        """Wait for the given shots to finish processing, then process leftovers here"""
+        deadline = time.monotonic() + wait
+        while True:
+            shots = self._shots(session_id)
+            missing = [shot for shot in order if shot not in shots]
+            if missing:
+                raise ValueError(f"Unknown shot {missing[0]}")
+            pending = [shots[shot] for shot in order if shots[shot]['status'] == 'processing']
+            if not pending:
+                return shots
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(self.POLL_INTERVAL)
+        
+        # The worker that accepted these shots may have died; finish them here
+        for shot in pending:
+            self._process(session_id, shot['shot'], shot['version'])
+        shots = self._shots(session_id)
+        if any(shots.get(shot['shot'], {}).get('status') == 'processing' for shot in pending):
+            raise ValueError("Shots are still processing, try again shortly")
+        return shots
+    
+    def stitch(self, session_id, order=None, wait=None):
+        """
+        The session's shots stitched in `order` (shot numbers; all shots by default).
+        
+        Waits up to `wait` seconds for shots still processing. Returns the
+        stitch_images result plus the shot order, whether a stitch prepared
+        in the background was reused, the model images prepared from it
+        with the default tiling (`modelImages`) and its `layout` metrics.
+        """
+        self.touch(session_id)
+        shots = self._shots(session_id)
+        order = [int(shot) for shot in order] if order else sorted(shots)
+        if not order:
+            raise ValueError("Session has no shots")
+        if len(set(order)) != len(order):
+            raise ValueError("Shot order lists a shot twice")
+        
+        shots = self._wait_ready(session_id, order, self.wait if wait is None else wait)
+        failed = [shots[shot] for shot in order if shots[shot]['status'] == 'failed']
+        if failed:
+            raise ValueError(f"Shot {failed[0]['shot']} could not be processed: {failed[0]['error']}")
+        
+        ordered = [shots[shot] for shot in order]
+        key = hashlib.sha256(
+            ','.join(f"{shot['shot']}.{shot['version']}" for shot in ordered).encode('ascii')
+        ).hexdigest()[:16]
+        base = os.path.join(self._dir(session_id), f'stitched-{key}')
+        
+        conn = get_connection(self.path)
+        row = conn.execute(
+            'SELECT stitched_key, stitched_meta FROM sessions WHERE id = ?', (session_id,)
+        ).fetchone()
+        if row is not None and row[0] == key:
+            stored = self._read_stitch(session_id, key, json.loads(row[1]))
+            if stored is not None:
+                return {**stored, 'order': order, 'prepared': True}
+        
+        pixels = sum(shot['width'] * shot['height'] for shot in ordered)
+        with get_pixel_budget().reserve(pixels):
+            known = [self._overlap(session_id, top, bottom) for top, bottom in zip(ordered, ordered[1:])]
+            result = stitch_images([self._read_shot(session_id, shot) for shot in ordered], known_overlaps=known)
+            result['modelImages'] = run_image_task(prepare_model_images, result['image'])
+            result['layout'] = measure_layout(result['image'])
+        
+        # Keep only the latest stitch on disk; the row is updated once every file is in place
+        for index, model_image in enumerate(result['modelImages']):
+            self._write(f'{base}.model-{index}', model_image)
+        self._write(f'{base}.jpg', result['image'])
+        meta = {name: value for name, value in result.items() if name not in ('image', 'modelImages')}
+        meta['modelImageCount'] = len(result['modelImages'])
+        previous = conn.execute('SELECT stitched_key FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        conn.execute(
+            'UPDATE sessions SET stitched_key = ?, stitched_meta = ? WHERE id = ?',
+            (key, json.dumps(meta), session_id)
+        )
+        if previous and previous[0] and previous[0] != key:
+            self._remove_stitch(session_id, previous[0])
+        return {**result, 'order': order, 'prepared': False}
+    
+    def get(self, session_id):
+        """Return a session's status dict; raises SessionNotFoundError if unknown or expired"""
+        row = get_connection(self.path).execute(
+            'SELECT created, updated FROM sessions WHERE id = ? AND updated >= ?',
+            (session_id, time.time() - self.ttl)
+        ).fetchone()
+        if row is None:
+            raise SessionNotFoundError("Session not found or expired")
+        
+        created, updated = row
+        shots = []
+        for shot in sorted(self._shots(session_id).values(), key=lambda shot: shot['shot']):
+            if shot['error'] is None:
+                del shot['error']
+            shots.append(shot)
+        return {
+            'sessionId': session_id,
+            'createdAt': created,
+            'expiresAt': updated + self.ttl,
+            'shots': shots
+        }
+    
+    def delete(self, session_id):
+        """Remove a session and its files; raises SessionNotFoundError if unknown"""
+        directory = self._dir(session_id)
+        conn = get_connection(self.path)
+        if not conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,)).rowcount:
+            raise SessionNotFoundError("Session not found or expired")
+        for table in ('session_overlaps', 'session_shots'):
+            conn.execute(f'DELETE FROM {table} WHERE session_id = ?', (session_id,))
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    def prune(self):
+        """Delete sessions idle for longer than the TTL"""
+        expired = get_connection(self.path).execute(
+            'SELECT id FROM sessions WHERE updated < ?', (time.time() - self.ttl,)
+        ).fetchall()
+        for (session_id,) in expired:
+            try:
+                self.delete(session_id)
+            except SessionNotFoundError:
+                pass
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_session_store():
+    """Get or create the process-wide session store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            from config.settings import Config
+            _store = SessionStore(
+                Config.SESSIONS_DB_PATH,
+                Config.SESSIONS_DIR,
+                ttl=Config.SESSION_TTL,
+                max_shots=Config.SESSION_MAX_SHOTS,
+                workers=Config.SESSION_WORKERS,
+                wait=Config.SESSION_WAIT,
+                shot_max_side=max(Config.MAX_IMAGE_WIDTH, Config.MAX_IMAGE_HEIGHT)
+            )
+    return _store
\ No newline at end of file
@@ -0,0 +1,189 @@
+# File: backend/utils/admission.py
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from io import BytesIO
+from PIL import Image
+from utils.image_processor import check_image_limits
+from utils.sqlite_store import get_connection, process_alive
+
+class AdmissionError(Exception):
+    """An upload refused before decoding; carries the HTTP status to answer with"""
+    
+    def __init__(self, message, status=413, retry_after=None, reason='too_large'):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+def check_image(image_bytes, stitched=False):
+    """
+    Header-only admission check of an encoded image.
+
+    Enforces MAX_IMAGE_SIZE and the dimension limits (the taller
+    MAX_STITCHED_HEIGHT for `stitched` analysis inputs, whose pixels the
+    budget caps instead) without decoding any pixel data and returns the
+    decoded pixel count (width x height).
+    """
+    try:
+        size = Image.open(BytesIO(image_bytes)).size
+    except Exception:
+        raise AdmissionError("Unsupported or corrupt image", status=400, reason='invalid')
+    
+    valid, message = check_image_limits(len(image_bytes), size, stitched)
+    if not valid:
+        raise AdmissionError(message)
+    return size[0] * size[1]
+
+class PixelBudget:
+    """
+    Weighted semaphore over decoded pixels, shared by all workers on a host.
+
+    Each image decode holds a lease of width x height pixels until its local
+    processing is done, so the host never has more than `capacity` pixels
+    decoded at once however the load is spread across workers. Leases live
+    in a SQLite file; leases of workers that died are reclaimed, and leases
+    older than `max_lease_age` are treated as leaked.
+    """
+    
+    POLL_INTERVAL = 0.05
+    
+    def __init__(self, path, capacity, wait=10.0, max_lease_age=600):
+        self.path = path
+        self.capacity = capacity
+        self.wait = wait
+        self.max_lease_age = max_lease_age
+        
+        conn = get_connection(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pixel_leases (
+                id INTEGER PRIMARY KEY,
+                pid INTEGER NOT NULL,
+                pixels INTEGER NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+    
+    def check(self, pixels):
+        """Refuse work that could never fit, whatever else is running"""
+        if pixels > self.capacity:
+            raise AdmissionError(
+                f"Image needs {pixels} decoded pixels, more than the {self.capacity} pixel budget",
+                reason='over_budget'
+            )
+    
+    def try_acquire(self, pixels):
+        """Take a lease of `pixels` if it fits now; returns the lease id or None"""
+        self.check(pixels)
+        conn = get_connection(self.path)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            in_use = conn.execute('SELECT COALESCE(SUM(pixels), 0) FROM pixel_leases').fetchone()[0]
+            if in_use + pixels > self.capacity and self._reclaim(conn):
+                in_use = conn.execute('SELECT COALESCE(SUM(pixels), 0) FROM pixel_leases').fetchone()[0]
+            lease = None
+            if in_use + pixels <= self.capacity:
+                lease = conn.execute(
+                    'INSERT INTO pixel_leases (pid, pixels, created) VALUES (?, ?, ?)',
+                    (os.getpid(), pixels, time.time())
+                ).lastrowid
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return lease
+    
+    def _reclaim(self, conn):
+        """Delete leases of dead workers and leaked leases; True if any were removed"""
+        removed = conn.execute(
+            'DELETE FROM pixel_leases WHERE created < ?', (time.time() - self.max_lease_age,)
+        ).rowcount
+        for (pid,) in conn.execute('SELECT DISTINCT pid FROM pixel_leases').fetchall():
+            if pid != os.getpid() and not process_alive(pid):
+                removed += conn.execute('DELETE FROM pixel_leases WHERE pid = ?', (pid,)).rowcount
+        return removed > 0
+    
+    def acquire(self, pixels, wait=None):
+        """
+        Block until `pixels` fit in the budget and return the lease id.
+
+        Raises AdmissionError (503 with Retry-After) if nothing frees up
+        within `wait` seconds.
+        """
+        deadline = time.monotonic() + (self.wait if wait is None else wait)
+        while True:
+            lease = self.try_acquire(pixels)
+            if lease is not None:
+                return lease
+            if time.monotonic() >= deadline:
+                raise self.busy_error()
+            time.sleep(self.POLL_INTERVAL)
+    
+    async def acquire_async(self, pixels, wait=None):
+        """acquire() for the event loop; polls without holding a thread while queued"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.wait if wait is None else wait)
+        while True:
+            lease = await loop.run_in_executor(None, self.try_acquire, pixels)
+            if lease is not None:
+                return lease
+            if loop.time() >= deadline:
+                raise self.busy_error()
+            await asyncio.sleep(self.POLL_INTERVAL)
+    
+    def busy_error(self):
+        return AdmissionError(
+            "Server is busy processing other images, try again shortly",
+            status=503, retry_after=max(1, round(self.wait)), reason='busy'
+        )
+    
+    def release(self, lease):
+        if lease is not None:
+            get_connection(self.path).execute('DELETE FROM pixel_leases WHERE id = ?', (lease,))
+    
+    @contextmanager
+    def reserve(self, pixels, wait=None):
+        """Hold a lease of `pixels` for the duration of the block"""
+        lease = self.acquire(pixels, wait)
+        try:
+            yield
+        finally:
+            self.release(lease)
+    
+    def usage(self):
+        """Pixels currently leased across all workers"""
+        in_use, leases = get_connection(self.path).execute(
+            'SELECT COALESCE(SUM(pixels), 0), COUNT(*) FROM pixel_leases'
+        ).fetchone()
+        return {'capacity': self.capacity, 'inUse': in_use, 'leases': leases}
+
+_budget = None
+_budget_lock = threading.Lock()
+
+def get_pixel_budget():
+    """Get or create the process-wide pixel budget"""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            from config.settings import Config
+            _budget = PixelBudget(
+                Config.ADMISSION_DB_PATH,
+                Config.PIXEL_BUDGET,
+                wait=Config.PIXEL_BUDGET_WAIT
+            )
+    return _budget
+
+@contextmanager
+def admitted(images, stitched=False):
+    """
+    Check encoded images and hold their pixels in the budget for the block.
+
+    `images` are raw bytes; checks are header-only, so a refused upload is
+    never decoded. Pass `stitched` for analysis inputs, see check_image().
+    """
+    budget = get_pixel_budget()
+    pixels = sum(check_image(image, stitched) for image in images)
+    with budget.reserve(pixels):
+        yield
\ No newline at end of file
@@ -1,6 +1,6 @@
 # File: backend/utils/code_analyzer.py
-import re
 import ast
+from utils.jsx_lexer import scan_react_source
 
 def analyze_react_code(code):
     """
@@ -18,46 +18,43 @@ def analyze_react_code(code):
     }
     
     try:
-        # Find component names
-        component_pattern = r'(?:function|const|class)\s+([A-Z][a-zA-Z0-9]*)'
-        components = re.findall(component_pattern, code)
-        analysis['components'] = list(set(components))
+        # One linear pass gives components, hooks, imports and styling signals
+        scan = scan_react_source(code)
+        analysis['components'] = list(scan.components)
         
         # Check for hooks
-        if 'useState' in code:
-            analysis['has_state'] = True
-        if 'useEffect' in code:
-            analysis['has_effects'] = True
+        analysis['has_state'] = 'useState' in scan.hooks
+        analysis['has_effects'] = 'useEffect' in scan.hooks
         
         # Check for props
-        if 'props' in code or re.search(r'\(\s*\{.*?\}\s*\)', code):
-            analysis['has_props'] = True
+        analysis['has_props'] = scan.has_props
         
         # Find imports
-        import_pattern = r'import\s+.*?\s+from\s+[\'"]([^\'"]+)[\'"]'
-        imports = re.findall(import_pattern, code)
+        imports = list(scan.imports)
         analysis['imports'] = imports
         
         # Detect styling approach
-        if 'styled-components' in ' '.join(imports):
+        import_text = ' '.join(imports)
+        if 'styled-components' in import_text:
             analysis['styling_approach'] = 'styled-components'
-        elif 'css' in ' '.join(imports) or '.module.css' in code:
+        elif 'css' in import_text:
             analysis['styling_approach'] = 'css-modules'
-        elif 'makeStyles' in code or '@mui' in ' '.join(imports):
+        elif 'makeStyles' in scan.identifiers or '@mui' in import_text:
             analysis['styling_approach'] = 'material-ui'
-        elif 'tailwind' in code.lower() or 'className=' in code:
-            if 'tw-' in code or 'text-' in code or 'bg-' in code:
+        elif scan.has_class_name:
+            utility_prefixes = ('tw-', 'text-', 'bg-')
+            if any(name.startswith(utility_prefixes) for name in scan.class_names):
                 analysis['styling_approach'] = 'tailwind'
             else:
                 analysis['styling_approach'] = 'inline-classes'
-        elif 'style={{' in code or 'style={' in code:
+        elif scan.has_inline_style:
             analysis['styling_approach'] = 'inline-styles'
         
         # Extract dependencies
         analysis['dependencies'] = extract_dependencies(imports)
         
         # Determine complexity
-        line_count = len(code.split('\n'))
+        line_count = scan.line_count
         if line_count < 50:
             analysis['complexity'] = 'simple'
         elif line_count < 150:
@@ -96,25 +93,26 @@ def validate_jsx_syntax(code):
     Basic JSX syntax validation
     """
     errors = []
+    scan = scan_react_source(code)
     
     # Check for unclosed tags
-    tag_pattern = r'<([A-Z][a-zA-Z0-9]*)[^>]*>'
-    opening_tags = re.findall(tag_pattern, code)
+    for tag in dict.fromkeys(scan.unclosed_tags):
+        errors.append(f"Possibly unclosed tag: {tag}")
     
-    for tag in opening_tags:
-        if not re.search(f'</{tag}>', code) and not re.search(f'<{tag}[^>]*/>', code):
-            errors.append(f"Possibly unclosed tag: {tag}")
+    for tag in dict.fromkeys(scan.mismatched_tags):
+        errors.append(f"Closing tag without matching opening tag: {tag}")
     
     # Check for common syntax errors
-    if '() =>' in code and 'const' not in code[:code.index('() =>')]:
+    arrow_index = code.find('() =>')
+    if arrow_index != -1 and 'const' not in code[:arrow_index]:
         errors.append("Arrow function might be missing variable declaration")
     
-    # Check for balanced braces
-    if code.count('{') != code.count('}'):
+    # Check for balanced braces (outside strings, comments and JSX text)
+    if scan.brace_balance != 0:
         errors.append("Unbalanced curly braces")
     
     # Check for balanced parentheses
-    if code.count('(') != code.count(')'):
+    if scan.paren_balance != 0:
         errors.append("Unbalanced parentheses")
     
     return errors
@@ -126,17 +124,9 @@ def extract_component_tree(code):
     tree = {}
     
     try:
-        # Find all JSX elements
-        jsx_pattern = r'<([A-Z][a-zA-Z0-9]*)[^>]*>.*?</\1>|<([A-Z][a-zA-Z0-9]*)[^>]*/>'
-        elements = re.findall(jsx_pattern, code, re.DOTALL)
-        
-        # Build a simple tree structure
-        for element in elements:
-            component_name = element[0] or element[1]
-            if component_name:
-                if component_name not in tree:
-                    tree[component_name] = {'count': 0, 'children': []}
-                tree[component_name]['count'] += 1
+        # Components rendered as JSX, with the components rendered directly inside them
+        for name, entry in scan_react_source(code).elements.items():
+            tree[name] = {'count': entry['count'], 'children': list(entry['children'])}
     
     except Exception:
         pass
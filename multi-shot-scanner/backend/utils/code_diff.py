@@ -0,0 +1,68 @@
+# File: backend/utils/code_diff.py
+import json
+import re
+from difflib import SequenceMatcher
+
+# Browsers send multipart text fields with CRLF line breaks, so split on either
+LINE_BREAK = re.compile(r'\r?\n')
+
+# Result fields dropped in diff mode unless the client asks for them by name
+OPTIONAL_FIELDS = ('fullResponse', 'analysis')
+
+def diff_hunks(original, revised):
+    """
+    Line hunks that turn `original` into `revised`.
+    
+    Both texts are split on LF or CRLF, so a patched result always has LF
+    line breaks; a missing final newline is preserved. Each hunk is
+    [start, deleteCount, insertLines] against the original's lines, in
+    ascending order; apply them from last to first.
+    """
+    old_lines = LINE_BREAK.split(original)
+    new_lines = LINE_BREAK.split(revised)
+    matcher = SequenceMatcher(None, old_lines, new_lines)
+    return [
+        [i1, i2 - i1, new_lines[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+def apply_hunks(original, hunks):
+    """Inverse of diff_hunks; the frontend does the same in app.js"""
+    lines = LINE_BREAK.split(original)
+    for start, delete_count, insert_lines in reversed(hunks):
+        lines[start:start + delete_count] = insert_lines
+    return '\n'.join(lines)
+
+def fixed_code_patch(react_code, fixed_code):
+    """
+    Hunks against the submitted code, or None when sending the code whole
+    is no larger (the model rewrote most of it, or returned no code)
+    """
+    if not fixed_code or not react_code:
+        return None
+    hunks = diff_hunks(react_code, fixed_code)
+    if len(json.dumps(hunks)) >= len(json.dumps(fixed_code)):
+        return None
+    return hunks
+
+def diff_result(result, react_code, include=()):
+    """
+    Copy of an analysis result for diff-mode clients.
+    
+    `fixedCode` is replaced by `fixedCodePatch` when that is smaller and
+    the result says the code can be patched (`fixedCodePatchable`: the
+    model saw the submitted code whole), and the fields in
+    OPTIONAL_FIELDS are left out unless named in `include`.
+    """
+    shaped = {
+        key: value for key, value in result.items()
+        if key not in OPTIONAL_FIELDS or key in include
+    }
+    patch = None
+    if result.get('fixedCodePatchable'):
+        patch = fixed_code_patch(react_code, result.get('fixedCode'))
+    if patch is not None:
+        del shaped['fixedCode']
+        shaped['fixedCodePatch'] = patch
+    return shaped
\ No newline at end of file
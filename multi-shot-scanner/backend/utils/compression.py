@@ -0,0 +1,43 @@
+# File: backend/utils/compression.py
+import gzip
+from werkzeug.http import parse_accept_header
+
+# Brotli is optional; without it clients get gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+# Dynamic responses are compressed per request, so favour speed over ratio
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def negotiate_encoding(accept_encoding, available=('br', 'gzip')):
+    """Best of `available` that the Accept-Encoding header allows, or 'identity'"""
+    if accept_encoding:
+        accept = parse_accept_header(accept_encoding)
+        for candidate in available:
+            if candidate == 'br' and brotli is None:
+                continue
+            if accept.quality(candidate) > 0:
+                return candidate
+    return 'identity'
+
+def compress_body(body, content_type, accept_encoding, min_bytes=1024):
+    """
+    Compress a dynamic response body for the client when worthwhile.
+    
+    Returns (body, encoding); encoding is None when the body should go out
+    as it is (too small, not a text type, or not accepted).
+    """
+    if len(body) < min_bytes or not (content_type or '').startswith(COMPRESSIBLE_TYPES):
+        return body, None
+    
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), encoding
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), encoding
+    return body, None
\ No newline at end of file
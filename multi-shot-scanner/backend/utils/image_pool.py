@@ -0,0 +1,191 @@
+# File: backend/utils/image_pool.py
+import multiprocessing
+import os
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from utils.image_processor import decode_image_input
+
+# Set in pool workers, which must run image tasks inline rather than start pools of their own
+_in_worker = False
+
+def _mark_worker():
+    global _in_worker
+    _in_worker = True
+
+def _warm(_=None):
+    """Runs once in each new worker so the first real task does not pay for imports"""
+    # Imported only to load it now
+    import numpy  # noqa: F401
+    import PIL.Image
+    PIL.Image.init()
+    return os.getpid()
+
+def _drop_frame_locals(error):
+    """Clear the locals of an exception's traceback frames (and of its causes) so they free what they hold"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        traceback.clear_frames(error.__traceback__)
+        error = error.__cause__ or error.__context__
+
+def _run_shared(fn, name, size, kwargs):
+    """
+    Worker side of ImagePool.run: call fn on image bytes read in place
+    from shared memory. Returns (result, timings).
+    
+    A failure in fn is re-raised as it is: its traceback frames would
+    otherwise keep buffers over the shared memory alive, and closing the
+    block would replace the error with a BufferError.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    view = shm.buf[:size]
+    error = None
+    try:
+        timings = {}
+        result = fn(view, timings=timings, **kwargs)
+    except Exception as e:
+        error = e
+        _drop_frame_locals(error)
+    
+    try:
+        view.release()
+        shm.close()
+    except BufferError:
+        # Something still holds the mapping; it is unmapped when the worker exits
+        pass
+    if error is not None:
+        raise error
+    return result, timings
+
+class ImagePool:
+    """
+    Process pool for CPU-bound image work (decode, resize, encode).
+    
+    Threads serialize on the GIL while PIL and NumPy run Python-level code,
+    so image stages run in worker processes instead and the calling thread
+    only waits. Uploads are handed over through shared memory rather than
+    pickled; results are the re-encoded images, which are much smaller.
+    A task that runs past `timeout` seconds, or a worker that dies, gets
+    the pool replaced so one pathological image cannot hold a worker.
+    """
+    
+    def __init__(self, workers, timeout=30.0, start_method='forkserver'):
+        self.workers = workers
+        self.timeout = timeout
+        self.start_method = start_method
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._generation = 0
+    
+    def _current(self):
+        with self._lock:
+            if self._executor is None:
+                context = multiprocessing.get_context(self.start_method)
+                if self.start_method == 'forkserver':
+                    # New workers fork from a server that already has PIL and NumPy loaded
+                    context.set_forkserver_preload(['utils.image_processor'])
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context, initializer=_mark_worker
+                )
+                self._generation += 1
+            return self._executor, self._generation
+    
+    def _replace(self, generation):
+        """Drop a hung or broken executor, unless another thread already has"""
+        with self._lock:
+            if self._executor is None or generation != self._generation:
+                return
+            executor, self._executor = self._executor, None
+        # ProcessPoolExecutor cannot cancel a running task; stop its workers instead
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    def start(self):
+        """Start every worker now and wait until each has loaded the image libraries"""
+        executor, _ = self._current()
+        pids = set(executor.map(_warm, range(self.workers), timeout=self.timeout * 2))
+        return len(pids)
+    
+    def run(self, fn, image_bytes, timings=None, **kwargs):
+        """
+        Run fn(image_bytes, timings=..., **kwargs) in a worker and return its result.
+        
+        `fn` must be a module-level function taking the image as a
+        bytes-like object. Worker stage timings are added to `timings`.
+        Raises TimeoutError after `timeout` seconds.
+        """
+        size = len(image_bytes)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, size))
+        try:
+            shm.buf[:size] = image_bytes
+            # A task lost to another task's timeout or crash gets one more try on the new pool
+            for attempt in range(2):
+                executor, generation = self._current()
+                try:
+                    future = executor.submit(_run_shared, fn, shm.name, size, kwargs)
+                    result, worker_timings = future.result(timeout=self.timeout)
+                    break
+                except FutureTimeoutError:
+                    self._replace(generation)
+                    raise TimeoutError(f"Image processing timed out after {self.timeout:g}s")
+                except BrokenProcessPool:
+                    self._replace(generation)
+                    if attempt:
+                        raise Exception("Image processing failed: worker process died")
+        finally:
+            shm.close()
+            shm.unlink()
+        
+        if timings is not None:
+            for name, elapsed in worker_timings.items():
+                timings[name] = round(timings.get(name, 0.0) + elapsed, 2)
+        return result
+    
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_image_pool():
+    """
+    Get or create this process's image pool; None when IMAGE_POOL_WORKERS
+    is 0 or when called inside a pool worker. Server workers that are
+    themselves multiprocessing children (uvicorn --workers) get a pool.
+    """
+    global _pool
+    from config.settings import Config
+    if Config.IMAGE_POOL_WORKERS <= 0 or _in_worker:
+        return None
+    with _pool_lock:
+        # A pool created before a fork (gunicorn --preload) belongs to the parent
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = ImagePool(
+                Config.IMAGE_POOL_WORKERS,
+                timeout=Config.IMAGE_POOL_TIMEOUT,
+                start_method=Config.IMAGE_POOL_START_METHOD
+            )
+    return _pool
+
+def start_image_pool():
+    """Warm the image pool at app startup; returns the number of workers started"""
+    pool = get_image_pool()
+    return pool.start() if pool is not None else 0
+
+def run_image_task(fn, image_data, timings=None, **kwargs):
+    """
+    Run fn(image_bytes, timings=timings, **kwargs) in the image pool, or
+    inline on this thread when the pool is disabled
+    """
+    pool = get_image_pool()
+    if pool is None:
+        return fn(image_data, timings=timings, **kwargs)
+    return pool.run(fn, decode_image_input(image_data), timings, **kwargs)
\ No newline at end of file
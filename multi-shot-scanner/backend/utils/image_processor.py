@@ -1,79 +1,406 @@
 # File: backend/utils/image_processor.py
 import base64
-from PIL import Image
+import math
+import numpy as np
+from PIL import Image, ImageOps
 from io import BytesIO
+from config.settings import Config
+from utils.timing import StageTimer
 
-def process_image_data(image_data_url):
+# EXIF tag holding the camera orientation
+EXIF_ORIENTATION = 0x0112
+
+# Magic numbers for the formats the Anthropic API accepts
+MEDIA_TYPE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+    (b'RIFF', 'image/webp'),
+]
+
+# Number of vertical bands averaged into each row signature
+SIGNATURE_BANDS = 32
+
+def decode_image_input(image_input):
     """
-    Process and optimize image data from base64 data URL
+    Return raw image bytes from a data URL, a base64 string or a bytes-like object
     """
-    try:
-        # Remove data URL prefix if present
-        if ',' in image_data_url:
-            image_data = image_data_url.split(',')[1]
-        else:
-            image_data = image_data_url
-        
-        # Decode base64
-        image_bytes = base64.b64decode(image_data)
-        
-        # Open image with PIL
+    if isinstance(image_input, (bytes, bytearray, memoryview)):
+        return memoryview(image_input)
+    
+    # Remove data URL prefix if present
+    if ',' in image_input:
+        image_input = image_input.split(',', 1)[1]
+    
+    return memoryview(base64.b64decode(image_input))
+
+def image_media_type(image_bytes):
+    """Detect the media type of encoded image bytes, defaulting to JPEG"""
+    header = bytes(image_bytes[:12])
+    for signature, media_type in MEDIA_TYPE_SIGNATURES:
+        if header.startswith(signature):
+            if media_type == 'image/webp' and header[8:12] != b'WEBP':
+                continue
+            return media_type
+    return 'image/jpeg'
+
+def check_image_limits(byte_count, size, stitched=False):
+    """
+    Check encoded size and dimensions against the configured limits.
+    
+    Single shots are held to MAX_IMAGE_WIDTH x MAX_IMAGE_HEIGHT; a
+    `stitched` capture (any analysis input) may be up to
+    MAX_STITCHED_HEIGHT tall.
+    """
+    if byte_count > Config.MAX_IMAGE_SIZE:
+        return False, f"Image size exceeds {Config.MAX_IMAGE_SIZE // (1024 * 1024)}MB limit"
+    
+    width, height = size
+    max_height = Config.MAX_STITCHED_HEIGHT if stitched else Config.MAX_IMAGE_HEIGHT
+    if width > Config.MAX_IMAGE_WIDTH or height > max_height:
+        return False, f"Image dimensions exceed {Config.MAX_IMAGE_WIDTH}x{max_height}px limit"
+    
+    return True, "Valid"
+
+def to_rgb(img):
+    """Convert a decoded image to RGB, compositing any transparency onto white"""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+def normalize_image(image_input, timings=None, extract_colors=False, validate=False,
+                    max_side=None, resample=None, output_format=None, quality=None):
+    """
+    Normalize an uploaded image for the model from a single decode.
+    
+    The header is read once for validation and the passthrough check; small
+    JPEGs that need no changes are returned byte-for-byte. Otherwise JPEGs
+    are decoded at reduced size with Image.draft(), EXIF orientation is
+    applied, and the same image object feeds conversion, colour extraction,
+    resizing and encoding. Per-stage timings (ms) are added to `timings`.
+    
+    Returns a dict with the encoded bytes, media type, dimensions, whether
+    the input passed through unchanged, optional colours and the timings.
+    """
+    timer = StageTimer(timings)
+    max_side = max_side or Config.IMAGE_MAX_SIDE
+    resample = resample or Config.IMAGE_RESAMPLE
+    output_format = (output_format or Config.IMAGE_OUTPUT_FORMAT).upper()
+    quality = quality or Config.IMAGE_QUALITY
+    
+    with timer.stage('image_decode_input'):
+        image_bytes = decode_image_input(image_input)
+    
+    with timer.stage('image_open'):
         img = Image.open(BytesIO(image_bytes))
-        
-        # Convert RGBA to RGB if necessary
-        if img.mode == 'RGBA':
-            # Create a white background
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            background.paste(img, mask=img.split()[3])  # Use alpha channel as mask
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Resize if too large (max 2048px on longest side)
-        max_size = 2048
-        if max(img.size) > max_size:
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
-        
-        # Optimize image quality
+        source_format = img.format
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1) if source_format == 'JPEG' else 1
+    
+    if validate:
+        valid, message = check_image_limits(len(image_bytes), img.size)
+        if not valid:
+            raise ValueError(message)
+    
+    result = {'passthrough': False, 'colors': None, 'timings': timer.timings}
+    
+    # Already-small JPEGs go to the model as they are
+    if (output_format == 'JPEG' and source_format == 'JPEG'
+            and max(img.size) <= max_side
+            and img.mode in ('RGB', 'L')
+            and orientation == 1
+            and len(image_bytes) <= Config.IMAGE_PASSTHROUGH_BYTES):
+        result.update({
+            'data': bytes(image_bytes),
+            'mediaType': 'image/jpeg',
+            'width': img.width,
+            'height': img.height,
+            'passthrough': True
+        })
+        if extract_colors:
+            with timer.stage('image_colors'):
+                img.draft('RGB', (150, 150))
+                result['colors'] = dominant_colors(to_rgb(img))
+        return result
+    
+    with timer.stage('image_decode'):
+        if source_format == 'JPEG' and max(img.size) > max_side:
+            # Let libjpeg scale by 1/2, 1/4 or 1/8 while decoding
+            scale = max_side / max(img.size)
+            img.draft(None, (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+        img.load()
+        if orientation != 1:
+            img = ImageOps.exif_transpose(img)
+    
+    with timer.stage('image_convert'):
+        img = to_rgb(img)
+    
+    with timer.stage('image_resize'):
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), getattr(Image.Resampling, resample.upper()))
+    
+    if extract_colors:
+        with timer.stage('image_colors'):
+            result['colors'] = dominant_colors(img)
+    
+    with timer.stage('image_encode'):
         output_buffer = BytesIO()
-        img.save(output_buffer, format='JPEG', quality=85, optimize=True)
-        
-        # Convert back to base64
-        optimized_base64 = base64.b64encode(output_buffer.getvalue()).decode('utf-8')
-        
-        return optimized_base64
+        save_options = {'quality': quality}
+        if output_format == 'JPEG':
+            save_options['optimize'] = Config.IMAGE_OPTIMIZE
+        img.save(output_buffer, format=output_format, **save_options)
+    
+    result.update({
+        'data': output_buffer.getvalue(),
+        'mediaType': Image.MIME.get(output_format, 'image/jpeg'),
+        'width': img.width,
+        'height': img.height
+    })
+    return result
+
+def process_image_data(image_input, timings=None):
+    """
+    Process and optimize an uploaded image.
+    
+    Accepts raw bytes or a base64 data URL and returns the encoded image
+    as bytes; callers base64-encode only where a text payload is needed.
+    """
+    try:
+        return normalize_image(image_input, timings=timings)['data']
         
     except Exception as e:
         raise Exception(f"Image processing failed: {str(e)}")
 
-def extract_dominant_colors(image_data):
+def image_tokens(width, height):
+    """Approximate Anthropic vision token cost of an image as sent"""
+    return math.ceil(width * height / 750)
+
+def model_scale(width, height, max_side, max_pixels):
+    """Scale factor the model applies to fit an image within its per-image limits"""
+    return min(1.0, max_side / max(width, height), math.sqrt(max_pixels / (width * height)))
+
+def plan_tiles(width, height, max_side=None, max_pixels=None, overlap=None,
+               max_tiles=None, min_width=None):
     """
-    Extract dominant colors from image for theme analysis
+    Choose how to split a tall image into overlapping horizontal-strip tiles.
+    
+    For each tile count the strips are sized evenly and scaled to what the
+    model would keep of them; among plans whose effective width stays at or
+    above `min_width` (or the source width, if narrower), the one with the
+    fewest image tokens wins. Falls back to the widest plan available.
+    """
+    max_side = max_side or Config.TILE_MAX_SIDE
+    max_pixels = max_pixels or Config.TILE_MAX_PIXELS
+    overlap = Config.TILE_OVERLAP if overlap is None else overlap
+    max_tiles = max_tiles or Config.TILE_MAX_COUNT
+    min_width = min(width, min_width or Config.TILE_MIN_WIDTH)
+    
+    best = widest = None
+    for count in range(1, max_tiles + 1):
+        tile_height = math.ceil((height + (count - 1) * overlap) / count)
+        if count > 1 and tile_height <= overlap:
+            break
+        scale = model_scale(width, tile_height, max_side, max_pixels)
+        out_width = max(1, round(width * scale))
+        out_height = max(1, round(tile_height * scale))
+        plan = {
+            'count': count,
+            'tileHeight': tile_height,
+            'overlap': overlap if count > 1 else 0,
+            'scale': scale,
+            'outputSize': [out_width, out_height],
+            'tokens': count * image_tokens(out_width, out_height)
+        }
+        if widest is None or out_width > widest['outputSize'][0]:
+            widest = plan
+        if out_width >= min_width and (best is None or plan['tokens'] < best['tokens']):
+            best = plan
+    
+    return best or widest
+
+def tile_image(image_input, timings=None, **plan_options):
+    """
+    Split a tall image into model-sized, overlapping tiles (top to bottom).
+    
+    Returns a dict with the encoded JPEG tiles and the plan used.
+    """
+    timer = StageTimer(timings)
+    
+    with timer.stage('image_decode'):
+        img = Image.open(BytesIO(decode_image_input(image_input)))
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1) if img.format == 'JPEG' else 1
+        img.load()
+        if orientation != 1:
+            img = ImageOps.exif_transpose(img)
+        img = to_rgb(img)
+    
+    plan = plan_tiles(img.width, img.height, **plan_options)
+    step = plan['tileHeight'] - plan['overlap']
+    resample = getattr(Image.Resampling, Config.IMAGE_RESAMPLE.upper())
+    
+    tiles = []
+    for index in range(plan['count']):
+        top = min(index * step, max(0, img.height - plan['tileHeight']))
+        with timer.stage('image_resize'):
+            tile = img.crop((0, top, img.width, min(img.height, top + plan['tileHeight'])))
+            if plan['scale'] < 1.0:
+                tile = tile.resize(
+                    (plan['outputSize'][0], max(1, round(tile.height * plan['scale']))),
+                    resample
+                )
+        with timer.stage('image_encode'):
+            output_buffer = BytesIO()
+            tile.save(output_buffer, format='JPEG', quality=Config.IMAGE_QUALITY,
+                      optimize=Config.IMAGE_OPTIMIZE)
+            tiles.append(output_buffer.getvalue())
+    
+    return {'tiles': tiles, 'plan': plan, 'timings': timer.timings}
+
+def should_tile(width, height, mode=None):
+    """Whether an image of this size should be sent as tiles"""
+    mode = mode or Config.TILING_MODE
+    if mode == 'off':
+        return False
+    if mode == 'on':
+        return height > width
+    return height / width >= Config.TILE_ASPECT_RATIO
+
+def prepare_model_images(image_input, tiling=None, timings=None):
+    """
+    Turn an upload into the image bytes sent to the model.
+    
+    Tall captures are split into tiles so text stays legible; everything
+    else goes through normalize_image. Always returns a list.
     """
     try:
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        
-        image_bytes = base64.b64decode(image_data)
-        img = Image.open(BytesIO(image_bytes))
+        image_bytes = decode_image_input(image_input)
+        width, height = Image.open(BytesIO(image_bytes)).size
         
-        # Simple color extraction without sklearn
-        # Resize for faster processing
-        img.thumbnail((150, 150))
+        if should_tile(width, height, tiling):
+            return tile_image(image_bytes, timings=timings)['tiles']
         
-        # Convert to RGB
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Get most common colors
-        colors = img.getcolors(maxcolors=256)
-        if colors:
-            # Sort by frequency and get top 5
-            colors = sorted(colors, key=lambda x: x[0], reverse=True)[:5]
-            hex_colors = ['#%02x%02x%02x' % color[1] for color in colors]
-            return hex_colors
+        return [normalize_image(image_bytes, timings=timings)['data']]
         
+    except Exception as e:
+        raise Exception(f"Image processing failed: {str(e)}")
+
+def perceptual_hash(image_data, hash_size=8):
+    """
+    Compute a difference hash (dHash) of an image as a 64-bit integer.
+    
+    The image is reduced to a (hash_size, hash_size + 1) grayscale grid and
+    each bit records whether a cell is brighter than its right neighbour,
+    so recompression and small capture noise flip only a few bits.
+    """
+    img = Image.open(BytesIO(decode_image_input(image_data)))
+    
+    # JPEG can decode straight to a tiny grayscale image
+    img.draft('L', (hash_size * 8, hash_size * 8))
+    img = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    
+    pixels = np.asarray(img, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming_distances(target, hashes):
+    """Vectorized Hamming distance between one 64-bit hash and an array of them"""
+    diff = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(target))
+    return np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def median_cut_palette(pixels, count=8, sample_side=160):
+    """
+    Quantize an RGB image into a ranked palette with NumPy median cut.
+    
+    The image is sampled down to at most `sample_side` pixels per side
+    (nearest neighbour, so flat UI colours are not blended), pixels are
+    bucketed to 5 bits per channel and counted, and the box with the largest
+    weighted variance is split at the weighted median of its highest-variance
+    channel until there are `count` boxes. Returns [{'hex', 'coverage'}] sorted by coverage (%).
+    """
+    if isinstance(pixels, Image.Image):
+        scale = min(1.0, sample_side / max(pixels.size))
+        if scale < 1.0:
+            pixels = pixels.resize(
+                (max(1, round(pixels.width * scale)), max(1, round(pixels.height * scale))),
+                Image.Resampling.NEAREST
+            )
+        pixels = np.asarray(pixels)
+    
+    flat = pixels.reshape(-1, 3).astype(np.int32)
+    total = len(flat)
+    if total == 0:
         return []
+    
+    # Count 15-bit colour buckets, remembering each bucket's mean colour
+    keys = (flat[:, 0] >> 3) << 10 | (flat[:, 1] >> 3) << 5 | (flat[:, 2] >> 3)
+    unique, inverse, weights = np.unique(keys, return_inverse=True, return_counts=True)
+    sums = np.zeros((len(unique), 3), dtype=np.float64)
+    np.add.at(sums, inverse, flat)
+    colors = sums / weights[:, np.newaxis]
+    
+    boxes = [np.arange(len(unique))]
+    while len(boxes) < count:
+        # Split the box with the largest weighted colour variance
+        errors = []
+        for box in boxes:
+            if len(box) < 2:
+                errors.append(0.0)
+                continue
+            weight = weights[box][:, np.newaxis]
+            mean = (colors[box] * weight).sum(axis=0) / weight.sum()
+            errors.append(float((weight * (colors[box] - mean) ** 2).sum()))
+        target = int(np.argmax(errors))
+        if errors[target] <= 0:
+            break
+        
+        box = boxes.pop(target)
+        box_weights = weights[box][:, np.newaxis]
+        box_mean = (colors[box] * box_weights).sum(axis=0) / box_weights.sum()
+        channel = int(np.argmax((box_weights * (colors[box] - box_mean) ** 2).sum(axis=0)))
+        ordered = box[np.argsort(colors[box, channel], kind='stable')]
+        cumulative = np.cumsum(weights[ordered])
+        split = int(np.searchsorted(cumulative, cumulative[-1] / 2))
+        split = min(max(split, 1), len(ordered) - 1)
+        boxes.extend([ordered[:split], ordered[split:]])
+    
+    palette = []
+    for box in boxes:
+        weight = weights[box]
+        mean = (colors[box] * weight[:, np.newaxis]).sum(axis=0) / weight.sum()
+        r, g, b = np.clip(np.rint(mean), 0, 255).astype(int)
+        palette.append({
+            'hex': '#%02x%02x%02x' % (r, g, b),
+            'coverage': round(float(weight.sum()) * 100 / total, 2)
+        })
+    
+    return sorted(palette, key=lambda entry: entry['coverage'], reverse=True)
+
+def dominant_colors(img, count=5):
+    """
+    Ranked palette of an already-decoded RGB image
+    """
+    return median_cut_palette(img, count=count)
+
+def extract_palette(image_data, count=8):
+    """
+    Ranked palette with coverage percentages, decoded at reduced size
+    """
+    img = Image.open(BytesIO(decode_image_input(image_data)))
+    
+    # Decode straight to a small image where the format allows it
+    img.draft('RGB', (160, 160))
+    return median_cut_palette(to_rgb(img), count=count)
+
+def extract_dominant_colors(image_data):
+    """
+    Extract dominant colors from image for theme analysis
+    """
+    try:
+        return [entry['hex'] for entry in extract_palette(image_data, count=5)]
         
     except Exception:
         return []
@@ -83,21 +410,169 @@ def validate_image_size(image_data):
     Validate image size and dimensions
     """
     try:
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
+        image_bytes = decode_image_input(image_data)
         
-        image_bytes = base64.b64decode(image_data)
+        # Only the header is read; no pixel data is decoded
+        img = Image.open(BytesIO(image_bytes))
+        return check_image_limits(len(image_bytes), img.size)
         
-        # Check file size (10MB limit)
-        if len(image_bytes) > 10 * 1024 * 1024:
-            return False, "Image size exceeds 10MB limit"
+    except Exception as e:
+        return False, str(e)
+
+def _decode_to_rgb(image_data):
+    """Decode image bytes or a base64 data URL into an RGB PIL image"""
+    img = Image.open(BytesIO(decode_image_input(image_data)))
+    return to_rgb(img)
+
+def row_signatures(pixels):
+    """
+    Reduce an RGB pixel array (H, W, 3) to one short vector per row.
+    
+    Each row is converted to luma and averaged over SIGNATURE_BANDS
+    equal-width column bands, giving an (H, bands) float32 array that is
+    cheap to compare but still sensitive to horizontal structure.
+    """
+    luma = pixels[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    height, width = luma.shape
+    bands = min(SIGNATURE_BANDS, width)
+    usable = width - (width % bands)
+    return luma[:, :usable].reshape(height, bands, usable // bands).mean(axis=2)
+
+def find_vertical_overlap(top_sig, bottom_sig, min_overlap=8, max_ratio=0.9,
+                          probe_rows=24, max_diff=10.0, candidates=5):
+    """
+    Find how many rows at the bottom of one shot repeat at the top of the next.
+    
+    A textured probe strip from the top of `bottom_sig` is slid over
+    `top_sig` in one vectorized pass; the best few positions are then
+    verified against the full overlap region. Returns (overlap_rows, score),
+    with overlap_rows == 0 when no acceptable match exists.
+    """
+    top_h, bottom_h = len(top_sig), len(bottom_sig)
+    max_overlap = int(min(top_h, bottom_h) * max_ratio)
+    probe_rows = min(probe_rows, max_overlap)
+    if probe_rows < 1 or max_overlap < min_overlap:
+        return 0, None
+    
+    # Skip flat (blank) rows so the probe has something to lock onto
+    window_std = np.lib.stride_tricks.sliding_window_view(
+        bottom_sig[:max_overlap], probe_rows, axis=0
+    ).std(axis=(1, 2))
+    textured = np.flatnonzero(window_std > 1.0)
+    probe_start = int(textured[0]) if len(textured) else 0
+    probe = bottom_sig[probe_start:probe_start + probe_rows]
+    
+    # Only positions that yield an overlap within [min_overlap, max_overlap]
+    first_row = max(top_h - max_overlap + probe_start, 0)
+    last_row = top_h - min_overlap + probe_start
+    last_row = min(last_row, top_h - probe_rows)
+    if last_row < first_row:
+        return 0, None
+    
+    windows = np.lib.stride_tricks.sliding_window_view(
+        top_sig[first_row:last_row + probe_rows], probe_rows, axis=0
+    )
+    probe_scores = np.abs(windows - probe.T[np.newaxis]).mean(axis=(1, 2))
+    
+    best_overlap, best_score = 0, None
+    for idx in np.argsort(probe_scores)[:candidates]:
+        overlap = top_h - (first_row + int(idx) - probe_start)
+        if overlap < min_overlap or overlap > max_overlap:
+            continue
+        score = float(np.abs(top_sig[top_h - overlap:] - bottom_sig[:overlap]).mean())
+        if score <= max_diff and (best_score is None or score < best_score):
+            best_overlap, best_score = overlap, score
+    
+    return best_overlap, best_score
+
+def _scaled_arrays(images):
+    """Decode shots to RGB arrays, all scaled to the narrowest shot's width"""
+    shots = [_decode_to_rgb(image) for image in images]
+    width = min(img.width for img in shots)
+    
+    arrays = []
+    for img in shots:
+        if img.width != width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.Resampling.LANCZOS)
+        arrays.append(np.asarray(img))
+    return arrays
+
+def shot_overlap(top_image, bottom_image, min_overlap=8, max_diff=10.0):
+    """
+    Overlap between two adjacent shots, measured at the narrower one's width.
+    
+    Returns {'width', 'overlapRows', 'score'}; stitch_images reuses it as a
+    known overlap when it stitches at the same width.
+    """
+    top, bottom = _scaled_arrays([top_image, bottom_image])
+    overlap, score = find_vertical_overlap(
+        row_signatures(top), row_signatures(bottom),
+        min_overlap=min_overlap, max_diff=max_diff
+    )
+    return {
+        'width': top.shape[1],
+        'overlapRows': overlap,
+        'score': round(score, 2) if score is not None else None
+    }
+
+def stitch_images(images, min_overlap=8, max_diff=10.0, known_overlaps=None):
+    """
+    Stitch multiple vertical captures into one image, dropping repeated rows.
+    
+    All shots are scaled to the narrowest width, the overlap between each
+    adjacent pair is found with row-signature matching, and only the new
+    rows of each shot are appended. `known_overlaps` may hold a
+    shot_overlap() result (or None) per adjacent pair; those measured at
+    the stitch width are used instead of matching again.
+    """
+    try:
+        if not images:
+            raise ValueError("No images to stitch")
         
-        # Check dimensions
-        img = Image.open(BytesIO(image_bytes))
-        if img.width > 4096 or img.height > 4096:
-            return False, "Image dimensions exceed 4096px limit"
+        arrays = _scaled_arrays(images)
+        width = arrays[0].shape[1]
+        signatures = {}
+        
+        def signature(index):
+            if index not in signatures:
+                signatures[index] = row_signatures(arrays[index])
+            return signatures[index]
+        
+        parts = [arrays[0]]
+        overlaps = []
+        
+        for i in range(1, len(arrays)):
+            known = known_overlaps[i - 1] if known_overlaps else None
+            if known is not None and known['width'] == width:
+                overlap, score = known['overlapRows'], known['score']
+            else:
+                overlap, score = find_vertical_overlap(
+                    signature(i - 1), signature(i),
+                    min_overlap=min_overlap, max_diff=max_diff
+                )
+                score = round(score, 2) if score is not None else None
+            overlaps.append({
+                'index': i,
+                'overlapRows': overlap,
+                'score': score
+            })
+            parts.append(arrays[i][overlap:])
+        
+        stitched = Image.fromarray(np.concatenate(parts, axis=0))
+        
+        output_buffer = BytesIO()
+        stitched.save(output_buffer, format='JPEG', quality=85, optimize=True)
+        
+        original_height = sum(len(pixels) for pixels in arrays)
         
-        return True, "Valid"
+        return {
+            'image': output_buffer.getvalue(),
+            'width': stitched.width,
+            'height': stitched.height,
+            'originalHeight': original_height,
+            'overlaps': overlaps
+        }
         
     except Exception as e:
-        return False, str(e)
\ No newline at end of file
+        raise Exception(f"Image stitching failed: {str(e)}")
\ No newline at end of file
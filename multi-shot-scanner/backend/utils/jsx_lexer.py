@@ -0,0 +1,343 @@
+# File: backend/utils/jsx_lexer.py
+import re
+from functools import lru_cache
+
+# JavaScript tokens, tried at the current position in order
+JS_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<line_comment>//[^\n]*)
+  | (?P<block_comment>/\*.*?(?:\*/|\Z))
+  | (?P<ident>[A-Za-z_$][\w$]*)
+  | (?P<number>\.?\d[\w.]*)
+  | (?P<string>'(?:[^'\\\n]|\\.)*'?|"(?:[^"\\\n]|\\.)*"?)
+  | (?P<punct>=>|\.\.\.|\?\.|&&|\|\||\?\?|[=!]==?|[<>]=?|[-+*/%&|^~!?:;,.=(){}\[\]`@#])
+""", re.VERBOSE | re.DOTALL)
+
+REGEX_LITERAL = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[A-Za-z]*')
+
+# Template literal text up to the next backtick or ${
+TEMPLATE_TEXT = re.compile(r'(?:[^`\\$]|\\.|\$(?!\{))*', re.DOTALL)
+
+JSX_TEXT = re.compile(r'[^{<]+')
+JSX_NAME = re.compile(r'[A-Za-z_$][\w$.:-]*')
+JSX_ATTR_STRING = re.compile(r'"[^"]*"?|\'[^\']*\'?')
+JSX_WS = re.compile(r'\s+')
+
+# After these keywords an expression (so a regex or JSX) may start
+EXPRESSION_KEYWORDS = {
+    'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+    'void', 'throw', 'yield', 'await', 'instanceof', 'default', 'export'
+}
+
+DECLARATION_KEYWORDS = {'function', 'const', 'class'}
+
+HOOK_NAME = re.compile(r'use[A-Z0-9]\w*$')
+
+class JsxScan:
+    """Everything code_analyzer needs from one pass over a React source file"""
+    
+    def __init__(self):
+        self.components = []
+        self.hooks = []
+        self.imports = []
+        self.identifiers = set()
+        self.class_names = []
+        self.has_props = False
+        self.has_inline_style = False
+        self.has_class_name = False
+        self.unclosed_tags = []
+        self.mismatched_tags = []
+        self.brace_balance = 0
+        self.paren_balance = 0
+        self.elements = {}
+        self.line_count = 1
+        # Comment spans and top-level component declarations, as source offsets
+        self.comments = []
+        self.declarations = []
+        self.default_export = None
+
+def _record_element(scan, name, parent, declaration):
+    """Count an element and link it under its enclosing element and declaration"""
+    if not name or not name[0].isupper():
+        return
+    entry = scan.elements.setdefault(name, {'count': 0, 'children': []})
+    entry['count'] += 1
+    if parent and parent[0].isupper() and name not in scan.elements[parent]['children']:
+        scan.elements[parent]['children'].append(name)
+    if declaration is not None and name not in declaration['renders']:
+        declaration['renders'].append(name)
+
+def _scan(code):
+    """
+    Walk the source once, tracking JS, template literal and JSX contexts.
+
+    A stack of frames records the current context: 'js' (with the bracket
+    that closes it), 'template', 'jsx_tag' (inside an opening tag) and
+    'jsx_children'. Strings, comments, regex literals and template text are
+    consumed as whole tokens, so braces, quotes and tags inside them are
+    never mistaken for code. Every regex used is anchored at the current
+    position and consumes input, keeping the walk linear.
+    """
+    scan = JsxScan()
+    scan.line_count = code.count('\n') + 1
+    
+    # Frames: ['js', closer], ['template'], ['jsx_tag', name, parent, attr], ['jsx_children', name]
+    stack = [['js', None]]
+    components = {}
+    hooks = {}
+    prev = None          # (kind, value) of the previous significant JS token
+    prev_prev = None
+    import_pending = False
+    # Open top-level declaration: body is None until found, -1 just after =>
+    declaration = None
+    export_start = keyword_start = None
+    length = len(code)
+    pos = 0
+    
+    def jsx_parent():
+        for frame in reversed(stack):
+            if frame[0] == 'jsx_children':
+                return frame[1]
+        return None
+    
+    def close_declaration(end):
+        nonlocal declaration
+        if declaration is not None:
+            declaration['end'] = end
+            scan.declarations.append(declaration)
+            declaration = None
+    
+    def expression_allowed():
+        if prev is None:
+            return True
+        kind, value = prev
+        if kind == 'punct':
+            return value not in (')', ']', '}')
+        if kind == 'ident':
+            return value in EXPRESSION_KEYWORDS
+        return False
+    
+    while pos < length:
+        frame = stack[-1]
+        mode = frame[0]
+        
+        if mode == 'js':
+            char = code[pos]
+            
+            # An arrow function body starts at the first token after =>
+            if declaration is not None and declaration['body'] == -1 and len(stack) == 1 and not char.isspace():
+                declaration['body'] = pos
+            
+            if char == '<' and expression_allowed():
+                following = code[pos + 1:pos + 2]
+                if following == '>' or following.isalpha() or following in ('_', '$'):
+                    match = JSX_NAME.match(code, pos + 1)
+                    name = match.group() if match else ''
+                    stack.append(['jsx_tag', name, jsx_parent(), None])
+                    pos = match.end() if match else pos + 1
+                    continue
+            
+            if char == '/' and expression_allowed() and code[pos + 1:pos + 2] not in ('/', '*'):
+                match = REGEX_LITERAL.match(code, pos)
+                if match:
+                    prev_prev, prev = prev, ('regex', match.group())
+                    pos = match.end()
+                    continue
+            
+            match = JS_TOKEN.match(code, pos)
+            if match is None:
+                pos += 1
+                continue
+            kind = match.lastgroup
+            value = match.group()
+            pos = match.end()
+            
+            if kind == 'ws':
+                continue
+            if kind in ('line_comment', 'block_comment'):
+                scan.comments.append((match.start(), pos))
+                continue
+            
+            top_level = len(stack) == 1 and scan.paren_balance == 0
+            if kind == 'ident':
+                scan.identifiers.add(value)
+                if prev and prev[0] == 'ident' and prev[1] in DECLARATION_KEYWORDS and value[0].isupper():
+                    components.setdefault(value, None)
+                    if top_level:
+                        exported = prev_prev in (('ident', 'export'), ('ident', 'default'))
+                        start = export_start if exported and export_start is not None else keyword_start
+                        close_declaration(start)
+                        declaration = {'name': value, 'start': start, 'body': None, 'end': None, 'renders': []}
+                        if prev_prev == ('ident', 'default'):
+                            scan.default_export = value
+                elif top_level and prev == ('ident', 'default') and prev_prev == ('ident', 'export'):
+                    if value not in DECLARATION_KEYWORDS:
+                        scan.default_export = value
+                if top_level:
+                    if value == 'export':
+                        export_start = match.start()
+                    elif value in DECLARATION_KEYWORDS:
+                        keyword_start = match.start()
+                if HOOK_NAME.match(value) and code[pos:pos + 1] == '(':
+                    hooks.setdefault(value, None)
+                if value == 'props':
+                    scan.has_props = True
+                if value == 'import' and code[pos:pos + 1] not in ('(', '.'):
+                    import_pending = True
+            elif kind == 'string':
+                if import_pending and prev and prev[1] in ('from', 'import'):
+                    scan.imports.append(value[1:-1] if len(value) > 1 else '')
+                    import_pending = False
+            elif kind == 'punct':
+                if top_level and declaration is not None:
+                    if declaration['body'] is None and value in ('{', '=>'):
+                        declaration['body'] = match.start() if value == '{' else -1
+                    elif value == ';':
+                        close_declaration(match.start())
+                
+                if value == '{':
+                    scan.brace_balance += 1
+                    if prev and prev == ('punct', '('):
+                        scan.has_props = True
+                    stack.append(['js', '}'])
+                elif value == '}':
+                    scan.brace_balance -= 1
+                    if len(stack) > 1 and frame[1] == '}':
+                        stack.pop()
+                        # A block body closing back at the top level ends the declaration
+                        if (len(stack) == 1 and scan.paren_balance == 0 and declaration is not None
+                                and declaration['body'] not in (None, -1) and code[declaration['body']] == '{'):
+                            close_declaration(pos)
+                        # Leaving a template substitution or JSX expression container
+                        if stack[-1][0] != 'js':
+                            prev_prev, prev = prev, ('punct', '}')
+                            continue
+                elif value == '(':
+                    scan.paren_balance += 1
+                elif value == ')':
+                    scan.paren_balance -= 1
+                elif value == '`':
+                    stack.append(['template'])
+                elif value == ';':
+                    import_pending = False
+            
+            prev_prev, prev = prev, (kind, value)
+            
+        elif mode == 'template':
+            match = TEMPLATE_TEXT.match(code, pos)
+            pos = match.end()
+            if pos >= length:
+                break
+            if code[pos] == '`':
+                stack.pop()
+                prev_prev, prev = prev, ('template', '`')
+                pos += 1
+            else:
+                # ${ opens a substitution that ends at its matching }
+                scan.brace_balance += 1
+                stack.append(['js', '}'])
+                prev = None
+                pos += 2
+                
+        elif mode == 'jsx_tag':
+            match = JSX_WS.match(code, pos)
+            if match:
+                pos = match.end()
+                continue
+            char = code[pos]
+            
+            if char == '/' and code[pos + 1:pos + 2] == '>':
+                # Self-closing element
+                stack.pop()
+                _record_element(scan, frame[1], frame[2], declaration)
+                pos += 2
+                if stack[-1][0] == 'js':
+                    prev_prev, prev = prev, ('jsx', frame[1])
+            elif char == '>':
+                stack.pop()
+                _record_element(scan, frame[1], frame[2], declaration)
+                stack.append(['jsx_children', frame[1]])
+                pos += 1
+            elif char == '{':
+                scan.brace_balance += 1
+                if frame[3] == 'style' and code[pos + 1:pos + 2] == '{':
+                    scan.has_inline_style = True
+                stack.append(['js', '}'])
+                prev = None
+                pos += 1
+            elif char in ('"', "'"):
+                match = JSX_ATTR_STRING.match(code, pos)
+                if frame[3] in ('className', 'class'):
+                    scan.class_names.extend(match.group()[1:-1].split())
+                pos = match.end()
+            elif char == '=':
+                pos += 1
+            else:
+                match = JSX_NAME.match(code, pos)
+                if match:
+                    frame[3] = match.group()
+                    if frame[3] in ('className', 'class'):
+                        scan.has_class_name = True
+                    pos = match.end()
+                else:
+                    pos += 1
+                    
+        else:  # jsx_children
+            match = JSX_TEXT.match(code, pos)
+            if match:
+                pos = match.end()
+                continue
+            char = code[pos]
+            
+            if char == '{':
+                scan.brace_balance += 1
+                stack.append(['js', '}'])
+                prev = None
+                pos += 1
+            elif code[pos + 1:pos + 2] == '/':
+                match = JSX_NAME.match(code, pos + 2)
+                name = match.group() if match else ''
+                end = code.find('>', match.end() if match else pos + 2)
+                pos = length if end == -1 else end + 1
+                
+                if name == frame[1]:
+                    stack.pop()
+                else:
+                    # Recover by closing back to the matching open element, if any
+                    open_names = [f[1] for f in stack if f[0] == 'jsx_children']
+                    if name in open_names:
+                        while stack[-1][0] != 'jsx_children' or stack[-1][1] != name:
+                            popped = stack.pop()
+                            if popped[0] == 'jsx_children':
+                                scan.unclosed_tags.append(popped[1])
+                        stack.pop()
+                    else:
+                        scan.mismatched_tags.append(name)
+                
+                if stack[-1][0] == 'js':
+                    prev_prev, prev = prev, ('jsx', name)
+            else:
+                match = JSX_NAME.match(code, pos + 1)
+                name = match.group() if match else ''
+                stack.append(['jsx_tag', name, frame[1], None])
+                pos = match.end() if match else pos + 1
+    
+    close_declaration(length)
+    
+    # Anything still open at the end of the file was never closed
+    for frame in stack:
+        if frame[0] in ('jsx_children', 'jsx_tag') and frame[1]:
+            scan.unclosed_tags.append(frame[1])
+    
+    scan.components = list(components)
+    scan.hooks = list(hooks)
+    return scan
+
+@lru_cache(maxsize=16)
+def scan_react_source(code):
+    """
+    Single linear pass over React source; results are cached per source string.
+
+    Callers must treat the returned JsxScan as read-only.
+    """
+    return _scan(code)
\ No newline at end of file
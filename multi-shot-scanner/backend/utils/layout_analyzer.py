@@ -0,0 +1,291 @@
+# File: backend/utils/layout_analyzer.py
+import numpy as np
+from PIL import Image
+from io import BytesIO
+from utils.image_processor import decode_image_input, to_rgb
+
+def _box_filter_any(mask, radius, axis):
+    """True where any pixel within `radius` along `axis` is set (1-D dilation)"""
+    if radius <= 0:
+        return mask
+    counts = np.cumsum(mask, axis=axis, dtype=np.int32)
+    pad_shape = list(mask.shape)
+    pad_shape[axis] = 1
+    counts = np.concatenate([np.zeros(pad_shape, dtype=np.int32), counts], axis=axis)
+    
+    size = mask.shape[axis]
+    upper = np.minimum(np.arange(size) + radius + 1, size)
+    lower = np.maximum(np.arange(size) - radius, 0)
+    return (np.take(counts, upper, axis=axis) - np.take(counts, lower, axis=axis)) > 0
+
+def foreground_mask(pixels, threshold=8):
+    """
+    Mark pixels that differ from the background colour.
+
+    The background is the most common colour after bucketing to 5 bits
+    per channel. Returns (mask, background_rgb).
+    """
+    flat = pixels.reshape(-1, 3).astype(np.int32)
+    keys = (flat[:, 0] >> 3) << 10 | (flat[:, 1] >> 3) << 5 | (flat[:, 2] >> 3)
+    mode = np.bincount(keys, minlength=1 << 15).argmax()
+    background = flat[keys == mode].mean(axis=0)
+    
+    diff = np.abs(pixels.astype(np.int16) - background.astype(np.int16)).max(axis=2)
+    return diff > threshold, tuple(int(round(c)) for c in background)
+
+def _run_links(rows, starts, ends, width):
+    """
+    Pairs of runs in adjacent rows that touch, including diagonally.
+
+    Runs are ordered by row then column, so keying every run by
+    row * width + column keeps starts and ends sorted; for each run the
+    touching runs of the row above are a contiguous range found with
+    searchsorted. Returns (upper, lower) index arrays.
+    """
+    start_keys = rows * width + starts
+    end_keys = rows * width + ends
+    below = np.flatnonzero(rows > 0)
+    above_row = (rows[below] - 1) * width
+    # 8-connectivity: runs touching at a corner are joined too
+    lo = np.searchsorted(end_keys, above_row + starts[below], side='left')
+    hi = np.searchsorted(start_keys, above_row + ends[below], side='right')
+    counts = np.maximum(hi - lo, 0)
+    
+    lower = np.repeat(below, counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    upper = np.repeat(lo, counts) + offsets
+    return upper, lower
+
+def connected_components(mask):
+    """
+    Bounding boxes of 8-connected regions in a boolean mask.
+
+    Works on horizontal runs: runs are found per row with NumPy, labels
+    are propagated across touching runs of adjacent rows with
+    np.minimum.at (plus pointer jumping) until they settle, and box
+    extents are reduced per label. Returns an (N, 5) array of x0, y0,
+    x1, y1, area with exclusive x1/y1.
+    """
+    padded = np.pad(mask, ((0, 0), (1, 1))).astype(np.int8)
+    edges = np.diff(padded, axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    if len(rows) == 0:
+        return np.zeros((0, 5), dtype=np.int64)
+    
+    upper, lower = _run_links(rows, starts, ends, mask.shape[1] + 2)
+    labels = np.arange(len(rows))
+    while True:
+        # Every label names a run of the same region, so labels[labels] stays valid
+        updated = labels.copy()
+        np.minimum.at(updated, lower, labels[upper])
+        np.minimum.at(updated, upper, labels[lower])
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+    
+    unique, inverse = np.unique(labels, return_inverse=True)
+    count = len(unique)
+    
+    boxes = np.empty((count, 5), dtype=np.int64)
+    boxes[:, 0] = np.iinfo(np.int64).max
+    boxes[:, 1] = np.iinfo(np.int64).max
+    boxes[:, 2] = 0
+    boxes[:, 3] = 0
+    np.minimum.at(boxes[:, 0], inverse, starts)
+    np.minimum.at(boxes[:, 1], inverse, rows)
+    np.maximum.at(boxes[:, 2], inverse, ends)
+    np.maximum.at(boxes[:, 3], inverse, rows + 1)
+    boxes[:, 4] = np.bincount(inverse, weights=ends - starts, minlength=count).astype(np.int64)
+    return boxes
+
+def blank_runs(profile, min_length):
+    """Runs of empty rows/columns in an occupancy profile as (start, end) pairs"""
+    blank = np.concatenate([[False], profile == 0, [False]]).astype(np.int8)
+    edges = np.diff(blank)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    keep = (ends - starts) >= min_length
+    return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+def find_misalignments(boxes, tolerance=8, min_offset=2, min_support=2):
+    """
+    Edges that sit a few pixels off an alignment line shared by other elements.
+
+    For every element and edge (left, right, horizontal centre) the edges of
+    all other elements within `tolerance` pixels form a candidate line; if at
+    least `min_support` elements share it and this element is off by
+    `min_offset` or more, it is reported.
+    """
+    if len(boxes) < min_support + 1:
+        return []
+    
+    edges = {
+        'left': boxes[:, 0].astype(np.float64),
+        'right': boxes[:, 2].astype(np.float64),
+        'center': (boxes[:, 0] + boxes[:, 2]) / 2.0
+    }
+    
+    outliers = []
+    reported = set()
+    for edge, values in edges.items():
+        distance = np.abs(values[:, np.newaxis] - values[np.newaxis, :])
+        np.fill_diagonal(distance, np.inf)
+        near = distance <= tolerance
+        support = near.sum(axis=1)
+        
+        for index in np.flatnonzero(support >= min_support):
+            # A centre offset is implied by an edge offset already reported
+            if edge == 'center' and int(index) in reported:
+                continue
+            line = float(np.median(values[near[index]]))
+            offset = values[index] - line
+            if abs(offset) >= min_offset:
+                reported.add(int(index))
+                outliers.append({
+                    'element': int(index),
+                    'edge': edge,
+                    'offset': round(float(offset), 1),
+                    'alignedWith': round(line, 1),
+                    'support': int(support[index])
+                })
+    
+    return outliers
+
+def analyze_layout(image_data, short_side=1000, max_pixels=6_000_000, threshold=8,
+                   merge_radius=4, min_area=24, min_gutter=12, max_elements=60):
+    """
+    Measure layout structure directly from pixels, without a model call.
+
+    The screenshot is decoded with its short side capped at `short_side`
+    pixels (and its area at `max_pixels`), so tall stitched captures keep
+    a usable width. It is compared against its background colour, dilated
+    so glyphs merge into blocks, and split into connected components. Returns a compact, JSON-ready summary in source
+    pixel coordinates: element boxes, blank-row/column gutters, page
+    margins, vertical gaps between stacked elements and misaligned edges.
+    """
+    try:
+        img = Image.open(BytesIO(decode_image_input(image_data)))
+        source_width, source_height = img.size
+        
+        ratio = min(1.0, short_side / min(img.size),
+                    (max_pixels / (source_width * source_height)) ** 0.5)
+        target = (max(1, round(source_width * ratio)), max(1, round(source_height * ratio)))
+        img.draft('RGB', target)
+        img = to_rgb(img)
+        if img.size != target and ratio < 1.0:
+            img = img.resize(target, Image.Resampling.BILINEAR)
+        scale = source_width / img.width
+        
+        pixels = np.asarray(img)
+        mask, background = foreground_mask(pixels, threshold)
+        
+        grouped = _box_filter_any(_box_filter_any(mask, merge_radius, 1), merge_radius, 0)
+        boxes = connected_components(grouped)
+        boxes = boxes[(boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]) >= min_area]
+        
+        # Shrink each box back to the undilated content it contains
+        tight = []
+        for x0, y0, x1, y1, _ in boxes:
+            region = mask[y0:y1, x0:x1]
+            rows = np.flatnonzero(region.any(axis=1))
+            columns = np.flatnonzero(region.any(axis=0))
+            if len(rows) and len(columns):
+                tight.append((x0 + columns[0], y0 + rows[0], x0 + columns[-1] + 1, y0 + rows[-1] + 1))
+        boxes = np.array(tight, dtype=np.int64).reshape(-1, 4)
+        
+        # Reading order, then keep the largest elements
+        boxes = boxes[np.lexsort((boxes[:, 0], boxes[:, 1]))]
+        if len(boxes) > max_elements:
+            areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+            keep = np.sort(np.argsort(areas)[::-1][:max_elements])
+            boxes = boxes[keep]
+        source_boxes = np.rint(boxes * scale).astype(np.int64)
+        
+        row_profile = mask.sum(axis=1)
+        column_profile = mask.sum(axis=0)
+        gutter_length = max(1, int(round(min_gutter / scale)))
+        
+        def to_source(runs, limit):
+            return [
+                {'start': int(round(start * scale)), 'end': int(round(end * scale)),
+                 'size': int(round((end - start) * scale))}
+                for start, end in runs if start > 0 and end < limit
+            ]
+        
+        occupied_rows = np.flatnonzero(row_profile)
+        occupied_columns = np.flatnonzero(column_profile)
+        margins = {'top': 0, 'bottom': 0, 'left': 0, 'right': 0}
+        if len(occupied_rows) and len(occupied_columns):
+            margins = {
+                'top': int(round(occupied_rows[0] * scale)),
+                'bottom': int(round((mask.shape[0] - 1 - occupied_rows[-1]) * scale)),
+                'left': int(round(occupied_columns[0] * scale)),
+                'right': int(round((mask.shape[1] - 1 - occupied_columns[-1]) * scale))
+            }
+        
+        # Vertical gaps between elements that overlap horizontally
+        gaps = []
+        for i in range(len(source_boxes)):
+            below = source_boxes[
+                (source_boxes[:, 1] >= source_boxes[i, 3])
+                & (source_boxes[:, 0] < source_boxes[i, 2])
+                & (source_boxes[:, 2] > source_boxes[i, 0])
+            ]
+            if len(below):
+                gaps.append(int(below[:, 1].min() - source_boxes[i, 3]))
+        gap_values, gap_counts = np.unique(gaps, return_counts=True) if gaps else ([], [])
+        
+        return {
+            'size': [source_width, source_height],
+            'background': '#%02x%02x%02x' % background,
+            'coverage': round(float(mask.mean()) * 100, 2),
+            'elementCount': int(len(source_boxes)),
+            'elements': [
+                {'x': int(x0), 'y': int(y0), 'width': int(x1 - x0), 'height': int(y1 - y0)}
+                for x0, y0, x1, y1 in source_boxes
+            ],
+            'gutters': {
+                'rows': to_source(blank_runs(row_profile, gutter_length), mask.shape[0]),
+                'columns': to_source(blank_runs(column_profile, gutter_length), mask.shape[1])
+            },
+            'margins': margins,
+            'verticalGaps': [
+                {'size': int(value), 'count': int(count)}
+                for value, count in sorted(zip(gap_values, gap_counts), key=lambda g: -g[1])[:8]
+            ],
+            'misalignments': find_misalignments(source_boxes)
+        }
+        
+    except Exception as e:
+        raise Exception(f"Layout analysis failed: {str(e)}")
+
+def format_layout_summary(layout, max_items=12):
+    """
+    Render a layout summary as a few compact lines for a prompt
+    """
+    width, height = layout['size']
+    lines = [
+        f"- Screenshot: {width}x{height}px, background {layout['background']}, "
+        f"{layout['elementCount']} elements detected",
+        "- Margins (px): top {top}, right {right}, bottom {bottom}, left {left}".format(**layout['margins'])
+    ]
+    
+    if layout['gutters']['columns']:
+        columns = ', '.join(f"{g['start']}-{g['end']}" for g in layout['gutters']['columns'][:max_items])
+        lines.append(f"- Vertical gutters at x: {columns}")
+    
+    if layout['verticalGaps']:
+        gaps = ', '.join(f"{g['size']}px x{g['count']}" for g in layout['verticalGaps'])
+        lines.append(f"- Vertical gaps between stacked elements: {gaps}")
+    
+    for outlier in layout['misalignments'][:max_items]:
+        element = layout['elements'][outlier['element']]
+        lines.append(
+            f"- Element at ({element['x']}, {element['y']}) {element['width']}x{element['height']}: "
+            f"{outlier['edge']} edge off by {outlier['offset']}px from a line at "
+            f"{outlier['alignedWith']} shared by {outlier['support']} elements"
+        )
+    
+    return '\n'.join(lines)
\ No newline at end of file
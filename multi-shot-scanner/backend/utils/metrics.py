@@ -0,0 +1,191 @@
+# File: backend/utils/metrics.py
+import bisect
+import threading
+from collections import defaultdict
+from utils.sqlite_store import get_connection
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTE_BUCKETS = (16384, 65536, 262144, 524288, 1048576, 2097152, 4194304, 8388608, 16777216)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'mss_requests_total': ('counter', 'API requests by endpoint and status', None),
+    'mss_request_duration_seconds': ('histogram', 'API request latency by endpoint', DURATION_BUCKETS),
+    'mss_stage_duration_seconds': ('histogram', 'Time spent in each analysis stage', DURATION_BUCKETS),
+    'mss_model_tokens_total': ('counter', 'Model tokens by kind (input, output, cache_read, cache_write)', None),
+    'mss_image_bytes': ('histogram', 'Image sizes as uploaded and as sent to the model', BYTE_BUCKETS),
+    'mss_cache_lookups_total': ('counter', 'Result cache lookups by outcome', None),
+    'mss_coalesced_requests_total': ('counter', 'Analyses that shared an identical call in flight, by scope', None),
+    'mss_rate_limit_rejections_total': ('counter', 'Requests refused by the rate limiter, by bucket', None),
+    'mss_admission_rejections_total': ('counter', 'Uploads refused by admission control, by reason', None),
+    'mss_pixel_budget_capacity': ('gauge', 'Decoded pixels allowed in flight on this host', None),
+    'mss_pixel_budget_in_use': ('gauge', 'Decoded pixels currently in flight on this host', None),
+    'mss_pixel_budget_leases': ('gauge', 'Images currently holding part of the pixel budget', None)
+}
+
+def _label_string(labels):
+    """Canonical Prometheus label set, e.g. endpoint="analyze",status="200" """
+    return ','.join(
+        '%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in sorted(labels.items())
+    )
+
+def _number(value):
+    """Exposition format for a sample value, without float noise for whole numbers"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class MetricsBatch:
+    """
+    Metric updates collected while handling one request.
+
+    Nothing is written until MetricsStore.record(), so a request costs one
+    SQLite transaction however many stages it observes.
+    """
+    
+    def __init__(self):
+        self.deltas = defaultdict(float)
+    
+    def inc(self, name, amount=1, **labels):
+        if amount:
+            self.deltas[(name, _label_string(labels), '')] += amount
+    
+    def observe(self, name, value, **labels):
+        """Add one histogram observation (stored as a per-bucket count, cumulated on export)"""
+        buckets = METRICS[name][2]
+        index = bisect.bisect_left(buckets, value)
+        le = '+Inf' if index == len(buckets) else repr(buckets[index])
+        label_string = _label_string(labels)
+        self.deltas[(name + '_bucket', label_string, le)] += 1
+        self.deltas[(name + '_sum', label_string, '')] += value
+        self.deltas[(name + '_count', label_string, '')] += 1
+    
+    def observe_timings(self, timings, **labels):
+        """Observe a StageTimer dict (milliseconds) as per-stage durations"""
+        for stage, elapsed in timings.items():
+            self.observe('mss_stage_duration_seconds', elapsed / 1000, stage=stage, **labels)
+    
+    def observe_usage(self, usage):
+        """Count model tokens from a usage_report dict"""
+        for kind, key in (('input', 'inputTokens'), ('output', 'outputTokens'),
+                          ('cache_read', 'cacheReadTokens'), ('cache_write', 'cacheWriteTokens')):
+            self.inc('mss_model_tokens_total', usage.get(key) or 0, kind=kind)
+    
+    def observe_analysis(self, timings, result=None, cache_info=None):
+        """Stage timings, cache and coalescing outcome and, for fresh results, model tokens of one analysis"""
+        self.observe_timings(timings or {})
+        cache_info = cache_info or {}
+        if cache_info:
+            self.inc('mss_cache_lookups_total', status=cache_info['status'], tier=cache_info.get('tier', 'none'))
+        if 'coalesced' in cache_info:
+            self.inc('mss_coalesced_requests_total', scope=cache_info['coalesced'])
+        # A cached or shared result's tokens were counted when it was computed
+        elif result and cache_info.get('status') != 'hit':
+            self.observe_usage(result.get('promptTokens') or {})
+
+class MetricsStore:
+    """
+    Prometheus counters and histograms shared by every worker on the host.
+
+    Values are running totals in a SQLite table that each worker adds to,
+    so a scrape answered by any worker sees the whole host. Histogram
+    buckets are stored individually and made cumulative on export.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        get_connection(self.path).execute("""
+            CREATE TABLE IF NOT EXISTS metrics (
+                name TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                le TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (name, labels, le)
+            )
+        """)
+    
+    def record(self, batch):
+        """Add a batch's deltas to the shared totals in one transaction"""
+        if not batch.deltas:
+            return
+        conn = get_connection(self.path)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT INTO metrics (name, labels, le, value) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value',
+                [(name, labels, le, value) for (name, labels, le), value in batch.deltas.items()]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+    
+    def render(self, gauges=None):
+        """
+        All metrics in the Prometheus text exposition format.
+        
+        Gauges are not stored; their current values are passed in by name.
+        """
+        gauges = gauges or {}
+        rows = defaultdict(list)
+        for name, labels, le, value in get_connection(self.path).execute(
+            'SELECT name, labels, le, value FROM metrics ORDER BY name, labels'
+        ):
+            rows[name].append((labels, le, value))
+        
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            if kind == 'gauge' and name not in gauges:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            
+            if kind == 'gauge':
+                lines.append(f'{name} {_number(gauges[name])}')
+                continue
+            
+            if kind == 'counter':
+                for labels, _, value in rows[name]:
+                    lines.append(f'{name}{{{labels}}} {_number(value)}' if labels else f'{name} {_number(value)}')
+                continue
+            
+            counts = defaultdict(dict)
+            for labels, le, value in rows[name + '_bucket']:
+                counts[labels][le] = value
+            sums = {labels: value for labels, _, value in rows[name + '_sum']}
+            totals = {labels: value for labels, _, value in rows[name + '_count']}
+            
+            for labels in sorted(counts):
+                prefix = labels + ',' if labels else ''
+                cumulative = 0
+                for bound in [repr(b) for b in buckets] + ['+Inf']:
+                    cumulative += counts[labels].get(bound, 0)
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {_number(cumulative)}')
+                suffix = f'{{{labels}}}' if labels else ''
+                lines.append(f'{name}_sum{suffix} {_number(sums.get(labels, 0))}')
+                lines.append(f'{name}_count{suffix} {_number(totals.get(labels, 0))}')
+        
+        return '\n'.join(lines) + '\n'
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_metrics():
+    """Get or create the process-wide metrics store, or None when disabled"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            from config.settings import Config
+            if not Config.METRICS_ENABLED:
+                return None
+            _store = MetricsStore(Config.METRICS_DB_PATH)
+    return _store
+
+def record_metrics(batch):
+    """Record a batch if metrics are enabled; metrics must never fail a request"""
+    try:
+        store = get_metrics()
+        if store is not None:
+            store.record(batch)
+    except Exception:
+        pass
\ No newline at end of file
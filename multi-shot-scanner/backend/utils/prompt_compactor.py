@@ -0,0 +1,164 @@
+# File: backend/utils/prompt_compactor.py
+import math
+import re
+from utils.jsx_lexer import scan_react_source
+
+# Rough characters per token for source code; close enough to budget with
+CHARS_PER_TOKEN = 3.5
+
+BLANK_LINES = re.compile(r'\n(?:[ \t]*\n)+')
+TRAILING_SPACE = re.compile(r'[ \t]+\n')
+
+def estimate_tokens(text):
+    """Estimate the model token count of a piece of text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def collapsed_marker(name):
+    """Placeholder left in place of a collapsed component body"""
+    return f"{{ /* collapsed: {name} (unchanged) */ }}"
+
+def truncation_marker(omitted):
+    """Line left in place of the code cut off at the budget"""
+    return f"// ... {omitted} more lines truncated to fit the prompt budget"
+
+def _render(code, edits):
+    """Apply non-overlapping (start, end, replacement) edits, then drop dead whitespace"""
+    pieces = []
+    cursor = 0
+    for start, end, replacement in sorted(edits):
+        if start < cursor:
+            continue
+        pieces.append(code[cursor:start])
+        pieces.append(replacement)
+        cursor = end
+    pieces.append(code[cursor:])
+    
+    text = TRAILING_SPACE.sub('\n', ''.join(pieces))
+    return BLANK_LINES.sub('\n\n', text).strip('\n')
+
+def _visible_components(scan, focus):
+    """
+    Components reachable from the rendered root, with their depth.
+    
+    The roots are the `focus` names when given, else the default export,
+    else every component no other component renders.
+    """
+    declared = {d['name']: d for d in scan.declarations}
+    roots = [name for name in (focus or []) if name in declared]
+    if not roots and scan.default_export in declared:
+        roots = [scan.default_export]
+    if not roots:
+        rendered = {child for d in scan.declarations for child in d['renders']}
+        roots = [name for name in declared if name not in rendered] or list(declared)[-1:]
+    
+    depth = {name: 0 for name in roots}
+    queue = list(roots)
+    while queue:
+        name = queue.pop(0)
+        for child in declared[name]['renders']:
+            if child in declared and child not in depth:
+                depth[child] = depth[name] + 1
+                queue.append(child)
+    return depth
+
+def compact_react_code(code, token_budget, focus=None):
+    """
+    Shrink React source to fit a token budget for the analysis prompt.
+    
+    Code that fits the budget (or any code when the budget is 0) is left
+    as it is. Otherwise comments and dead whitespace are removed first;
+    if that is not enough, component bodies are replaced by a marker, starting with
+    components the rendered tree never reaches, then the deepest visible
+    ones; the root is never collapsed. As a last resort the text is cut
+    at the budget. Returns a dict with the compacted code, token counts
+    and the original bodies and cut-off tail needed by expand_collapsed().
+    """
+    result = {
+        'code': code,
+        'originalTokens': estimate_tokens(code),
+        'compactedTokens': estimate_tokens(code),
+        'budget': token_budget,
+        'collapsed': [],
+        'truncated': False,
+        'commentsStripped': False,
+        'bodies': {},
+        'tail': None
+    }
+    if not token_budget or result['originalTokens'] <= token_budget:
+        return result
+    
+    scan = scan_react_source(code)
+    comment_edits = [(start, end, '') for start, end in scan.comments]
+    compacted = _render(code, comment_edits)
+    result['code'] = compacted
+    result['compactedTokens'] = estimate_tokens(compacted)
+    result['commentsStripped'] = bool(scan.comments)
+    if result['compactedTokens'] <= token_budget:
+        return result
+    
+    depth = _visible_components(scan, focus)
+    candidates = []
+    for declaration in scan.declarations:
+        body, end = declaration['body'], declaration['end']
+        if body in (None, -1) or depth.get(declaration['name']) == 0:
+            continue
+        inner = sum(e - s for s, e in scan.comments if body <= s and e <= end)
+        saving = (end - body) - inner - len(collapsed_marker(declaration['name']))
+        if saving > 0:
+            # Unreached components first, then the deepest visible, largest first
+            rank = (declaration['name'] in depth, -depth.get(declaration['name'], 0), -saving)
+            candidates.append((rank, declaration, saving))
+    candidates.sort(key=lambda c: c[0])
+    
+    edits = list(comment_edits)
+    length = len(compacted)
+    for _, declaration, saving in candidates:
+        if math.ceil(length / CHARS_PER_TOKEN) <= token_budget:
+            break
+        name, body, end = declaration['name'], declaration['body'], declaration['end']
+        edits = [e for e in edits if not (body <= e[0] and e[1] <= end)]
+        edits.append((body, end, collapsed_marker(name)))
+        result['collapsed'].append(name)
+        result['bodies'][name] = code[body:end]
+        length -= saving
+    
+    compacted = _render(code, edits)
+    max_chars = int(token_budget * CHARS_PER_TOKEN)
+    if len(compacted) > max_chars:
+        # Leave room for the truncation note itself
+        limit = max(max_chars - 80, 0)
+        cut = compacted.rfind('\n', 0, limit)
+        cut = cut if cut > 0 else limit
+        omitted = compacted.count('\n', cut) + 1
+        result['tail'] = (truncation_marker(omitted), compacted[cut:].lstrip('\n'))
+        compacted = compacted[:cut] + '\n' + result['tail'][0]
+        result['truncated'] = True
+    
+    result['code'] = compacted
+    result['compactedTokens'] = estimate_tokens(compacted)
+    return result
+
+def expand_collapsed(code, compaction):
+    """Put the truncated tail and collapsed component bodies back into code returned by the model"""
+    if compaction.get('tail'):
+        marker, tail = compaction['tail']
+        code = code.replace(marker, tail)
+    for name, body in compaction.get('bodies', {}).items():
+        code = code.replace(collapsed_marker(name), body)
+    return code
+
+def is_patchable(code, compaction):
+    """
+    Whether code the model returned, once expanded, is an edit of the whole
+    submitted code, so a line diff against the submitted code only carries
+    the model's changes. Not when comments were stripped from the prompt
+    (the model never saw them), nor when the code was truncated and the
+    model dropped the truncation marker, so the tail cannot be put back.
+    """
+    if compaction.get('commentsStripped'):
+        return False
+    return not compaction.get('tail') or compaction['tail'][0] in code
+
+def compaction_report(compaction):
+    """The JSON-ready part of a compaction result, without the code itself"""
+    return {key: compaction[key] for key in ('originalTokens', 'compactedTokens', 'budget', 'collapsed', 'truncated')}
\ No newline at end of file
@@ -0,0 +1,105 @@
+# File: backend/utils/rate_limiter.py
+import math
+import threading
+import time
+from utils.sqlite_store import get_connection
+
+class TokenBucketLimiter:
+    """
+    Token buckets shared by all gunicorn workers through a SQLite WAL file.
+    
+    Each (bucket, client) pair is one row holding its token count and the
+    time it was last updated; a check refills the row for the elapsed time
+    and takes tokens in a single short transaction, so the cost does not
+    depend on how many clients are tracked. Idle rows are removed through
+    the `updated` index now and then, never by scanning the table.
+    """
+    
+    # Remove idle rows once every this many checks
+    PRUNE_EVERY = 1000
+    
+    def __init__(self, path, buckets):
+        """buckets maps a bucket name to (capacity, period_seconds)"""
+        self.path = path
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._checks = 0
+        
+        conn = get_connection(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS rate_buckets_updated ON rate_buckets (updated)')
+    
+    def take(self, bucket, client, cost=1):
+        """
+        Try to take `cost` tokens from a client's bucket.
+        
+        Returns a dict with 'allowed', 'limit', 'remaining', 'reset' (seconds
+        until the bucket is full again), 'retryAfter' (seconds until the
+        request would be allowed; 0 when allowed) and 'tooLarge', set when
+        `cost` exceeds the bucket's capacity so no wait would ever help
+        (retryAfter is then None).
+        """
+        capacity, period = self.buckets[bucket]
+        rate = capacity / period
+        key = f"{bucket}:{client}"
+        now = time.time()
+        
+        conn = get_connection(self.path)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+            allowed = cost <= capacity and tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        
+        with self._lock:
+            self._checks += 1
+            prune = self._checks % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+        
+        return {
+            'allowed': allowed,
+            'limit': capacity,
+            'remaining': int(tokens),
+            'reset': math.ceil((capacity - tokens) / rate),
+            'retryAfter': None if cost > capacity else 0 if allowed else math.ceil((cost - tokens) / rate),
+            'tooLarge': cost > capacity
+        }
+    
+    def prune(self):
+        """Delete rows idle long enough to have refilled completely; a missing row means a full bucket"""
+        longest = max(period for _, period in self.buckets.values())
+        get_connection(self.path).execute(
+            'DELETE FROM rate_buckets WHERE updated < ?', (time.time() - longest,)
+        )
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """Get or create the process-wide rate limiter"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            from config.settings import Config
+            _limiter = TokenBucketLimiter(Config.RATE_LIMIT_DB_PATH, {
+                'analyze': (Config.RATE_LIMIT, 3600),
+                'process': (Config.RATE_LIMIT_PROCESS, 3600)
+            })
+    return _limiter
\ No newline at end of file
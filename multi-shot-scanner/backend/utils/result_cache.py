@@ -0,0 +1,215 @@
+# File: backend/utils/result_cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from utils.image_processor import hamming_distances
+from utils.sqlite_store import get_connection
+
+# Near-duplicate entries live next to the results they point at
+PHASH_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS phash_index (
+        context TEXT NOT NULL,
+        phash TEXT NOT NULL,
+        result_key TEXT NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (context, result_key)
+    )
+"""
+
+def cache_key(image_bytes, react_code, analysis_type, model, prompt_version):
+    """
+    Content-addressed key for an analysis request
+    """
+    digest = hashlib.sha256()
+    for part in (image_bytes, react_code, analysis_type, model, prompt_version):
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        # Length-prefix each part so boundaries cannot be shifted between fields
+        digest.update(len(part).to_bytes(8, 'big'))
+        digest.update(part)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Two-tier cache for AI analysis results.
+
+    A per-process LRU sits in front of a SQLite file that every gunicorn
+    worker on the host opens, so a result computed by one worker is served
+    by all of them. Entries expire after `ttl` seconds and the disk tier is
+    trimmed to `max_bytes` by least-recent access.
+    """
+    
+    # Trim the disk tier once every this many writes rather than on every put
+    EVICT_EVERY = 50
+    
+    def __init__(self, path, ttl=7 * 24 * 3600, max_bytes=256 * 1024 * 1024, memory_entries=128):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._init_db()
+    
+    def _init_db(self):
+        conn = get_connection(self.path)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        conn.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+        conn.execute(PHASH_SCHEMA)
+    
+    def get(self, key):
+        """Return (value, tier) for a live entry, or (None, None) on a miss"""
+        now = time.time()
+        
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    return value, 'memory'
+                del self._memory[key]
+                
+        conn = get_connection(self.path)
+        row = conn.execute(
+            'SELECT value, created FROM results WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None, None
+            
+        payload, created = row
+        if now - created > self.ttl:
+            conn.execute('DELETE FROM results WHERE key = ?', (key,))
+            return None, None
+            
+        conn.execute('UPDATE results SET accessed = ? WHERE key = ?', (now, key))
+        value = json.loads(payload)
+        self._remember(key, value, created)
+        return value, 'disk'
+    
+    def put(self, key, value):
+        """Store a JSON-serializable value in both tiers"""
+        now = time.time()
+        payload = json.dumps(value)
+        
+        conn = get_connection(self.path)
+        conn.execute(
+            'INSERT OR REPLACE INTO results (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)',
+            (key, payload, len(payload), now, now)
+        )
+        self._remember(key, value, now)
+        
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.EVICT_EVERY == 0
+        if due:
+            self.evict()
+    
+    def _remember(self, key, value, created):
+        with self._lock:
+            self._memory[key] = (value, created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+    
+    def evict(self):
+        """Drop expired entries, then the least recently used until under max_bytes"""
+        conn = get_connection(self.path)
+        conn.execute('DELETE FROM results WHERE created < ?', (time.time() - self.ttl,))
+        conn.execute('DELETE FROM phash_index WHERE result_key NOT IN (SELECT key FROM results)')
+        
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM results').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+            
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for key, size in conn.execute('SELECT key, size FROM results ORDER BY accessed'):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM results WHERE key = ?', stale)
+        
+        with self._lock:
+            for (key,) in stale:
+                self._memory.pop(key, None)
+
+class NearDuplicateIndex:
+    """
+    Index of perceptual image hashes for finding near-identical resubmissions.
+    
+    Entries are grouped by a context hash covering everything except the
+    image (code, analysis type, model, prompt version); a lookup compares
+    the most recent `scan_limit` hashes for that context in one NumPy pass.
+    """
+    
+    def __init__(self, path, max_distance=6, scan_limit=512):
+        self.path = path
+        self.max_distance = max_distance
+        self.scan_limit = scan_limit
+        get_connection(self.path).execute(PHASH_SCHEMA)
+    
+    def find(self, context, phash):
+        """Return (result_key, distance) of the closest match within range, or (None, None)"""
+        rows = get_connection(self.path).execute(
+            'SELECT phash, result_key FROM phash_index WHERE context = ? ORDER BY created DESC LIMIT ?',
+            (context, self.scan_limit)
+        ).fetchall()
+        if not rows:
+            return None, None
+        
+        distances = hamming_distances(phash, [int(row[0], 16) for row in rows])
+        best = int(distances.argmin())
+        if distances[best] > self.max_distance:
+            return None, None
+        return rows[best][1], int(distances[best])
+    
+    def add(self, context, phash, result_key):
+        get_connection(self.path).execute(
+            'INSERT OR REPLACE INTO phash_index (context, phash, result_key, created) VALUES (?, ?, ?, ?)',
+            (context, '%016x' % phash, result_key, time.time())
+        )
+
+_cache = None
+_near_index = None
+
+def get_result_cache():
+    """Get or create the process-wide result cache, or None when disabled"""
+    global _cache
+    if _cache is None:
+        from config.settings import Config
+        if not Config.CACHE_ENABLED:
+            return None
+        _cache = ResultCache(
+            Config.CACHE_DB_PATH,
+            ttl=Config.CACHE_TTL,
+            max_bytes=Config.CACHE_MAX_BYTES,
+            memory_entries=Config.CACHE_MEMORY_ENTRIES
+        )
+    return _cache
+
+def get_near_duplicate_index():
+    """Get or create the process-wide perceptual hash index, or None when disabled"""
+    global _near_index
+    if _near_index is None:
+        from config.settings import Config
+        if not (Config.CACHE_ENABLED and Config.PHASH_ENABLED):
+            return None
+        _near_index = NearDuplicateIndex(
+            Config.CACHE_DB_PATH,
+            max_distance=Config.PHASH_MAX_DISTANCE
+        )
+    return _near_index
\ No newline at end of file
@@ -0,0 +1,248 @@
+# File: backend/utils/single_flight.py
+import asyncio
+import json
+import os
+import threading
+import time
+from utils.sqlite_store import get_connection, process_alive
+
+class _Call:
+    """One in-process flight; followers wait on `done`"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesce identical calls that are in flight at the same time on a host.
+    
+    The first caller for a key runs the call; callers that arrive while it
+    runs wait for it and share its outcome. Within a process they wait on
+    an event (or a future on the event loop). Across gunicorn workers the
+    running call is claimed in a SQLite table, and workers that find a
+    claim poll until its result is written there. Claims of dead workers
+    are taken over, and a follower that has waited `wait` seconds makes
+    the call itself. Results must be JSON-serializable; a failed call is
+    shared with waiters in the same process only, other workers retry.
+    """
+    
+    POLL_INTERVAL = 0.05
+    # Seconds a finished result stays readable for workers still polling
+    LINGER = 10.0
+    
+    def __init__(self, path, wait=300.0):
+        self.path = path
+        self.wait = wait
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self._counts = {'leader': 0, 'local': 0, 'remote': 0}
+        
+        get_connection(self.path).execute("""
+            CREATE TABLE IF NOT EXISTS flights (
+                key TEXT PRIMARY KEY,
+                pid INTEGER NOT NULL,
+                started REAL NOT NULL,
+                finished REAL,
+                result TEXT
+            )
+        """)
+    
+    def _count(self, role):
+        with self._lock:
+            self._counts[role] += 1
+    
+    def _claim(self, key):
+        """
+        Claim `key` for this worker, or report who has it.
+        
+        Returns ('claimed', None), ('running', None) while another live
+        worker runs it, or ('finished', result) for a result written
+        within the last LINGER seconds. A broken store never blocks the
+        call: it counts as claimed.
+        """
+        now = time.time()
+        try:
+            conn = get_connection(self.path)
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM flights WHERE finished < ?', (now - self.LINGER,))
+                row = conn.execute(
+                    'SELECT pid, started, finished, result FROM flights WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    pid, started, finished, result = row
+                    if finished is None and started > now - self.wait and process_alive(pid):
+                        conn.execute('COMMIT')
+                        return 'running', None
+                    if finished is not None and result is not None:
+                        conn.execute('COMMIT')
+                        return 'finished', json.loads(result)
+                conn.execute(
+                    'INSERT OR REPLACE INTO flights (key, pid, started, finished, result) VALUES (?, ?, ?, NULL, NULL)',
+                    (key, os.getpid(), now)
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except Exception:
+            pass
+        return 'claimed', None
+    
+    def _finish(self, key, result=None, failed=False):
+        """Publish the outcome of a claimed call; a failure just drops the claim"""
+        try:
+            conn = get_connection(self.path)
+            if failed:
+                conn.execute('DELETE FROM flights WHERE key = ? AND pid = ?', (key, os.getpid()))
+            else:
+                conn.execute(
+                    'UPDATE flights SET finished = ?, result = ? WHERE key = ? AND pid = ?',
+                    (time.time(), json.dumps(result), key, os.getpid())
+                )
+        except Exception:
+            pass
+    
+    def _run_host(self, key, fn):
+        """Run fn once across the host's workers; returns (result, role)"""
+        deadline = time.monotonic() + self.wait
+        while True:
+            state, result = self._claim(key)
+            if state == 'finished':
+                return result, 'remote'
+            if state == 'claimed' or time.monotonic() >= deadline:
+                break
+            time.sleep(self.POLL_INTERVAL)
+        
+        try:
+            result = fn()
+        except BaseException:
+            self._finish(key, failed=True)
+            raise
+        self._finish(key, result)
+        return result, 'leader'
+    
+    def do(self, key, fn):
+        """
+        Call fn(), or share the result of an identical call already in flight.
+        
+        Returns (result, role): role is 'leader' when this caller ran fn,
+        'local' when it shared a call in this process and 'remote' when it
+        shared one in another worker.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        
+        if not leader:
+            if call.done.wait(self.wait):
+                self._count('local')
+                if call.error is not None:
+                    raise call.error
+                return call.result, 'local'
+            # The first caller is stuck; stop waiting for it
+            result, role = self._run_host(key, fn)
+            self._count(role)
+            return result, role
+        
+        try:
+            result, role = self._run_host(key, fn)
+            call.result = result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        self._count(role)
+        return result, role
+    
+    async def _run_host_async(self, key, fn):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait
+        while True:
+            state, result = await loop.run_in_executor(None, self._claim, key)
+            if state == 'finished':
+                return result, 'remote'
+            if state == 'claimed' or loop.time() >= deadline:
+                break
+            await asyncio.sleep(self.POLL_INTERVAL)
+        
+        try:
+            result = await fn()
+        except BaseException:
+            # Also on cancellation, so other workers do not wait out a claim nobody holds
+            self._finish(key, failed=True)
+            raise
+        await loop.run_in_executor(None, self._finish, key, result)
+        return result, 'leader'
+    
+    async def do_async(self, key, fn):
+        """
+        do() for the event loop: fn is a coroutine function, and followers
+        in this process await the first caller's future without a thread
+        """
+        future = self._async_calls.get(key)
+        if future is not None:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), self.wait)
+                self._count('local')
+                return result, 'local'
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # Only the first caller's cancellation is ours to recover from
+                if not future.cancelled():
+                    raise
+            result, role = await self._run_host_async(key, fn)
+            self._count(role)
+            return result, role
+        
+        future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result, role = await self._run_host_async(key, fn)
+            future.set_result(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Followers receive the exception; nobody may be waiting to retrieve it
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[key]
+        self._count(role)
+        return result, role
+    
+    def stats(self):
+        """Calls run and calls coalesced by this process"""
+        with self._lock:
+            counts = dict(self._counts)
+        counts['coalesced'] = counts['local'] + counts['remote']
+        return counts
+
+_flight = None
+_flight_lock = threading.Lock()
+
+def get_single_flight():
+    """Get or create the process-wide single-flight group, or None when disabled"""
+    global _flight
+    with _flight_lock:
+        if _flight is None:
+            from config.settings import Config
+            if not Config.SINGLE_FLIGHT_ENABLED:
+                return None
+            _flight = SingleFlight(Config.SINGLE_FLIGHT_DB_PATH, wait=Config.SINGLE_FLIGHT_WAIT)
+    return _flight
+
+def single_flight_stats():
+    """This process's single-flight counters for the health endpoint, or None when disabled"""
+    flight = get_single_flight()
+    return flight.stats() if flight is not None else None
\ No newline at end of file
@@ -0,0 +1,40 @@
+# File: backend/utils/sqlite_store.py
+import os
+import sqlite3
+import threading
+
+# One connection per (thread, path); SQLite connections must not be shared across threads
+_local = threading.local()
+
+def get_connection(path):
+    """
+    Get a thread-local SQLite connection in WAL mode.
+    
+    The database file is the state shared by all gunicorn workers on a host;
+    WAL lets readers proceed while one writer commits.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+        
+    conn = connections.get(path)
+    if conn is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        connections[path] = conn
+        
+    return conn
+
+def process_alive(pid):
+    """Whether a worker that wrote a row is still running, for reclaiming what dead workers left behind"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
\ No newline at end of file
@@ -0,0 +1,151 @@
+# File: backend/utils/static_assets.py
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from werkzeug.http import parse_etags
+from utils.compression import COMPRESSIBLE_TYPES, brotli, negotiate_encoding
+
+# Asset references in HTML that get rewritten to fingerprinted names
+ASSET_REFERENCE = re.compile(r'(\b(?:src|href)=")(/?)(static/[^"?#]+)(")')
+
+class StaticAssets:
+    """
+    In-memory frontend assets, compressed and fingerprinted once at startup.
+
+    Every file under `asset_dir` gets a content-hash name (app.js becomes
+    app.<hash>.js) that is served with a year-long immutable Cache-Control,
+    and references to it in `entry` are rewritten to that name. The entry
+    page and the original names are served with `no-cache`, so browsers
+    revalidate and get a 304. Gzip and brotli variants are built up front
+    and picked per request from Accept-Encoding, each with its own strong
+    ETag.
+    """
+    
+    def __init__(self, root, entry='index.html', asset_dir='static', max_age=31536000,
+                 compress_min_bytes=512, watch=False):
+        self.root = os.path.abspath(root)
+        self.entry = entry
+        self.asset_dir = asset_dir
+        self.max_age = max_age
+        self.compress_min_bytes = compress_min_bytes
+        self.watch = watch
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _sources(self):
+        """Relative paths of every file served, entry page last"""
+        paths = []
+        for directory, _, files in os.walk(os.path.join(self.root, self.asset_dir)):
+            for name in files:
+                if not name.startswith('.'):
+                    paths.append(os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/'))
+        paths.sort()
+        paths.append(self.entry)
+        return paths
+    
+    def _build(self, path, data):
+        media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        
+        variants = {'identity': data}
+        if media_type.startswith(COMPRESSIBLE_TYPES) and len(data) >= self.compress_min_bytes:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    variants['br'] = compressed
+        
+        if media_type.startswith('text/') or media_type == 'application/javascript':
+            media_type += '; charset=utf-8'
+        
+        return {'path': path, 'mediaType': media_type, 'digest': digest, 'variants': variants}
+    
+    def _load(self):
+        assets = {}
+        fingerprinted = {}
+        mtimes = {}
+        
+        for path in self._sources():
+            source = os.path.join(self.root, path)
+            with open(source, 'rb') as f:
+                data = f.read()
+            mtimes[source] = os.stat(source).st_mtime_ns
+            
+            if path == self.entry:
+                def rewrite(match):
+                    name = match.group(3)
+                    target = fingerprinted.get(name, name)
+                    return match.group(1) + match.group(2) + target + match.group(4)
+                data = ASSET_REFERENCE.sub(rewrite, data.decode('utf-8')).encode('utf-8')
+            
+            asset = self._build(path, data)
+            assets[path] = asset
+            if path != self.entry:
+                stem, extension = os.path.splitext(path)
+                fingerprinted[path] = f"{stem}.{asset['digest'][:10]}{extension}"
+        
+        self._assets = assets
+        self._immutable = {name: assets[path] for path, name in fingerprinted.items()}
+        self._fingerprinted = fingerprinted
+        self._mtimes = mtimes
+    
+    def _reload_if_changed(self):
+        """Rebuild everything if a source file changed (development only)"""
+        try:
+            changed = any(os.stat(path).st_mtime_ns != mtime for path, mtime in self._mtimes.items())
+            changed = changed or len(self._sources()) != len(self._mtimes)
+        except OSError:
+            changed = True
+        if changed:
+            with self._lock:
+                self._load()
+    
+    def url_for(self, path):
+        """Fingerprinted name for an asset path, or the path itself if unknown"""
+        return self._fingerprinted.get(path, path)
+    
+    def serve(self, path, accept_encoding=None, if_none_match=None):
+        """
+        Return (status, headers, body) for an asset path, or None if unknown.
+
+        `path` may be an original or a fingerprinted name; the caller passes
+        the raw Accept-Encoding and If-None-Match request headers.
+        """
+        if self.watch:
+            self._reload_if_changed()
+        
+        asset = self._immutable.get(path)
+        immutable = asset is not None
+        if asset is None:
+            asset = self._assets.get(path)
+            if asset is None:
+                return None
+        
+        variants = asset['variants']
+        encoding = negotiate_encoding(accept_encoding, [name for name in ('br', 'gzip') if name in variants])
+        
+        # Each encoding is a different byte sequence, so it gets its own strong ETag
+        suffix = {'identity': '', 'gzip': '-gz', 'br': '-br'}[encoding]
+        etag = f'"{asset["digest"]}{suffix}"'
+        
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'public, max-age={self.max_age}, immutable' if immutable else 'no-cache'
+        }
+        if len(variants) > 1:
+            headers['Vary'] = 'Accept-Encoding'
+        
+        if if_none_match and parse_etags(if_none_match).contains_weak(etag.strip('"')):
+            return 304, headers, b''
+        
+        body = variants[encoding]
+        headers['Content-Type'] = asset['mediaType']
+        headers['Content-Length'] = str(len(body))
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return 200, headers, body
\ No newline at end of file
@@ -0,0 +1,30 @@
+# File: backend/utils/timing.py
+import time
+from contextlib import contextmanager
+
+class StageTimer:
+    """
+    Accumulate wall-clock time per named stage, in milliseconds.
+    
+    Pass an existing dict to collect several components' stages into one
+    place; repeated stages add up.
+    """
+    
+    def __init__(self, timings=None):
+        self.timings = timings if timings is not None else {}
+    
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.timings[name] = round(self.timings.get(name, 0.0) + elapsed, 2)
+
+def server_timing_header(timings, total=None):
+    """Format stage timings (ms) as a Server-Timing header value"""
+    entries = [f'{name};dur={elapsed}' for name, elapsed in timings.items()]
+    if total is not None:
+        entries.append(f'total;dur={round(total, 2)}')
+    return ', '.join(entries)
\ No newline at end of file
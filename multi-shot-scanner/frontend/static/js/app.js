@@ -6,6 +6,9 @@ class MultiShotScanner {
         this.currentStream = null;
         this.currentCropIndex = -1;
         this.cropData = {};
+        // Shots are uploaded to a server session as they are captured, so analyze only waits on the model
+        this.session = null;
+        this.nextShotId = 0;
         this.initializeElements();
         this.attachEventListeners();
     }
@@ -109,11 +112,14 @@ class MultiShotScanner {
         ctx.drawImage(this.video, 0, 0);
         
         const imageData = canvas.toDataURL('image/jpeg', 0.9);
-        this.capturedImages.push({
+        const shot = {
             original: imageData,
             cropped: null,
-            cropSettings: null
-        });
+            cropSettings: null,
+            shotId: this.nextShotId++
+        };
+        this.capturedImages.push(shot);
+        this.uploadShot(shot);
         
         this.updateImageDisplay();
         
@@ -425,8 +431,10 @@ class MultiShotScanner {
                 0, 0, cropSettings.width, cropSettings.height
             );
             
-            this.capturedImages[this.currentCropIndex].cropped = cropCanvas.toDataURL('image/jpeg', 0.9);
-            this.capturedImages[this.currentCropIndex].cropSettings = cropSettings;
+            const shot = this.capturedImages[this.currentCropIndex];
+            shot.cropped = cropCanvas.toDataURL('image/jpeg', 0.9);
+            shot.cropSettings = cropSettings;
+            this.uploadShot(shot);
             
             this.updateImageDisplay();
             this.closeCropModal();
@@ -449,7 +457,8 @@ class MultiShotScanner {
     }
 
     removeImage(index) {
-        this.capturedImages.splice(index, 1);
+        const [shot] = this.capturedImages.splice(index, 1);
+        this.deleteShot(shot);
         this.updateImageDisplay();
         
         if (this.capturedImages.length === 0) {
@@ -465,22 +474,110 @@ class MultiShotScanner {
         
         const canvas = this.elements.stitchedCanvas;
         const ctx = canvas.getContext('2d');
+        const sources = this.capturedImages.map(imgData => imgData.cropped || imgData.original);
+        
+        try {
+            // Let the server remove rows that repeat between adjacent shots; a session has them already
+            const sessionId = await this.sessionReady();
+            const response = sessionId
+                ? await fetch(`/api/sessions/${sessionId}/stitch`, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ order: this.shotOrder() })
+                })
+                : await fetch('/api/stitch', {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ images: sources })
+                });
+            const result = await response.json();
+            if (!response.ok || !result.success) {
+                throw new Error(result.error || 'Stitching failed');
+            }
+            
+            const img = await this.loadImage(result.stitchedImage);
+            canvas.width = img.width;
+            canvas.height = img.height;
+            ctx.drawImage(img, 0, 0);
+        } catch (error) {
+            console.error('Server stitching failed, stacking locally:', error);
+            await this.stackImages(canvas, ctx, sources);
+        }
         
+        this.elements.stitchedResult.style.display = 'block';
+        this.elements.codeInput.style.display = 'block';
+        this.elements.aiControls.style.display = 'block';
+    }
+
+    async ensureSession() {
+        if (!this.session) {
+            this.session = fetch('/api/sessions', { method: 'POST' })
+                .then(response => response.ok ? response.json() : null)
+                .then(result => result && result.sessionId)
+                .catch(() => null);
+        }
+        return this.session;
+    }
+
+    uploadShot(shot) {
+        // Runs in the background while the user keeps capturing; analyze waits for it
+        const source = shot.cropped || shot.original;
+        shot.upload = (async () => {
+            const sessionId = await this.ensureSession();
+            if (!sessionId) return false;
+            const blob = await (await fetch(source)).blob();
+            const response = await fetch(`/api/sessions/${sessionId}/shots/${shot.shotId}`, {
+                method: 'PUT',
+                headers: { 'Content-Type': blob.type || 'image/jpeg' },
+                body: blob
+            });
+            return response.ok;
+        })().catch(() => false);
+    }
+
+    async deleteShot(shot) {
+        const sessionId = await this.ensureSession();
+        if (sessionId) {
+            fetch(`/api/sessions/${sessionId}/shots/${shot.shotId}`, { method: 'DELETE' }).catch(() => {});
+        }
+    }
+
+    resetSession() {
+        this.session = null;
+        this.capturedImages.forEach(shot => this.uploadShot(shot));
+    }
+
+    async sessionReady() {
+        // The session id once every shot has uploaded, or null to fall back to whole-image requests
+        if (!this.session || this.capturedImages.length === 0) return null;
+        const sessionId = await this.session;
+        const uploads = await Promise.all(this.capturedImages.map(shot => shot.upload));
+        return sessionId && uploads.every(Boolean) ? sessionId : null;
+    }
+
+    shotOrder() {
+        return this.capturedImages.map(shot => shot.shotId);
+    }
+
+    loadImage(src) {
+        return new Promise((resolve, reject) => {
+            const img = new Image();
+            img.onload = () => resolve(img);
+            img.onerror = reject;
+            img.src = src;
+        });
+    }
+
+    async stackImages(canvas, ctx, sources) {
         let totalHeight = 0;
         let maxWidth = 0;
         const loadedImages = [];
         
-        for (const imgData of this.capturedImages) {
-            const img = new Image();
-            await new Promise(resolve => {
-                img.onload = () => {
-                    loadedImages.push(img);
-                    totalHeight += img.height;
-                    maxWidth = Math.max(maxWidth, img.width);
-                    resolve();
-                };
-                img.src = imgData.cropped || imgData.original;
-            });
+        for (const src of sources) {
+            const img = await this.loadImage(src);
+            loadedImages.push(img);
+            totalHeight += img.height;
+            maxWidth = Math.max(maxWidth, img.width);
         }
         
         canvas.width = maxWidth;
@@ -491,14 +588,13 @@ class MultiShotScanner {
             ctx.drawImage(img, 0, currentY);
             currentY += img.height;
         }
-        
-        this.elements.stitchedResult.style.display = 'block';
-        this.elements.codeInput.style.display = 'block';
-        this.elements.aiControls.style.display = 'block';
+    }
+
+    canvasToBlob(canvas, type = 'image/jpeg', quality = 0.9) {
+        return new Promise(resolve => canvas.toBlob(resolve, type, quality));
     }
 
     async sendToAI() {
-        const stitchedImage = this.elements.stitchedCanvas.toDataURL('image/jpeg', 0.9);
         const reactCode = this.elements.reactCode.value;
         
         if (!reactCode.trim()) {
@@ -506,28 +602,126 @@ class MultiShotScanner {
             return;
         }
         
-        const payload = {
-            image: stitchedImage,
-            reactCode: reactCode,
-            timestamp: new Date().toISOString(),
-            imageCount: this.capturedImages.length
-        };
-        
         try {
-            const response = await fetch('/api/analyze', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(payload)
-            });
+            // The session already holds the processed shots; otherwise upload the stitched image
+            const sessionId = await this.sessionReady();
+            let response = sessionId ? await this.analyzeSession(sessionId, reactCode) : null;
+            if (!response || response.status === 404) {
+                // An expired session is recreated in the background for the next attempt
+                if (response) this.resetSession();
+                response = await this.analyzeStitched(reactCode);
+            }
             
-            const result = await response.json();
-            this.elements.resultContent.textContent = JSON.stringify(result, null, 2);
+            if (!response.ok || !response.body) {
+                const result = await response.json();
+                this.elements.resultContent.textContent = JSON.stringify(result, null, 2);
+                this.elements.result.style.display = 'block';
+                return;
+            }
+            
+            // Show the model output as it streams in, with the fixed code as a preview until 'done'
+            let streamedText = '';
+            let previewCode = null;
+            const showProgress = () => {
+                this.elements.resultContent.textContent = previewCode === null
+                    ? streamedText
+                    : `Fixed code (preview):\n${previewCode}\n\n${streamedText}`;
+            };
+            this.elements.resultContent.textContent = 'Analyzing...';
             this.elements.result.style.display = 'block';
+            
+            await this.readEventStream(response, (event, data) => {
+                if (event === 'delta') {
+                    streamedText += data.text;
+                    showProgress();
+                } else if (event === 'fixedCode') {
+                    previewCode = data.patch ? this.applyPatch(reactCode, data.patch) : data.code;
+                    showProgress();
+                } else if (event === 'done') {
+                    // The final result is authoritative; the preview was an early guess
+                    const { fixedCodePatch, ...result } = data;
+                    if (fixedCodePatch) {
+                        result.fixedCode = this.applyPatch(reactCode, fixedCodePatch);
+                    }
+                    this.elements.resultContent.textContent = JSON.stringify({
+                        success: true,
+                        result
+                    }, null, 2);
+                } else if (event === 'error') {
+                    this.elements.resultContent.textContent = 'Error: ' + data.error;
+                }
+            });
         } catch (error) {
             this.elements.resultContent.textContent = 'Error: ' + error.message;
             this.elements.result.style.display = 'block';
         }
     }
+
+    analyzeSession(sessionId, reactCode) {
+        return fetch(`/api/sessions/${sessionId}/analyze`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                reactCode,
+                order: this.shotOrder(),
+                stream: true,
+                // Ask for fixed code as hunks against our own code, without the duplicated full response
+                responseFormat: 'diff'
+            })
+        });
+    }
+
+    async analyzeStitched(reactCode) {
+        // Upload the image as binary multipart instead of a base64 data URL
+        const stitchedImage = await this.canvasToBlob(this.elements.stitchedCanvas);
+        const payload = new FormData();
+        payload.append('image', stitchedImage, 'stitched.jpg');
+        payload.append('reactCode', reactCode);
+        payload.append('timestamp', new Date().toISOString());
+        payload.append('imageCount', this.capturedImages.length);
+        payload.append('responseFormat', 'diff');
+        
+        return fetch('/api/analyze/stream', {
+            method: 'POST',
+            body: payload
+        });
+    }
+
+    applyPatch(source, hunks) {
+        // Hunks are [start, deleteCount, insertLines] over the source's lines, in order
+        const lines = source.split(/\r?\n/);
+        for (let i = hunks.length - 1; i >= 0; i--) {
+            const [start, deleteCount, insertLines] = hunks[i];
+            lines.splice(start, deleteCount, ...insertLines);
+        }
+        return lines.join('\n');
+    }
+
+    async readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                
+                let event = 'message';
+                let data = '';
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                if (data) onEvent(event, JSON.parse(data));
+            }
+        }
+    }
 }
 
 const scanner = new MultiShotScanner();
\ No newline at end of file